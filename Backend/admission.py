@@ -0,0 +1,92 @@
+import threading
+import time
+
+DURATION_POLICIES = ('reject', 'truncate')
+
+
+def admit(duration, max_seconds, policy='reject'):
+    """
+    Decide what to decode of an upload whose headers report `duration` seconds.
+    Returns (seconds to decode or None for all, error message or None).
+    An unknown duration (headers unreadable) is decoded up to just past the limit,
+    so the decoded length can be checked instead.
+    """
+    if not max_seconds:
+        return None, None
+    if duration is None:
+        return max_seconds + 1.0, None
+    if duration <= max_seconds:
+        return None, None
+    if policy == 'truncate':
+        return max_seconds, None
+    return None, f"Audio is {duration:.1f}s long. Maximum duration: {max_seconds:.0f}s"
+
+
+class CostModel:
+    """
+    Running estimate of processing seconds per request from its audio duration:
+    a fixed overhead plus a per-audio-second rate, both exponentially averaged
+    over completed requests. Starts from rough CPU defaults.
+    """
+
+    def __init__(self, overhead=0.05, per_audio_second=0.02, decay=0.1):
+        self.overhead = overhead
+        self.per_audio_second = per_audio_second
+        self.decay = decay
+        self._lock = threading.Lock()
+
+    def estimate(self, duration):
+        with self._lock:
+            return self.overhead + self.per_audio_second * (duration or 0.0)
+
+    def observe(self, duration, seconds):
+        if not duration:
+            return
+        with self._lock:
+            rate = max(0.0, seconds - self.overhead) / duration
+            self.per_audio_second += self.decay * (rate - self.per_audio_second)
+
+
+class ServiceMetrics:
+    """Thread-safe request counters and totals for /api/metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._counts = {"probed": 0, "unprobed": 0, "admitted": 0, "rejected": 0, "truncated": 0, "completed": 0}
+        self._totals = {"probe_seconds": 0.0, "audio_seconds": 0.0, "estimated_seconds": 0.0,
+                        "processing_seconds": 0.0}
+        self._in_flight = 0.0
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def probed(self, seconds, ok=True):
+        with self._lock:
+            self._counts["probed" if ok else "unprobed"] += 1
+            self._totals["probe_seconds"] += seconds
+
+    def admitted(self, audio_seconds, estimate):
+        with self._lock:
+            self._counts["admitted"] += 1
+            self._totals["audio_seconds"] += audio_seconds
+            self._totals["estimated_seconds"] += estimate
+            self._in_flight += estimate
+
+    def completed(self, estimate, processing_seconds):
+        with self._lock:
+            self._counts["completed"] += 1
+            self._totals["processing_seconds"] += processing_seconds
+            self._in_flight = max(0.0, self._in_flight - estimate)
+
+    def snapshot(self):
+        with self._lock:
+            probes = self._counts["probed"] + self._counts["unprobed"]
+            return dict(
+                self._counts,
+                **{k: round(v, 3) for k, v in self._totals.items()},
+                in_flight_estimated_seconds=round(self._in_flight, 3),
+                mean_probe_us=round(1e6 * self._totals["probe_seconds"] / max(1, probes), 1),
+                uptime_seconds=round(time.time() - self._started, 1)
+            )
@@ -12,11 +12,14 @@ import traceback
 # Get absolute paths
 BACKEND_DIR = Path(__file__).parent
 ML_SERVICE_DIR = BACKEND_DIR.parent / "ml-service" / "tamil_deepfake"
-MODEL_PATH = ML_SERVICE_DIR / "models" / "best_model.pth"
+# MODEL_PATH may point at a distilled student (any DeepCNN preset) where latency matters
+MODEL_PATH = Path(os.environ.get('MODEL_PATH', ML_SERVICE_DIR / "models" / "best_model.pth"))
 
 # Add ML service to path for imports
 sys.path.insert(0, str(ML_SERVICE_DIR))
 sys.path.insert(0, str(BACKEND_DIR))
+# Training code (src.model, src.data) lives at the project root
+sys.path.append(str(BACKEND_DIR.parent))
 
 print(f"\n{'='*60}")
 print(f" TAMIL DEEPFAKE DETECTION API - STARTUP")
@@ -27,10 +30,18 @@ print(f"Model path: {MODEL_PATH}")
 print(f"Model exists: {MODEL_PATH.exists()}")
 
 from utils import (
-    preprocess_audio,
+    load_audio,
+    trim_silence,
+    normalize_audio,
+    extract_mel_spectrogram,
+    segment_model_inputs,
     prepare_model_input,
     get_audio_info
 )
+from cache import ResultCache, content_hash
+from admission import DURATION_POLICIES, CostModel, ServiceMetrics, admit
+from visualize import build_visual
+import ensemble
 
 # Try importing the model class
 MODEL_AVAILABLE = False
@@ -70,6 +81,40 @@ MAX_FILE_SIZE = 30 * 1024 * 1024  # 30 MB
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# Per-upload results (prediction + visual data) keyed by content hash
+RESULT_CACHE = ResultCache(max_entries=int(os.environ.get('RESULT_CACHE_SIZE', 128)))
+
+# Uploads scored together by /api/predict_batch (grouped by length, padded and masked)
+PREDICT_BATCH_SIZE = int(os.environ.get('PREDICT_BATCH_SIZE', 16))
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', 32))
+
+# Uploads longer than LONG_AUDIO_SECONDS (0 = off) are scored as overlapping windows of
+# SEGMENT_SECONDS, the clip length the model was trained on, and the window scores averaged
+LONG_AUDIO_SECONDS = float(os.environ.get('LONG_AUDIO_SECONDS', 0))
+SEGMENT_SECONDS = float(os.environ.get('SEGMENT_SECONDS', 3.0))
+SEGMENT_OVERLAP = float(os.environ.get('SEGMENT_OVERLAP', 0.5))
+
+# Uploads whose headers report more than MAX_AUDIO_SECONDS (0 = no limit) are rejected
+# (413) or, with DURATION_POLICY=truncate, only their first MAX_AUDIO_SECONDS are decoded
+MAX_AUDIO_SECONDS = float(os.environ.get('MAX_AUDIO_SECONDS', 600))
+DURATION_POLICY = os.environ.get('DURATION_POLICY', 'reject').lower()
+if DURATION_POLICY not in DURATION_POLICIES:
+    raise ValueError(f"DURATION_POLICY must be one of {DURATION_POLICIES}, got {DURATION_POLICY!r}")
+
+# Duration-based processing cost estimates, and counters for /api/metrics
+COST_MODEL = CostModel()
+METRICS = ServiceMetrics()
+
+# Live streams on /ws/stream (needs flask-sock); windows and overlap as for long uploads
+MAX_STREAMS = int(os.environ.get('MAX_STREAMS', 8))
+
+# /api/predict_ensemble fuses the CNN with ml-service's IsolationForest (if its pickle exists):
+# fused = ENSEMBLE_WEIGHT * CNN score + (1 - ENSEMBLE_WEIGHT) * IsolationForest confidence
+IFOREST_MODEL_PATH = Path(os.environ.get('IFOREST_MODEL_PATH',
+                                         BACKEND_DIR.parent / "ml-service" / "models" / "voice_model.pkl"))
+ENSEMBLE_WEIGHT = float(os.environ.get('ENSEMBLE_WEIGHT', 0.5))
+iforest = None
+
 # Global model
 model = None
 device = None
@@ -87,9 +132,6 @@ def load_model():
             model_loaded = False
             return False
         
-        print("[INFO] Creating DeepCNN model architecture...")
-        model = DeepCNN().to(device)
-        
         if not MODEL_PATH.exists():
             print(f"[ERROR] Model file not found at {MODEL_PATH}")
             print("   Cannot proceed without trained model weights")
@@ -99,7 +141,13 @@ def load_model():
         
         print(f"[INFO] Loading trained weights from {MODEL_PATH}...")
         state_dict = torch.load(MODEL_PATH, map_location=device)
-        model.load_state_dict(state_dict)
+        print("[INFO] Creating DeepCNN model architecture...")
+        if hasattr(DeepCNN, 'from_state_dict'):
+            # Width/depth are read from the weights, so smaller presets load too
+            model = DeepCNN.from_state_dict(state_dict).to(device)
+        else:
+            model = DeepCNN().to(device)
+            model.load_state_dict(state_dict)
         model.eval()
         
         print(f"[OK] MODEL READY - Successfully loaded and ready for inference")
@@ -116,6 +164,37 @@ def load_model():
         return False
 
 
+def load_iforest():
+    """The IsolationForest artifact, loaded on first use; None if it is missing or fails to load"""
+    global iforest
+    if iforest is None and IFOREST_MODEL_PATH.exists():
+        try:
+            iforest = ensemble.load_isolation_forest(IFOREST_MODEL_PATH)
+            print(f"[OK] IsolationForest loaded from {IFOREST_MODEL_PATH}")
+        except Exception as e:
+            print(f"[ERROR] Could not load IsolationForest: {e}")
+    return iforest
+
+
+def current_model():
+    """(model, device) for the streaming endpoint, loading the model if needed"""
+    if not model_loaded:
+        load_model()
+    return (model, device) if model_loaded else (None, None)
+
+
+# The WebSocket endpoint is only there if flask-sock is installed
+STREAMS = None
+try:
+    from flask_sock import Sock
+    from streaming import register_websocket
+    STREAMS = register_websocket(Sock(app), current_model, sr=16000, seg_seconds=SEGMENT_SECONDS,
+                                 overlap=SEGMENT_OVERLAP, max_streams=MAX_STREAMS)
+    print("[OK] Streaming endpoint /ws/stream enabled")
+except ImportError:
+    print("[INFO] flask-sock not installed - /ws/stream disabled")
+
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -145,14 +224,331 @@ def info():
         "version": "1.0.0",
         "description": "Detects AI-generated (fake) Tamil audio",
         "endpoints": {
-            "POST /api/predict": "Predict if audio is real or fake",
+            "POST /api/predict": "Predict if audio is real or fake (?visualize=1 adds visual data)",
+            "POST /api/predict_batch": "Predict several files ('files' fields) in one batched pass",
+            "POST /api/visualize": "Waveform peaks and spectrogram thumbnail for an upload",
+            "GET /api/visualize?hash=<audio_hash>": "Visual data for a previously analyzed upload",
+            "POST /api/predict_ensemble": "CNN and IsolationForest scores from one decode and STFT "
+                                          "(?compare=1 also times the two separate pipelines, ?visualize=1)",
+            "GET /api/metrics": "Admission counters, audio seconds and cost estimates",
+            "WS /ws/stream": "Live PCM stream scored window by window" + ("" if STREAMS else " (install flask-sock)"),
             "GET /health": "Health check"
         },
         "supported_formats": list(ALLOWED_EXTENSIONS),
         "max_file_size_mb": MAX_FILE_SIZE / (1024 * 1024),
+        "max_audio_seconds": MAX_AUDIO_SECONDS,
+        "duration_policy": DURATION_POLICY,
         "model_status": "READY" if model_loaded else "NOT LOADED"
     }), 200
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Admission and processing counters, with the current cost model"""
+    return jsonify(dict(
+        METRICS.snapshot(),
+        cost_model={
+            "overhead_seconds": round(COST_MODEL.overhead, 4),
+            "seconds_per_audio_second": round(COST_MODEL.per_audio_second, 5)
+        },
+        max_audio_seconds=MAX_AUDIO_SECONDS,
+        duration_policy=DURATION_POLICY,
+        active_streams=STREAMS["streams"] if STREAMS else None,
+        max_streams=MAX_STREAMS
+    )), 200
+
+def wants_visual():
+    """Whether the client asked for visual data alongside the prediction"""
+    return request.values.get('visualize', '').lower() in ('1', 'true', 'yes')
+
+
+def read_upload(file=None):
+    """Validate the uploaded file; returns (file_bytes, None) or (None, error response)"""
+    if file is None:
+        if 'file' not in request.files:
+            return None, (jsonify({"error": "No file provided"}), 400)
+        file = request.files['file']
+    
+    if file.filename == '':
+        return None, (jsonify({"error": "No file selected"}), 400)
+    
+    if not allowed_file(file.filename):
+        return None, (jsonify({
+            "error": f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+        }), 400)
+    
+    file_bytes = file.read()
+    if len(file_bytes) == 0:
+        return None, (jsonify({"error": "File is empty"}), 400)
+    
+    print(f"\n[INFO] Processing file: {file.filename} ({len(file_bytes)} bytes)")
+    return file_bytes, None
+
+
+def decode_upload(file_bytes):
+    """
+    Admit and decode an upload (16 kHz mono, untrimmed).
+    The duration limit is checked from the container headers before anything is
+    decoded. Returns (admitted dict with 'y' and 'audio_info', None) or
+    (None, (error result, HTTP status)); y is None if decoding failed.
+    """
+    # Get audio info (headers only)
+    probe_start = time.perf_counter()
+    audio_info = get_audio_info(file_bytes, sr=16000)
+    METRICS.probed(time.perf_counter() - probe_start, ok=audio_info is not None)
+    print(f"   Audio info: {audio_info}")
+    
+    duration = audio_info["duration"] if audio_info else None
+    decode_seconds, rejection = admit(duration, MAX_AUDIO_SECONDS, DURATION_POLICY)
+    if rejection:
+        METRICS.count("rejected")
+        return None, ({
+            "error": rejection,
+            "audio_info": audio_info,
+            "max_audio_seconds": MAX_AUDIO_SECONDS,
+            "success": False
+        }, 413)
+    
+    # Cost is estimated before decoding; an unknown duration counts as the limit
+    audio_seconds = min(duration, decode_seconds or duration) if duration is not None else None
+    estimate = COST_MODEL.estimate(audio_seconds if audio_seconds is not None else MAX_AUDIO_SECONDS)
+    METRICS.admitted(audio_seconds or 0.0, estimate)
+    admitted = {"audio_seconds": audio_seconds, "estimate": estimate, "start_time": time.time()}
+    if audio_info is not None:
+        audio_info = dict(audio_info, estimated_cost_seconds=round(estimate, 3))
+    if decode_seconds is not None and duration is not None:
+        METRICS.count("truncated")
+        audio_info = dict(audio_info, truncated_to_seconds=decode_seconds)
+        print(f"   Truncated to the first {decode_seconds:.0f}s")
+    
+    # The decode is capped at the limit even when the headers say it is shorter,
+    # so a file whose headers understate its length costs no more than the limit
+    y, _ = load_audio(file_bytes, sr=16000, duration=decode_seconds or MAX_AUDIO_SECONDS or None)
+    if y is not None and duration is None:
+        if MAX_AUDIO_SECONDS and len(y) / 16000 > MAX_AUDIO_SECONDS:
+            # No readable headers: the capped decode tells whether the upload is over the limit
+            if DURATION_POLICY == 'reject':
+                finish(dict(admitted, audio_seconds=None))
+                METRICS.count("rejected")
+                return None, ({
+                    "error": f"Audio is longer than the maximum duration: {MAX_AUDIO_SECONDS:.0f}s",
+                    "audio_info": audio_info,
+                    "max_audio_seconds": MAX_AUDIO_SECONDS,
+                    "success": False
+                }, 413)
+            METRICS.count("truncated")
+            y = y[:int(MAX_AUDIO_SECONDS * 16000)]
+        admitted["audio_seconds"] = len(y) / 16000
+    return dict(admitted, audio_info=audio_info, y=y), None
+
+
+def prepare_upload(file_bytes, audio_hash):
+    """
+    Admit, decode and featurize an upload.
+    Returns (prepared dict, None) or (None, (error result, HTTP status)).
+    """
+    admitted, error = decode_upload(file_bytes)
+    if error:
+        return None, error
+    audio_info = admitted.pop("audio_info")
+    y = admitted.pop("y")
+    preprocess_status = "Failed to load audio file"
+    mel_spec = None
+    if y is not None:
+        # Trim silence and normalize
+        y = normalize_audio(trim_silence(y, sr=16000))
+        preprocess_status = "success"
+        mel_spec = extract_mel_spectrogram(y, sr=16000, n_mels=128)
+        if mel_spec is None:
+            preprocess_status = "Failed to extract mel spectrogram"
+    
+    if mel_spec is None:
+        finish(admitted)
+        return None, ({
+            "error": f"Audio preprocessing failed: {preprocess_status}",
+            "audio_info": audio_info,
+            "success": False
+        }, 400)
+    
+    print(f"   Mel spectrogram shape: {mel_spec.shape}")
+    
+    # Prepare model input
+    model_input = prepare_model_input(mel_spec)
+    if model_input is None:
+        finish(admitted)
+        return None, ({
+            "error": "Failed to prepare model input",
+            "audio_info": audio_info,
+            "success": False
+        }, 400)
+    
+    print(f"   Model input shape: {model_input.shape}")
+    
+    segment_inputs = None
+    if LONG_AUDIO_SECONDS and len(y) / 16000 > LONG_AUDIO_SECONDS:
+        segment_inputs = segment_model_inputs(y, sr=16000, seg_seconds=SEGMENT_SECONDS, overlap=SEGMENT_OVERLAP)
+        print(f"   Long audio: scoring {len(segment_inputs)} windows of {SEGMENT_SECONDS}s")
+    return dict(
+        admitted,
+        audio_hash=audio_hash,
+        audio_info=audio_info,
+        mel_spec=mel_spec,
+        model_input=model_input,
+        segment_inputs=segment_inputs
+    ), None
+
+
+def finish(prepared):
+    """Record an admitted upload's processing time (for the cost model and metrics); returns it"""
+    processing_time = time.time() - prepared["start_time"]
+    COST_MODEL.observe(prepared["audio_seconds"], processing_time)
+    METRICS.completed(prepared["estimate"], processing_time)
+    return processing_time
+
+
+def build_result(prepared, confidence, segment_scores=None):
+    """Interpret a model score (the mean of segment_scores for long audio) and cache the finished result"""
+    # Interpret the confidence score
+    # Model was trained with:
+    # Label 0 = FAKE (AI-generated, ai_* files)
+    # Label 1 = REAL (Human speech, human_* files)
+    # Sigmoid output: 0-1 range
+    # Score closer to 0 = FAKE, Score closer to 1 = REAL
+    
+    if confidence >= 0.5:
+        prediction = "REAL"
+        confidence_pct = confidence * 100
+    else:
+        prediction = "FAKE"
+        confidence_pct = (1 - confidence) * 100
+    
+    processing_time = finish(prepared)
+    
+    print(f"   [OK] Prediction: {prediction} ({confidence_pct:.1f}%)")
+    print(f"   Processing time: {processing_time:.2f}s\n")
+    
+    result = {
+        "prediction": prediction,
+        "confidence": round(confidence_pct, 1),
+        "raw_score": round(confidence, 4),
+        "audio_info": prepared["audio_info"],
+        "audio_hash": prepared["audio_hash"],
+        "processing_time_seconds": round(processing_time, 2),
+        "visual": build_visual(prepared["mel_spec"]),
+        "success": True
+    }
+    if segment_scores is not None:
+        result["segment_seconds"] = SEGMENT_SECONDS
+        result["segment_scores"] = [round(score, 4) for score in segment_scores]
+    RESULT_CACHE.put(prepared["audio_hash"], result)
+    return dict(result, cached=False)
+
+
+def inference_error(error, prepared):
+    print(f"[ERROR] Model inference error: {error}")
+    print(traceback.format_exc())
+    finish(prepared)
+    return {
+        "error": f"Model inference failed: {str(error)}",
+        "audio_info": prepared["audio_info"],
+        "success": False
+    }, 500
+
+
+def analyze_audio(file_bytes):
+    """
+    Run preprocessing and inference for an upload, reusing cached results.
+    Returns (result dict, HTTP status). Successful results carry a 'visual' entry
+    derived from the same mel spectrogram used for inference.
+    """
+    audio_hash = content_hash(file_bytes)
+    cached = RESULT_CACHE.get(audio_hash)
+    if cached is not None:
+        print(f"   [OK] Cache hit for {audio_hash[:12]}")
+        return dict(cached, cached=True), 200
+    
+    prepared, error = prepare_upload(file_bytes, audio_hash)
+    if error:
+        return error
+    
+    # Make prediction with actual model
+    segment_scores = None
+    try:
+        print(f"   Running model inference...")
+        if prepared["segment_inputs"]:
+            segment_scores = score_batch(prepared["segment_inputs"])
+            confidence = float(np.mean(segment_scores))
+        else:
+            with torch.no_grad():
+                model_input_device = prepared["model_input"].to(device)
+                output = model(model_input_device)
+                confidence = float(output[0].cpu().numpy())
+        
+        print(f"   Model output (raw): {confidence:.4f}")
+    except Exception as e:
+        return inference_error(e, prepared)
+    
+    return build_result(prepared, confidence, segment_scores), 200
+
+
+def score_batch(model_inputs):
+    """
+    Score (1, 1, n_mels, frames) inputs of any length in batches of similar length.
+    Each batch is padded to its longest clip and the model averages only over real
+    frames, so scores match single-clip inference.
+    """
+    from src.data.loader import pad_collate
+    scores = [None] * len(model_inputs)
+    order = sorted(range(len(model_inputs)), key=lambda i: model_inputs[i].shape[-1])
+    for start in range(0, len(order), PREDICT_BATCH_SIZE):
+        idx = order[start:start + PREDICT_BATCH_SIZE]
+        x, _, lengths = pad_collate([(model_inputs[i][0], torch.zeros(())) for i in idx])
+        with torch.no_grad():
+            output = model(x.to(device), lengths.to(device))
+        for i, score in zip(idx, output.view(-1).cpu().tolist()):
+            scores[i] = score
+    return scores
+
+
+def analyze_batch(uploads):
+    """
+    analyze_audio for several uploads with one batched model call per length bucket.
+    Returns a list of (result dict, HTTP status) in upload order.
+    """
+    results = [None] * len(uploads)
+    pending = []
+    for i, file_bytes in enumerate(uploads):
+        audio_hash = content_hash(file_bytes)
+        cached = RESULT_CACHE.get(audio_hash)
+        if cached is not None:
+            results[i] = (dict(cached, cached=True), 200)
+            continue
+        prepared, error = prepare_upload(file_bytes, audio_hash)
+        if error:
+            results[i] = error
+        else:
+            pending.append((i, prepared))
+    
+    if pending:
+        # Long uploads contribute all their windows to the same batches
+        inputs, spans = [], []
+        for _, prepared in pending:
+            clip_inputs = prepared["segment_inputs"] or [prepared["model_input"]]
+            spans.append((len(inputs), len(inputs) + len(clip_inputs)))
+            inputs.extend(clip_inputs)
+        try:
+            scores = score_batch(inputs)
+        except Exception as e:
+            for i, prepared in pending:
+                results[i] = inference_error(e, prepared)
+            return results
+        for (i, prepared), (lo, hi) in zip(pending, spans):
+            if prepared["segment_inputs"]:
+                results[i] = (build_result(prepared, float(np.mean(scores[lo:hi])), scores[lo:hi]), 200)
+            else:
+                results[i] = (build_result(prepared, scores[lo]), 200)
+    return results
+
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
     """Predict if uploaded audio is real or fake"""
@@ -164,104 +560,186 @@ def predict():
                 "success": False
             }), 503
         
-        # Check if file is present
-        if 'file' not in request.files:
-            return jsonify({"error": "No file provided"}), 400
+        file_bytes, error = read_upload()
+        if error:
+            return error
         
-        file = request.files['file']
+        result, status = analyze_audio(file_bytes)
+        if not wants_visual():
+            result.pop("visual", None)
+        return jsonify(result), status
         
-        if file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
-        
-        if not allowed_file(file.filename):
+    except Exception as e:
+        print(f"[ERROR] Prediction endpoint error: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": str(e),
+            "success": False
+        }), 500
+
+@app.route('/api/predict_batch', methods=['POST'])
+def predict_batch():
+    """Predict several uploads ('files' fields) in length-bucketed batches"""
+    try:
+        if not model_loaded or model is None:
             return jsonify({
-                "error": f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
-            }), 400
-        
-        # Read file bytes
-        file_bytes = file.read()
-        if len(file_bytes) == 0:
-            return jsonify({"error": "File is empty"}), 400
+                "error": "Model not loaded. Please restart the server.",
+                "success": False
+            }), 503
         
-        print(f"\n[INFO] Processing file: {file.filename} ({len(file_bytes)} bytes)")
+        files = request.files.getlist('files')
+        if not files:
+            return jsonify({"error": "No files provided (use the 'files' field)"}), 400
+        if len(files) > MAX_BATCH_FILES:
+            return jsonify({"error": f"Too many files. Maximum per request: {MAX_BATCH_FILES}"}), 400
         
-        # Get audio info
-        audio_info = get_audio_info(file_bytes, sr=16000)
-        print(f"   Audio info: {audio_info}")
+        uploads = []
+        for file in files:
+            file_bytes, error = read_upload(file)
+            if error:
+                return error
+            uploads.append(file_bytes)
         
-        # Preprocess audio
-        start_time = time.time()
-        mel_spec, preprocess_status = preprocess_audio(file_bytes, sr=16000)
+        items = []
+        for (result, status), file in zip(analyze_batch(uploads), files):
+            if not wants_visual():
+                result.pop("visual", None)
+            items.append(dict(result, filename=file.filename, status=status))
+        return jsonify({"results": items, "success": True}), 200
         
-        if mel_spec is None:
+    except Exception as e:
+        print(f"[ERROR] Batch prediction endpoint error: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": str(e),
+            "success": False
+        }), 500
+
+def analyze_ensemble(file_bytes, compare=False):
+    """
+    CNN and IsolationForest scores for an upload from one decode and one STFT,
+    with per-stage timings. With compare, the two separate pipelines are run too
+    and their timings and scores reported alongside. Returns (result dict, HTTP status).
+    """
+    timer = ensemble.Timer()
+    decoded, error = decode_upload(file_bytes)
+    if error:
+        return error
+    timer.lap("decode")
+    audio_info = decoded.pop("audio_info")
+    y = decoded.pop("y")
+    if y is None:
+        finish(decoded)
+        return {"error": "Audio preprocessing failed: Failed to load audio file",
+                "audio_info": audio_info, "success": False}, 400
+    
+    artifact = load_iforest()
+    try:
+        scores = ensemble.predict(y, model, device, artifact, weight=ENSEMBLE_WEIGHT, timer=timer)
+    except Exception as e:
+        return inference_error(e, dict(decoded, audio_info=audio_info))
+    processing_time = finish(decoded)
+    timings = dict(timer.stages, total=round(sum(timer.stages.values()), 2))
+    
+    fused = scores["fused"]
+    prediction = "REAL" if fused >= 0.5 else "FAKE"
+    print(f"   [OK] Ensemble: {prediction} (CNN {scores['cnn']:.4f}, IsolationForest {scores['iforest']}, "
+          f"fused {fused:.4f}) in {timings['total']:.0f} ms")
+    result = {
+        "prediction": prediction,
+        "confidence": round(100 * (fused if fused >= 0.5 else 1 - fused), 1),
+        "raw_score": round(fused, 4),
+        "scores": {
+            "cnn": round(scores["cnn"], 4),
+            "iforest": None if scores["iforest"] is None else round(scores["iforest"], 4),
+            "iforest_prediction": scores["iforest_prediction"],
+            "fused": round(fused, 4),
+            "cnn_weight": ENSEMBLE_WEIGHT if artifact is not None else 1.0
+        },
+        "models_used": ["cnn"] + (["iforest"] if artifact is not None else []),
+        "timings_ms": timings,
+        "audio_info": audio_info,
+        "audio_hash": content_hash(file_bytes),
+        "processing_time_seconds": round(processing_time, 2),
+        "success": True
+    }
+    if wants_visual():
+        result["visual"] = build_visual(scores["mel_spec"])
+    if compare:
+        cnn, confidence, stages = ensemble.predict_separately(
+            file_bytes, model, device, artifact, duration=len(y) / 16000)
+        separate_total = sum(stages.values())
+        result["separate"] = {
+            "timings_ms": dict(stages, total=round(separate_total, 2)),
+            "scores": {"cnn": round(cnn, 4), "iforest": None if confidence is None else round(confidence, 4)},
+            "saved_ms": round(separate_total - timings["total"], 2),
+            "saved_percent": round(100 * (1 - timings["total"] / separate_total), 1) if separate_total else 0.0
+        }
+    return result, 200
+
+
+@app.route('/api/predict_ensemble', methods=['POST'])
+def predict_ensemble():
+    """CNN and IsolationForest prediction from a single decode, with the fused score"""
+    try:
+        if not model_loaded or model is None:
             return jsonify({
-                "error": f"Audio preprocessing failed: {preprocess_status}",
-                "audio_info": audio_info,
+                "error": "Model not loaded. Please restart the server.",
                 "success": False
-            }), 400
+            }), 503
         
-        print(f"   Mel spectrogram shape: {mel_spec.shape}")
+        file_bytes, error = read_upload()
+        if error:
+            return error
         
-        # Prepare model input
-        model_input = prepare_model_input(mel_spec)
-        if model_input is None:
-            return jsonify({
-                "error": "Failed to prepare model input",
-                "audio_info": audio_info,
-                "success": False
-            }), 400
+        compare = request.values.get('compare', '').lower() in ('1', 'true', 'yes')
+        result, status = analyze_ensemble(file_bytes, compare)
+        return jsonify(result), status
         
-        print(f"   Model input shape: {model_input.shape}")
+    except Exception as e:
+        print(f"[ERROR] Ensemble endpoint error: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": str(e),
+            "success": False
+        }), 500
+
+@app.route('/api/visualize', methods=['GET', 'POST'])
+def visualize():
+    """Waveform peaks and spectrogram thumbnail, from cache or a new upload"""
+    try:
+        if request.method == 'GET':
+            audio_hash = request.args.get('hash', '')
+            cached = RESULT_CACHE.get(audio_hash)
+            if cached is None:
+                return jsonify({
+                    "error": "No cached result for this hash. POST the file instead.",
+                    "success": False
+                }), 404
+            return jsonify({"audio_hash": audio_hash, "visual": cached["visual"], "success": True}), 200
         
-        # Make prediction with actual model
-        try:
-            print(f"   Running model inference...")
-            with torch.no_grad():
-                model_input_device = model_input.to(device)
-                output = model(model_input_device)
-                confidence = float(output[0].cpu().numpy())
-            
-            print(f"   Model output (raw): {confidence:.4f}")
-            
-            # Interpret the confidence score
-            # Model was trained with:
-            # Label 0 = FAKE (AI-generated, ai_* files)
-            # Label 1 = REAL (Human speech, human_* files)
-            # Sigmoid output: 0-1 range
-            # Score closer to 0 = FAKE, Score closer to 1 = REAL
-            
-            if confidence >= 0.5:
-                prediction = "REAL"
-                confidence_pct = confidence * 100
-            else:
-                prediction = "FAKE"
-                confidence_pct = (1 - confidence) * 100
-            
-            processing_time = time.time() - start_time
-            
-            print(f"   [OK] Prediction: {prediction} ({confidence_pct:.1f}%)")
-            print(f"   Processing time: {processing_time:.2f}s\n")
-            
-            return jsonify({
-                "prediction": prediction,
-                "confidence": round(confidence_pct, 1),
-                "raw_score": round(confidence, 4),
-                "audio_info": audio_info,
-                "processing_time_seconds": round(processing_time, 2),
-                "success": True
-            }), 200
-            
-        except Exception as inference_error:
-            print(f"[ERROR] Model inference error: {inference_error}")
-            print(traceback.format_exc())
+        if not model_loaded or model is None:
             return jsonify({
-                "error": f"Model inference failed: {str(inference_error)}",
-                "audio_info": audio_info,
+                "error": "Model not loaded. Please restart the server.",
                 "success": False
-            }), 500
+            }), 503
+        
+        file_bytes, error = read_upload()
+        if error:
+            return error
+        
+        result, status = analyze_audio(file_bytes)
+        if not result.get("success"):
+            return jsonify(result), status
+        return jsonify({
+            "audio_hash": result["audio_hash"],
+            "visual": result["visual"],
+            "cached": result["cached"],
+            "success": True
+        }), 200
         
     except Exception as e:
-        print(f"[ERROR] Prediction endpoint error: {e}")
+        print(f"[ERROR] Visualize endpoint error: {e}")
         print(traceback.format_exc())
         return jsonify({
             "error": str(e),
@@ -288,7 +766,11 @@ def not_found(error):
         "available_endpoints": {
             "GET /health": "Health check",
             "GET /api/info": "API information",
-            "POST /api/predict": "Perform prediction"
+            "GET /api/metrics": "Admission and processing metrics",
+            "POST /api/predict": "Perform prediction",
+            "POST /api/predict_batch": "Perform predictions for several files",
+            "POST /api/predict_ensemble": "CNN and IsolationForest prediction, fused",
+            "GET|POST /api/visualize": "Waveform peaks and spectrogram thumbnail"
         }
     }), 404
 
@@ -0,0 +1,35 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_hash(file_bytes):
+    """Stable key for an uploaded file"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU of per-upload results keyed by content hash"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
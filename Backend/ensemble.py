@@ -0,0 +1,159 @@
+import sys
+import time
+from pathlib import Path
+
+import librosa
+import numpy as np
+import torch
+
+from utils import extract_mel_spectrogram, load_audio, normalize_audio, prepare_model_input, trim_silence
+
+# ml-service (IsolationForest on MFCC means, pitch, jitter and energy); its src/ joins the project's src namespace
+ML_SERVICE_ROOT = Path(__file__).resolve().parent.parent / "ml-service"
+
+# Both services use librosa's defaults: 2048-point FFT, hop 512, 128 mel bands
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MFCC = 13
+
+
+def _ml_service():
+    if str(ML_SERVICE_ROOT) not in sys.path:
+        sys.path.append(str(ML_SERVICE_ROOT))
+    import src.predict
+    import src.extract_features
+    return src.predict, src.extract_features
+
+
+def load_isolation_forest(model_path):
+    """The ml-service artifact (model, scaler, feature_columns), unpickled with its NumPy compatibility shim"""
+    predict, _ = _ml_service()
+    return predict.load_artifact(str(model_path))
+
+
+def classify(feature_vector, artifact):
+    """(label, confidence of REAL in [0, 1]) from the IsolationForest"""
+    predict, _ = _ml_service()
+    return predict.classify_features(feature_vector, artifact)
+
+
+class Timer:
+    """Accumulates named stage durations in milliseconds"""
+
+    def __init__(self):
+        self.stages = {}
+        self._last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.stages[name] = round(self.stages.get(name, 0.0) + 1000 * (now - self._last), 2)
+        self._last = now
+
+
+def shared_features(y, sr=16000, n_mels=128, trim_db=40, with_iforest=True, timer=None):
+    """
+    Features for both models from one STFT of a decoded clip.
+
+    The IsolationForest takes the peak-normalised clip as ml-service does: 13 MFCC
+    means, pitch, jitter and RMS energy. The CNN takes the Backend's log-mel of the
+    silence-trimmed clip. Trimming cuts at multiples of the hop, so every trimmed
+    frame that does not reach the trimmed clip's (zero-padded) edges is a frame of
+    the full clip, scaled by the ratio of the two peaks; only those few edge
+    frames are computed again. Returns (mel_db, feature_vector or None without with_iforest).
+    """
+    timer = timer or Timer()
+    peak = float(np.max(np.abs(y))) if len(y) else 0.0
+    # float64 as ml-service computes its features; the CNN alone needs only float32
+    yn = (y / peak if peak > 0 else y).astype(np.float64 if with_iforest else np.float32)
+    _, (start, end) = librosa.effects.trim(y, top_db=trim_db)
+    timer.lap("normalize_trim")
+
+    stft = librosa.stft(yn, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    power = stft.real ** 2 + stft.imag ** 2
+    timer.lap("stft")
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=n_mels)
+    mel_full = mel_basis @ power
+    timer.lap("mel")
+
+    feature_vector = None
+    if with_iforest:
+        _, extract = _ml_service()
+        mfcc = librosa.feature.mfcc(S=librosa.power_to_db(mel_full), n_mfcc=N_MFCC)
+        timer.lap("mfcc")
+        pitch, jitter = extract._compute_pitch_and_jitter(yn, sr)
+        feature_vector = np.concatenate([mfcc.mean(axis=1), [pitch, jitter, extract._compute_energy_rms(yn)]])
+        timer.lap("pitch_energy")
+
+    # Backend mel of the trimmed clip, itself normalised to its own peak
+    yt = yn[start:end]
+    trimmed_peak = float(np.max(np.abs(yt))) if len(yt) else 0.0
+    if trimmed_peak > 0:
+        yt = yt / trimmed_peak
+    scale = (1.0 / trimmed_peak) ** 2 if trimmed_peak > 0 else 1.0
+    n_frames = 1 + len(yt) // HOP_LENGTH
+    half = N_FFT // 2
+    inner = [t for t in range(n_frames) if t * HOP_LENGTH >= half and t * HOP_LENGTH + half <= len(yt)]
+    edges = [t for t in range(n_frames) if not inner or not inner[0] <= t <= inner[-1]]
+    mel = np.empty((n_mels, n_frames), dtype=mel_full.dtype)
+    if inner:
+        offset = start // HOP_LENGTH
+        mel[:, inner[0]:inner[-1] + 1] = scale * mel_full[:, offset + inner[0]:offset + inner[-1] + 1]
+    if edges:
+        padded = np.pad(yt, half)
+        frames = np.stack([padded[t * HOP_LENGTH:t * HOP_LENGTH + N_FFT] for t in edges])
+        spec = np.fft.rfft(frames * librosa.filters.get_window('hann', N_FFT, fftbins=True), axis=-1)
+        mel[:, edges] = mel_basis @ (np.abs(spec) ** 2).T
+    mel_db = librosa.power_to_db(mel, ref=np.max).astype(np.float32)
+    timer.lap("cnn_mel")
+    return mel_db, feature_vector
+
+
+def cnn_score(model, device, mel_db):
+    """DeepCNN score (close to 1 = REAL) of a log-mel spectrogram"""
+    with torch.no_grad():
+        return model(prepare_model_input(mel_db).to(device)).view(-1)[0].item()
+
+
+def predict(y, model, device, artifact=None, weight=0.5, sr=16000, timer=None):
+    """
+    Both models on one decoded clip, sharing its STFT. Returns a dict of the CNN
+    score, the IsolationForest label and confidence (None without an artifact),
+    and their fusion: weight * cnn + (1 - weight) * iforest, or the CNN score alone.
+    """
+    timer = timer or Timer()
+    mel_db, feature_vector = shared_features(y, sr=sr, with_iforest=artifact is not None, timer=timer)
+    cnn = cnn_score(model, device, mel_db)
+    timer.lap("cnn")
+    label, confidence = None, None
+    if artifact is not None:
+        label, confidence = classify(feature_vector, artifact)
+        timer.lap("iforest")
+    fused = cnn if confidence is None else weight * cnn + (1 - weight) * confidence
+    return {"cnn": cnn, "iforest_prediction": label, "iforest": confidence, "fused": fused, "mel_spec": mel_db}
+
+
+def predict_separately(file_bytes, model, device, artifact=None, duration=None, sr=16000):
+    """
+    The same scores from two separate calls, each decoding the upload and taking
+    its own STFT as /api/predict and ml-service's predict do. For comparison with
+    predict(); returns (cnn score, IsolationForest confidence or None, stage milliseconds).
+    """
+    timer = Timer()
+    y, _ = load_audio(file_bytes, sr=sr, duration=duration)
+    timer.lap("cnn_decode")
+    mel_db = extract_mel_spectrogram(normalize_audio(trim_silence(y, sr=sr)), sr=sr, n_mels=128)
+    timer.lap("cnn_features")
+    cnn = cnn_score(model, device, mel_db)
+    timer.lap("cnn")
+    confidence = None
+    if artifact is not None:
+        _, extract = _ml_service()
+        y, _ = load_audio(file_bytes, sr=sr, duration=duration)
+        # ml-service's load_and_preprocess: peak-normalised float64
+        waveform = normalize_audio(y).astype(np.float64)
+        timer.lap("iforest_decode")
+        feature_vector = extract.extract_features_from_waveform(waveform, sr)
+        timer.lap("iforest_features")
+        _, confidence = classify(feature_vector, artifact)
+        timer.lap("iforest")
+    return cnn, confidence, timer.stages
@@ -0,0 +1,217 @@
+import json
+import threading
+import time
+from collections import deque
+
+import librosa
+import numpy as np
+import torch
+from scipy.fft import rfft
+
+from utils import prepare_model_input
+
+# librosa.feature.melspectrogram defaults, as used for /api/predict
+N_FFT = 2048
+HOP_LENGTH = 512
+
+
+class StreamScorer:
+    """
+    Scores a live PCM stream in overlapping windows as the audio arrives.
+
+    Windows are seg_seconds long and start every hop_frames STFT frames (the
+    overlap is rounded to whole STFT hops, so overlapping windows share their
+    frames exactly). Each STFT frame that lies inside a window is computed once,
+    into a ring of mel frames; only the few frames at a window's edges, which see
+    that window's zero padding, are computed per window. A window's features are
+    therefore those librosa.feature.melspectrogram gives for that window alone.
+
+    Memory per stream is fixed: a sample buffer of one window plus one FFT and
+    one chunk, a ring of one window of mel frames and the last `rolling` scores.
+    """
+
+    def __init__(self, model, device, sr=16000, seg_seconds=3.0, overlap=0.5, n_mels=128,
+                 rolling=5, max_chunk_seconds=1.0):
+        self.model = model
+        self.device = device
+        self.sr = sr
+        self.seg_len = int(sr * seg_seconds)
+        self.n_frames = 1 + self.seg_len // HOP_LENGTH
+        self.hop_frames = max(1, int(round(self.n_frames * (1 - overlap))))
+        self.window_hop = self.hop_frames * HOP_LENGTH
+        self.max_chunk = int(sr * max_chunk_seconds)
+        half = N_FFT // 2
+        # Frames of a window whose FFT reaches past its edges (into the zero padding)
+        inside = [t for t in range(self.n_frames) if t * HOP_LENGTH >= half and t * HOP_LENGTH + half <= self.seg_len]
+        self.inner = (inside[0], inside[-1] + 1) if inside else (0, 0)
+        self.edges = [t for t in range(self.n_frames) if not self.inner[0] <= t < self.inner[1]]
+
+        self.fft_window = librosa.filters.get_window('hann', N_FFT, fftbins=True).astype(np.float32)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=n_mels)
+        self.buf = np.zeros(self.seg_len + N_FFT + self.max_chunk, dtype=np.float32)
+        self.buf_start = 0          # stream sample index of buf[0]
+        self.buf_len = 0
+        self.received = 0
+        self.mel_ring = np.zeros((n_mels, max(1, self.n_frames)), dtype=np.float32)
+        self.next_frame = self.inner[0]
+        self.next_window = 0
+        self.recent = deque(maxlen=rolling)
+        self.score_sum = 0.0
+        self.windows = 0
+
+    @property
+    def nbytes(self):
+        return self.buf.nbytes + self.mel_ring.nbytes + self.mel_basis.nbytes
+
+    def _append(self, pcm):
+        if self.buf_len + len(pcm) > len(self.buf):
+            # Drop samples no later frame or window needs
+            keep = min(self.next_window * self.window_hop, self.next_frame * HOP_LENGTH - N_FFT // 2)
+            drop = max(0, keep - self.buf_start)
+            self.buf[:self.buf_len - drop] = self.buf[drop:self.buf_len]
+            self.buf_start += drop
+            self.buf_len -= drop
+        self.buf[self.buf_len:self.buf_len + len(pcm)] = pcm
+        self.buf_len += len(pcm)
+        self.received += len(pcm)
+
+    def _mel_frames(self, frames):
+        """Power mel of (n, N_FFT) sample frames, as (n_mels, n)"""
+        spec = rfft(frames * self.fft_window, axis=-1)
+        return self.mel_basis @ (spec.real ** 2 + spec.imag ** 2).T
+
+    def _compute_frames(self, upto):
+        """Stream frames next_frame..upto-1 (those not yet computed) into the mel ring"""
+        upto = min(upto, (self.received - N_FFT // 2) // HOP_LENGTH + 1)
+        if upto <= self.next_frame:
+            return
+        first = self.next_frame * HOP_LENGTH - N_FFT // 2 - self.buf_start
+        view = np.lib.stride_tricks.sliding_window_view(self.buf[:self.buf_len], N_FFT)
+        frames = view[first:first + (upto - self.next_frame) * HOP_LENGTH:HOP_LENGTH]
+        cols = np.arange(self.next_frame, upto) % self.mel_ring.shape[1]
+        self.mel_ring[:, cols] = self._mel_frames(frames)
+        self.next_frame = upto
+
+    def _window_mel(self, j):
+        """(n_mels, n_frames) power mel of window j: ring frames inside it, its edge frames padded"""
+        mel = np.empty((self.mel_ring.shape[0], self.n_frames), dtype=np.float32)
+        k0 = j * self.hop_frames
+        lo, hi = self.inner
+        mel[:, lo:hi] = self.mel_ring[:, np.arange(k0 + lo, k0 + hi) % self.mel_ring.shape[1]]
+        if self.edges:
+            start = j * self.window_hop - self.buf_start
+            padded = np.pad(self.buf[start:start + self.seg_len], N_FFT // 2)
+            edge_frames = np.stack([padded[t * HOP_LENGTH:t * HOP_LENGTH + N_FFT] for t in self.edges])
+            mel[:, self.edges] = self._mel_frames(edge_frames)
+        return mel
+
+    def _score(self, mels):
+        x = torch.cat([prepare_model_input(librosa.power_to_db(m, ref=np.max)) for m in mels])
+        with torch.no_grad():
+            return self.model(x.to(self.device)).view(-1).cpu().tolist()
+
+    def _results(self, starts, mels, received_at):
+        results = []
+        for start, score in zip(starts, self._score(mels)):
+            self.recent.append(score)
+            self.score_sum += score
+            self.windows += 1
+            cumulative = self.score_sum / self.windows
+            results.append({
+                "window": self.windows - 1,
+                "start": round(start / self.sr, 3),
+                "end": round(min(start + self.seg_len, self.received) / self.sr, 3),
+                "score": round(score, 4),
+                "rolling_score": round(float(np.mean(self.recent)), 4),
+                "cumulative_score": round(cumulative, 4),
+                "prediction": "REAL" if cumulative >= 0.5 else "FAKE",
+                "latency_ms": round(1000 * (time.perf_counter() - received_at), 1)
+            })
+        return results
+
+    def feed(self, pcm):
+        """Add mono float32 samples; returns results for the windows they completed"""
+        received_at = time.perf_counter()
+        pcm = np.asarray(pcm, dtype=np.float32).reshape(-1)
+        starts, mels = [], []
+        for offset in range(0, len(pcm), self.max_chunk):
+            self._append(pcm[offset:offset + self.max_chunk])
+            while self.received >= self.next_window * self.window_hop + self.seg_len:
+                self._compute_frames(self.next_window * self.hop_frames + self.inner[1])
+                starts.append(self.next_window * self.window_hop)
+                mels.append(self._window_mel(self.next_window))
+                self.next_window += 1
+            self._compute_frames(self.next_frame + self.max_chunk // HOP_LENGTH + 1)
+        return self._results(starts, mels, received_at) if mels else []
+
+    def finish(self):
+        """Score the zero-padded tail window, if samples after the last window are left (or none was full)"""
+        start = self.next_window * self.window_hop
+        covered = (self.next_window - 1) * self.window_hop + self.seg_len if self.next_window else 0
+        if not self.received or self.received <= max(covered, start):
+            return []
+        tail = np.zeros(self.seg_len, dtype=np.float32)
+        available = self.buf[start - self.buf_start:self.buf_len]
+        tail[:len(available)] = available
+        mel = librosa.feature.melspectrogram(y=tail, sr=self.sr, n_fft=N_FFT, hop_length=HOP_LENGTH,
+                                             n_mels=self.mel_ring.shape[0])
+        return self._results([start], [mel], time.perf_counter())
+
+
+def decode_pcm(message, encoding):
+    """Mono samples from a binary PCM message: little-endian float32 or int16"""
+    if encoding == 'int16':
+        return np.frombuffer(message, dtype='<i2').astype(np.float32) / 32768.0
+    return np.frombuffer(message, dtype='<f4')
+
+
+def register_websocket(sock, get_model, sr=16000, seg_seconds=3.0, overlap=0.5, max_streams=8):
+    """
+    Adds the /ws/stream route to a flask_sock.Sock.
+
+    Protocol: an optional JSON text message {"sample_rate": 16000, "encoding":
+    "float32" | "int16"} first, then binary mono PCM chunks; a text message
+    {"type": "end"} scores the tail and closes. Each chunk that completes windows
+    is answered with {"type": "windows", "windows": [...]}.
+    """
+    active = {"streams": 0}
+    lock = threading.Lock()
+
+    @sock.route('/ws/stream')
+    def stream(ws):
+        model, device = get_model()
+        if model is None:
+            ws.send(json.dumps({"type": "error", "error": "Model not loaded"}))
+            return
+        with lock:
+            if active["streams"] >= max_streams:
+                ws.send(json.dumps({"type": "error", "error": f"Too many streams (max {max_streams})"}))
+                return
+            active["streams"] += 1
+        try:
+            scorer = StreamScorer(model, device, sr=sr, seg_seconds=seg_seconds, overlap=overlap)
+            encoding = 'float32'
+            ws.send(json.dumps({"type": "ready", "sample_rate": sr, "window_seconds": seg_seconds,
+                                "window_hop_seconds": scorer.window_hop / sr, "buffer_bytes": scorer.nbytes}))
+            while True:
+                message = ws.receive()
+                if message is None:
+                    break
+                if isinstance(message, str):
+                    control = json.loads(message)
+                    if control.get("type") == "end":
+                        ws.send(json.dumps({"type": "windows", "windows": scorer.finish(), "final": True}))
+                        break
+                    if int(control.get("sample_rate", sr)) != sr:
+                        ws.send(json.dumps({"type": "error", "error": f"Send {sr} Hz mono PCM"}))
+                        break
+                    encoding = control.get("encoding", encoding)
+                    continue
+                windows = scorer.feed(decode_pcm(message, encoding))
+                if windows:
+                    ws.send(json.dumps({"type": "windows", "windows": windows}))
+        finally:
+            with lock:
+                active["streams"] -= 1
+
+    return active
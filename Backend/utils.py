@@ -4,15 +4,15 @@ import torch
 from pathlib import Path
 import io
 
-def load_audio(file_path_or_bytes, sr=16000):
-    """Load audio from file path or bytes"""
+def load_audio(file_path_or_bytes, sr=16000, duration=None):
+    """Load audio from file path or bytes (only the first `duration` seconds if given)"""
     try:
         if isinstance(file_path_or_bytes, bytes):
             # Load from bytes (uploaded file)
-            y, _ = librosa.load(io.BytesIO(file_path_or_bytes), sr=sr)
+            y, _ = librosa.load(io.BytesIO(file_path_or_bytes), sr=sr, duration=duration)
         else:
             # Load from file path
-            y, _ = librosa.load(str(file_path_or_bytes), sr=sr)
+            y, _ = librosa.load(str(file_path_or_bytes), sr=sr, duration=duration)
         return y, sr
     except Exception as e:
         print(f"Error loading audio: {e}")
@@ -59,11 +59,11 @@ def extract_mfcc(y, sr=16000, n_mfcc=40):
         print(f"Error extracting MFCC: {e}")
         return None
 
-def preprocess_audio(file_bytes, sr=16000):
-    """Complete preprocessing pipeline"""
+def preprocess_waveform(file_bytes, sr=16000, max_seconds=None):
+    """Decode (at most max_seconds of), trim and normalize an upload"""
     try:
         # Load audio
-        y, sr = load_audio(file_bytes, sr=sr)
+        y, sr = load_audio(file_bytes, sr=sr, duration=max_seconds)
         if y is None:
             return None, "Failed to load audio file"
         
@@ -71,7 +71,16 @@ def preprocess_audio(file_bytes, sr=16000):
         y = trim_silence(y, sr=sr)
         
         # Normalize
-        y = normalize_audio(y)
+        return normalize_audio(y), "success"
+    except Exception as e:
+        return None, str(e)
+
+def preprocess_audio(file_bytes, sr=16000):
+    """Complete preprocessing pipeline"""
+    try:
+        y, status = preprocess_waveform(file_bytes, sr=sr)
+        if y is None:
+            return None, status
         
         # Extract features
         mel = extract_mel_spectrogram(y, sr=sr, n_mels=128)
@@ -82,6 +91,14 @@ def preprocess_audio(file_bytes, sr=16000):
     except Exception as e:
         return None, str(e)
 
+def segment_model_inputs(y, sr=16000, seg_seconds=3.0, overlap=0.5, n_mels=128):
+    """Model inputs for overlapping fixed-length windows of a (long) clip"""
+    from src.preprocessing.segment import segment_audio
+    segments = segment_audio(y, sr, seg_seconds, overlap)
+    # One STFT for all windows; each window is then scaled like a standalone clip
+    mels = librosa.feature.melspectrogram(y=np.stack(segments), sr=sr, n_mels=n_mels)
+    return [prepare_model_input(librosa.power_to_db(mel, ref=np.max)) for mel in mels]
+
 def prepare_model_input(mel_spec):
     """Prepare feature tensor for model inference"""
     try:
@@ -108,20 +125,24 @@ def prepare_model_input(mel_spec):
         return None
 
 def get_audio_info(file_bytes, sr=16000):
-    """Get audio file information"""
+    """Get audio file information from its headers, without decoding it"""
     try:
-        y, sr_actual = load_audio(file_bytes, sr=sr)
-        if y is None:
+        from src.utils.audio_probe import probe_bytes
+        info = probe_bytes(file_bytes)
+        if info is None:
             return None
         
-        duration = librosa.get_duration(y=y, sr=sr_actual)
         file_size = len(file_bytes) / 1024  # KB
         
+        # sample_rate and samples describe the audio as decoded for the model (resampled to sr)
         return {
-            "duration": round(duration, 2),
-            "sample_rate": sr_actual,
+            "duration": round(info.duration, 2),
+            "sample_rate": sr,
+            "source_sample_rate": info.sample_rate,
+            "channels": info.channels,
+            "format": info.format,
             "file_size": round(file_size, 2),
-            "samples": len(y)
+            "samples": int(round(info.duration * sr))
         }
     except Exception as e:
         print(f"Error getting audio info: {e}")
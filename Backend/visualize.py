@@ -0,0 +1,79 @@
+import base64
+import struct
+import zlib
+import numpy as np
+
+WAVEFORM_BINS = 256
+THUMBNAIL_MELS = 64
+THUMBNAIL_FRAMES = 256
+DB_FLOOR = -80.0  # power_to_db(ref=np.max) clips at top_db=80
+
+
+def _bin_reduce(arr, n_bins, axis, ufunc):
+    """Reduce arr into at most n_bins contiguous groups along axis"""
+    length = arr.shape[axis]
+    n_bins = max(1, min(n_bins, length))
+    edges = np.linspace(0, length, n_bins + 1).astype(np.int64)[:-1]
+    return ufunc.reduceat(arr, edges, axis=axis), np.diff(np.append(edges, length))
+
+
+def waveform_peaks(mel_db, bins=WAVEFORM_BINS):
+    """
+    Min/max amplitude envelope per bin, derived from mel frame energy.
+    Values are relative to the loudest frame, in [0, 1].
+    """
+    try:
+        power = np.power(10.0, mel_db / 10.0).sum(axis=0)
+        envelope = np.sqrt(power / max(power.max(), 1e-10))
+        lows, _ = _bin_reduce(envelope, bins, 0, np.minimum)
+        highs, _ = _bin_reduce(envelope, bins, 0, np.maximum)
+        return {
+            "bins": int(len(highs)),
+            "min": np.round(lows, 3).tolist(),
+            "max": np.round(highs, 3).tolist()
+        }
+    except Exception as e:
+        print(f"Error computing waveform peaks: {e}")
+        return None
+
+
+def _encode_png(img):
+    """Encode a 2D uint8 array as an 8-bit grayscale PNG"""
+    height, width = img.shape
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), img])  # filter byte 0 per row
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(rows.tobytes(), 9)) + chunk(b'IEND', b''))
+
+
+def spectrogram_thumbnail(mel_db, n_mels=THUMBNAIL_MELS, n_frames=THUMBNAIL_FRAMES):
+    """Block-averaged, 8-bit quantized mel spectrogram as a base64 PNG data URI"""
+    try:
+        sums, counts = _bin_reduce(mel_db.astype(np.float64), n_mels, 0, np.add)
+        small = sums / counts[:, None]
+        sums, counts = _bin_reduce(small, n_frames, 1, np.add)
+        small = sums / counts[None, :]
+        scaled = (np.clip(small, DB_FLOOR, 0.0) - DB_FLOOR) / -DB_FLOOR
+        img = np.round(scaled * 255).astype(np.uint8)[::-1]  # low frequencies at the bottom
+        png = _encode_png(np.ascontiguousarray(img))
+        return {
+            "width": int(img.shape[1]),
+            "height": int(img.shape[0]),
+            "db_range": [DB_FLOOR, 0.0],
+            "image": "data:image/png;base64," + base64.b64encode(png).decode('ascii')
+        }
+    except Exception as e:
+        print(f"Error rendering spectrogram thumbnail: {e}")
+        return None
+
+
+def build_visual(mel_db):
+    """Compact visual payload for a request's mel spectrogram"""
+    return {
+        "waveform": waveform_peaks(mel_db),
+        "spectrogram": spectrogram_thumbnail(mel_db)
+    }
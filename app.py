@@ -1,5 +1,9 @@
 import streamlit as st
 from pathlib import Path
+from collections import OrderedDict
+import hashlib
+import io
+import os
 import tempfile
 import librosa
 import librosa.display
@@ -10,6 +14,10 @@ import torch
 
 from src.model.cnn import DeepCNN
 
+# Cache bounds: entries shared by all sessions, and analyses kept per browser session
+CACHE_MAX_ENTRIES = 64
+SESSION_MAX_ENTRIES = 8
+
 
 def load_config(path: Path) -> dict:
     with open(path, 'r') as f:
@@ -17,10 +25,9 @@ def load_config(path: Path) -> dict:
 
 
 @st.cache_resource
-def load_model(model_path: Path, device: str = 'cpu'):
+def load_model(model_path: Path, device: str = 'cpu', mtime: float = 0.0):
     dev = torch.device('cuda' if torch.cuda.is_available() and device == 'cuda' else 'cpu')
-    model = DeepCNN().to(dev)
-    model.load_state_dict(torch.load(model_path, map_location=dev))
+    model = DeepCNN.from_state_dict(torch.load(model_path, map_location=dev)).to(dev)
     model.eval()
     return model, dev
 
@@ -36,41 +43,90 @@ def preprocess_audio(y, sr, duration=3.0):
     return mel_db
 
 
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def decode_audio(digest: str, _data: bytes, suffix: str, sr: int):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(_data)
+        tmp_path = tmp.name
+    try:
+        return librosa.load(tmp_path, sr=sr)
+    finally:
+        os.unlink(tmp_path)
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def compute_mel(digest: str, _y: np.ndarray, sr: int, duration: float) -> np.ndarray:
+    return preprocess_audio(_y, sr, duration=duration)
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def render_spectrogram(digest: str, _mel: np.ndarray, sr: int) -> bytes:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(6, 3))
+    librosa.display.specshow(_mel, sr=sr, x_axis='time', y_axis='mel', fmax=8000, ax=ax)
+    ax.set_title('Mel Spectrogram')
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buf.getvalue()
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def predict_prob(digest: str, model_key: str, _model, _device, _mel: np.ndarray) -> float:
+    arr = np.expand_dims(_mel, 0)
+    arr = np.expand_dims(arr, 0)
+    tensor = torch.tensor(arr, dtype=torch.float32).to(_device)
+    with torch.no_grad():
+        out = _model(tensor)
+    return float(out.cpu().numpy().squeeze())
+
+
+def analyze(data: bytes, suffix: str, cfg: dict, model, device, model_key: str) -> dict:
+    """Decode, featurize, render and score an upload, reusing results keyed by its content hash."""
+    digest = hashlib.sha256(data).hexdigest()
+    results = st.session_state.setdefault('analyses', OrderedDict())
+    key = (digest, model_key)
+    if key in results:
+        results.move_to_end(key)
+        return results[key]
+    y, sr = decode_audio(digest, data, suffix, cfg.get('sr', 16000))
+    mel = compute_mel(digest, y, sr, cfg.get('duration', 3.0))
+    result = {'spectrogram_png': render_spectrogram(digest, mel, sr), 'prob': None}
+    if model is not None:
+        result['prob'] = predict_prob(digest, model_key, model, device, mel)
+    results[key] = result
+    while len(results) > SESSION_MAX_ENTRIES:
+        results.popitem(last=False)
+    return result
+
+
 def main():
     st.title('Tamil Deepfake Audio Detection')
     app_dir = Path(__file__).parent
     cfg = load_config(app_dir / 'config/config.yaml')
     model_path = app_dir / 'models/best_model.pth'
     if model_path.exists():
-        model, device = load_model(model_path, device='cpu')
+        mtime = model_path.stat().st_mtime
+        model, device = load_model(model_path, device='cpu', mtime=mtime)
+        model_key = f'{model_path}@{mtime}'
     else:
         model = None
         device = 'cpu'
+        model_key = 'none'
 
     uploaded = st.file_uploader('Upload audio', type=['wav', 'mp3', 'flac'])
     if uploaded is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded.name).suffix) as tmp:
-            tmp.write(uploaded.read())
-            tmp_path = tmp.name
-        y, sr = librosa.load(tmp_path, sr=cfg.get('sr', 16000))
-        mel = preprocess_audio(y, sr, duration=cfg.get('duration', 3.0))
-        import matplotlib.pyplot as plt
-        fig, ax = plt.subplots(figsize=(6, 3))
-        librosa.display.specshow(mel, sr=sr, x_axis='time', y_axis='mel', fmax=8000, ax=ax)
-        ax.set_title('Mel Spectrogram')
-        st.pyplot(fig)
+        result = analyze(uploaded.getvalue(), Path(uploaded.name).suffix, cfg, model, device, model_key)
+        st.image(result['spectrogram_png'])
         if model is None:
             st.warning('Model not found. Run pipeline to train a model.')
         else:
-            arr = np.expand_dims(mel, 0)
-            arr = np.expand_dims(arr, 0)
-            tensor = torch.tensor(arr, dtype=torch.float32).to(device)
-            with torch.no_grad():
-                out = model(tensor)
-                prob = float(out.cpu().numpy().squeeze())
-                label = 'REAL' if prob >= 0.5 else 'FAKE'
-                color = 'green' if label == 'REAL' else 'red'
-                st.markdown(f"<h2 style='color:{color}'>{label} ({prob*100:.2f}%)</h2>", unsafe_allow_html=True)
+            prob = result['prob']
+            label = 'REAL' if prob >= 0.5 else 'FAKE'
+            color = 'green' if label == 'REAL' else 'red'
+            st.markdown(f"<h2 style='color:{color}'>{label} ({prob*100:.2f}%)</h2>", unsafe_allow_html=True)
 
 
 if __name__ == '__main__':
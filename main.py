@@ -1,11 +1,14 @@
 from pathlib import Path
-from src.preprocessing.preprocess import run_preprocessing
+from src.data.manifest import scan
+from src.preprocessing.preprocess import list_sources, preprocess_params, run_preprocessing
 from src.utils.balance_data import check_and_balance
-from src.features.extract_features import extract_and_save
-from src.utils.create_splits import create_stratified_splits
-from src.train import train_model
+from src.features.extract_features import extract_and_save, feature_params
+from src.utils.create_splits import create_splits_from_shards, create_stratified_splits
+from src.utils.stages import HASH_CACHE_FILE, MANIFEST_FILE, HashCache, StageManifest, params_hash
+from src.train import load_config, train_model
 from src.evaluate import evaluate_model
 import argparse
+import json
 
 PROJECT_ROOT = Path(__file__).parent
 DATA_ROOT = Path('ml-service/data/Audio_Dataset') if Path('ml-service/data/Audio_Dataset').exists() else Path('ml-service/data/audio_dataset')
@@ -15,22 +18,189 @@ SPLITS_ROOT = PROJECT_ROOT / 'data' / 'splits'
 MODEL_OUT = PROJECT_ROOT / 'models' / 'best_model.pth'
 CONFIG = PROJECT_ROOT / 'config' / 'config.yaml'
 
+# Config sections that only affect the data stages (or evaluation), not training
+NON_TRAINING_KEYS = ('preprocessing', 'features', 'evaluation', 'supported_extensions', 'n_mfcc')
 
-def run_all():
-    print('Starting pipeline...')
-    run_preprocessing(DATA_ROOT, PROJECT_ROOT / 'data', CONFIG)
-    check_and_balance(PROJECT_ROOT / 'data', CONFIG)
-    extract_and_save(PROJECT_ROOT / 'data', PROJECT_ROOT / 'data' / 'features', CONFIG)
-    create_stratified_splits(PROJECT_ROOT / 'data' / 'features', PROJECT_ROOT / 'data' / 'splits', CONFIG)
-    train_model(CONFIG, PROJECT_ROOT / 'data' / 'splits' / 'train.csv', PROJECT_ROOT / 'data' / 'splits' / 'val.csv', MODEL_OUT)
-    evaluate_model(MODEL_OUT, PROJECT_ROOT / 'data' / 'splits' / 'test.csv')
+
+def _plan(name: str, stale: bool, detail: str = ''):
+    print(f"  {name:<11} {'run' if stale else 'up to date':<11} {detail}")
+
+
+def _remove(paths):
+    for p in paths:
+        Path(p).unlink(missing_ok=True)
+
+
+def _wav_keys(cfg: dict, hashes: HashCache, version: str) -> dict:
+    manifest = scan(PROCESSED_ROOT / 'processed', cfg)
+    wavs = [e.path for label in ['real', 'fake'] for e in manifest.query(label, ['.wav'], recursive=False)]
+    return {str(f): params_hash([hashes.digest(f), version]) for f in wavs}
+
+
+def _feature_outputs(wav: str, features_root: Path) -> list:
+    wav = Path(wav)
+    label = wav.parent.name
+    return [str(features_root / kind / label / (wav.stem + '.npy')) for kind in ('mel_spectrograms', 'mfcc')]
+
+
+def _digest(hashes: HashCache, path: Path):
+    return hashes.digest(path) if Path(path).exists() else None
+
+
+def run_all(fused: bool = False, dry_run: bool = False):
+    """Runs the pipeline stages whose inputs or parameters changed since the last run.
+
+    data/pipeline_manifest.json records what every stage was computed from:
+    content hashes of its inputs (cached by size and mtime) and the config values
+    it depends on. Preprocessing and feature extraction redo only new or changed
+    files; features live in data/features/v_<hash of their parameters> (fused
+    shards in <data.shard_dir>/v_<hash>), so older parameter sets stay usable. With dry_run the plan is printed and nothing runs.
+    """
+    cfg = load_config(CONFIG)
+    manifest = StageManifest(PROCESSED_ROOT / MANIFEST_FILE)
+    hashes = HashCache(PROCESSED_ROOT / HASH_CACHE_FILE)
+    print('Pipeline plan (dry run):' if dry_run else 'Starting pipeline...')
+    sources = list_sources(DATA_ROOT, cfg.get('supported_extensions', ['.wav']), cfg)
+    pre_key = params_hash(preprocess_params(cfg))
+    source_keys = {str(f): params_hash([hashes.digest(f), pre_key]) for f, _, _ in sources}
+    # In a dry run, stages after one with work are assumed to run too: their input
+    # hashes are only known once it has. A real run checks each key as it goes.
+    upstream = False
+
+    if fused:
+        # Raw audio straight to feature shards: no intermediate WAVs (unless asked for) or .npy files
+        if cfg.get('data', {}).get('format', 'npy') != 'shards':
+            raise SystemExit('--fused writes feature shards; set data.format: shards in ' + str(CONFIG))
+        # Each parameter set gets its own shards, as .npy features get data/features/v_<hash>,
+        # so a changed parameter never overwrites the shards an earlier model was trained on
+        data_cfg = cfg['data']
+        shard_params = dict(preprocess_params(cfg), features=feature_params(cfg),
+                            shard_items=data_cfg.get('shard_items', 1024),
+                            shard_dtype=data_cfg.get('shard_dtype', 'float16'))
+        version = 'v_' + params_hash(shard_params)
+        shard_dir = Path(data_cfg.get('shard_dir', 'data/features/shards')) / version
+        mfcc_dir = Path(data_cfg.get('mfcc_shard_dir', 'data/features/shards_mfcc')) / version
+        overrides = {'data': {'shard_dir': str(shard_dir), 'mfcc_shard_dir': str(mfcc_dir)}}
+        features_key = params_hash([source_keys, shard_params])
+        stale = not manifest.is_current('fused', features_key) or not (shard_dir / 'index.npz').exists()
+        _plan('fused', stale, f'{len(source_keys)} source files -> {shard_dir}')
+        upstream = dry_run and stale
+        if stale and not dry_run:
+            if cfg.get('augmentations', {}).get('mode', 'disk') == 'disk':
+                print('Disk-level class balancing works on WAVs; skipped in fused mode')
+            from src.features.fused import run_fused
+            run_fused(DATA_ROOT, PROCESSED_ROOT, CONFIG, shard_dir=shard_dir, mfcc_dir=mfcc_dir)
+            with open(shard_dir / 'params.json', 'w') as f:
+                json.dump(shard_params, f, indent=2)
+            manifest.mark('fused', features_key)
+            manifest.save()
+        split_key = params_hash([features_key, [cfg.get(k) for k in ('train_split', 'val_split', 'test_split')]])
+        stale = upstream or not manifest.is_current('splits', split_key)
+        _plan('splits', stale)
+        if stale and not dry_run:
+            create_splits_from_shards(shard_dir, FEATURES_ROOT, SPLITS_ROOT, CONFIG)
+            manifest.mark('splits', split_key)
+            manifest.save()
+    else:
+        overrides = None
+        todo, removed = manifest.plan_files('preprocess', source_keys)
+        stale = bool(todo or removed)
+        _plan('preprocess', stale, f'{len(todo)} of {len(source_keys)} source files, {len(removed)} removed')
+        upstream = dry_run and stale
+        if stale and not dry_run:
+            for src in removed:
+                _remove(manifest.forget_file('preprocess', src))
+            results = run_preprocessing(DATA_ROOT, PROCESSED_ROOT, CONFIG, only=set(todo)) if todo else []
+            # Outputs a redone file no longer writes (e.g. under an older naming scheme) are dropped,
+            # unless another file now writes that path
+            written = {o for result in results for o in result.outputs}
+            for result in results:
+                old = manifest.files('preprocess').get(result.source, {}).get('outputs', [])
+                _remove(o for o in old if o not in written)
+                # Failed files are recorded too (without outputs), so they are retried only once they change
+                manifest.record_file('preprocess', result.source, source_keys[result.source], result.outputs)
+            manifest.save()
+
+        if cfg.get('augmentations', {}).get('mode', 'disk') == 'disk':
+            balance_key = params_hash([source_keys, cfg.get('augmentations', {}), preprocess_params(cfg)])
+            stale = upstream or not manifest.is_current('balance', balance_key)
+            _plan('balance', stale, 'regenerates aug_* WAVs')
+            upstream = dry_run and (upstream or stale)
+            if stale and not dry_run:
+                check_and_balance(PROCESSED_ROOT / 'processed', CONFIG)
+                manifest.mark('balance', balance_key)
+                manifest.save()
+        else:
+            _plan('balance', False, 'skipped: tensor augmentation')
+
+        fparams = feature_params(cfg)
+        version = 'v_' + params_hash(fparams)
+        features_root = FEATURES_ROOT / version
+        stage = f'features/{version}'
+        wav_keys = _wav_keys(cfg, hashes, version)
+        todo, removed = manifest.plan_files(stage, wav_keys)
+        stale = bool(todo or removed)
+        _plan('features', stale or upstream, f'{len(todo)} of {len(wav_keys)} WAVs, {len(removed)} removed -> '
+              f'{features_root}' + (' (plus the WAVs preprocessing writes)' if upstream else ''))
+        upstream = dry_run and (upstream or stale)
+        if not dry_run:
+            wav_keys = _wav_keys(cfg, hashes, version)
+            todo, removed = manifest.plan_files(stage, wav_keys)
+            for src in removed:
+                _remove(manifest.forget_file(stage, src))
+            if todo:
+                features_root.mkdir(parents=True, exist_ok=True)
+                with open(features_root / 'params.json', 'w') as f:
+                    json.dump(fparams, f, indent=2)
+                extract_and_save(PROCESSED_ROOT / 'processed', features_root, CONFIG, files=set(todo))
+                for src in todo:
+                    outputs = [o for o in _feature_outputs(src, features_root) if Path(o).exists()]
+                    manifest.record_file(stage, src, wav_keys[src], outputs)
+            manifest.save()
+        features_key = params_hash(wav_keys)
+
+        split_key = params_hash([features_key, [cfg.get(k) for k in ('train_split', 'val_split', 'test_split')]])
+        stale = upstream or not manifest.is_current('splits', split_key)
+        _plan('splits', stale)
+        if stale and not dry_run:
+            create_stratified_splits(features_root, SPLITS_ROOT, CONFIG)
+            manifest.mark('splits', split_key)
+            manifest.save()
+    upstream = dry_run and (upstream or stale)
+
+    train_params = {k: v for k, v in cfg.items() if k not in NON_TRAINING_KEYS}
+    train_key = params_hash([features_key, _digest(hashes, SPLITS_ROOT / 'train.csv'),
+                             _digest(hashes, SPLITS_ROOT / 'val.csv'), train_params])
+    stale = upstream or not manifest.is_current('train', train_key) or not MODEL_OUT.exists()
+    _plan('train', stale, str(MODEL_OUT))
+    upstream = dry_run and (upstream or stale)
+    if stale and not dry_run:
+        MODEL_OUT.parent.mkdir(parents=True, exist_ok=True)
+        train_model(CONFIG, SPLITS_ROOT / 'train.csv', SPLITS_ROOT / 'val.csv', MODEL_OUT, overrides=overrides)
+        manifest.mark('train', train_key)
+        manifest.save()
+
+    eval_key = params_hash([features_key, _digest(hashes, MODEL_OUT), _digest(hashes, SPLITS_ROOT / 'test.csv'),
+                            train_params, cfg.get('evaluation', {})])
+    stale = upstream or not manifest.is_current('evaluate', eval_key)
+    _plan('evaluate', stale)
+    if stale and not dry_run:
+        evaluate_model(MODEL_OUT, SPLITS_ROOT / 'test.csv', cfg_path=CONFIG, overrides=overrides)
+        manifest.mark('evaluate', eval_key)
+        manifest.save()
+    # Files whose size or mtime changed since the last run are read again to see if their content did
+    print(f'{hashes.hashed} file(s) re-hashed')
+    hashes.save()
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('--run', action='store_true', help='Run full pipeline')
+    parser.add_argument('--run', action='store_true', help='Run the pipeline stages that are out of date')
+    parser.add_argument('--dry-run', action='store_true', help='Only print which stages would run')
+    parser.add_argument('--fused', action='store_true',
+                        help='Decode each file once and write features straight to shards (needs data.format: shards)')
     args = parser.parse_args()
-    if args.run:
-        run_all()
+    if args.run or args.dry_run:
+        run_all(fused=args.fused, dry_run=args.dry_run)
     else:
-        print('Use --run to execute the full pipeline')
+        print('Use --run to execute the full pipeline (--dry-run to see what would run)')
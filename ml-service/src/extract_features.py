@@ -79,6 +79,7 @@ def extract_features(
     data_dir: str,
     output_csv: str = FEATURES_CSV,
     max_files: int | None = None,
+    manifest_csv: str | None = None,
 ) -> None:
     """
     Extract features from all supported audio files in data_dir.
@@ -88,15 +89,23 @@ def extract_features(
         data_dir: Directory containing audio files (searched recursively).
         output_csv: Path for the output CSV.
         max_files: If set, process at most this many files (useful for large datasets).
+        manifest_csv: Optional file list exported from the dataset manifest
+            (python run_manifest.py <data_dir> --csv <file>). Files are taken from it
+            instead of walking data_dir, and files whose headers report no audio are skipped.
     """
     data_path = Path(data_dir)
     if not data_path.is_dir():
         raise NotADirectoryError(f"Data directory not found: {data_dir}")
     exts = {".wav", ".mp3", ".flac", ".ogg", ".m4a"}
-    audio_files = [
-        str(p) for p in data_path.rglob("*")
-        if p.suffix.lower() in exts and p.is_file()
-    ]
+    if manifest_csv is not None:
+        listed = pd.read_csv(manifest_csv)
+        listed = listed[listed["duration"].fillna(0) > 0]
+        audio_files = [p for p in listed["filepath"].astype(str) if Path(p).suffix.lower() in exts]
+    else:
+        audio_files = [
+            str(p) for p in data_path.rglob("*")
+            if p.suffix.lower() in exts and p.is_file()
+        ]
     # If output CSV exists, read already-processed filepaths and skip them (resume support)
     processed_paths = set()
     out_path = Path(output_csv)
@@ -153,5 +162,6 @@ if __name__ == "__main__":
     import sys
     data_directory = sys.argv[1] if len(sys.argv) > 1 else "data"
     out = sys.argv[2] if len(sys.argv) > 2 else FEATURES_CSV
-    max_f = int(sys.argv[3]) if len(sys.argv) > 3 else None
-    extract_features(data_directory, out, max_files=max_f)
+    max_f = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] != "all" else None
+    manifest = sys.argv[4] if len(sys.argv) > 4 else None
+    extract_features(data_directory, out, max_files=max_f, manifest_csv=manifest)
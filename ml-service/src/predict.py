@@ -26,7 +26,7 @@ def _setup_numpy_compatibility():
         sys.modules['numpy.core'] = numpy._core
 
 
-def _load_artifact(model_path: str) -> dict:
+def load_artifact(model_path: str) -> dict:
     """Load pickled model with NumPy compatibility handling"""
     path = Path(model_path)
     if not path.is_file():
@@ -51,24 +51,21 @@ def _load_artifact(model_path: str) -> dict:
         raise
 
 
-def predict(audio_path: str, model_path: str = MODEL_SAVE_PATH) -> tuple[str, float]:
+def classify_features(feature_vector: np.ndarray, artifact: dict) -> tuple[str, float]:
     """
-    Run VoiceShield on a single audio file.
+    Classify one extracted feature vector with an already-loaded artifact.
 
     Args:
-        audio_path: Path to the audio file.
-        model_path: Path to the saved model pickle.
+        feature_vector: 1D vector from extract_features_from_waveform.
+        artifact: Dict returned by load_artifact (model, scaler, feature_columns).
 
     Returns:
         (label, confidence): "REAL" or "FAKE", and confidence in [0, 1].
     """
-    artifact = _load_artifact(model_path)
     model = artifact["model"]
     scaler = artifact["scaler"]
     feature_columns = artifact["feature_columns"]
 
-    waveform = load_and_preprocess(audio_path)
-    feature_vector = extract_features_from_waveform(waveform, TARGET_SR)
     # Ensure same order as training
     X = np.array([feature_vector])  # shape (1, n_features)
     if X.shape[1] != len(feature_columns):
@@ -86,6 +83,25 @@ def predict(audio_path: str, model_path: str = MODEL_SAVE_PATH) -> tuple[str, fl
     return label, confidence
 
 
+def predict(audio_path: str, model_path: str = MODEL_SAVE_PATH, artifact: dict | None = None) -> tuple[str, float]:
+    """
+    Run VoiceShield on a single audio file.
+
+    Args:
+        audio_path: Path to the audio file.
+        model_path: Path to the saved model pickle.
+        artifact: Optional pre-loaded artifact; skips unpickling model_path when given.
+
+    Returns:
+        (label, confidence): "REAL" or "FAKE", and confidence in [0, 1].
+    """
+    if artifact is None:
+        artifact = load_artifact(model_path)
+    waveform = load_and_preprocess(audio_path)
+    feature_vector = extract_features_from_waveform(waveform, TARGET_SR)
+    return classify_features(feature_vector, artifact)
+
+
 def _decision_to_confidence(decision: float, model) -> float:
     """
     Map Isolation Forest decision_function to a 0–1 confidence score.
@@ -5,9 +5,11 @@ AI-Generated Voice Detection Interface
 Run: streamlit run streamlit_app.py
 """
 
+import hashlib
 import os
 import sys
 import tempfile
+from collections import OrderedDict
 from pathlib import Path
 
 import streamlit as st
@@ -18,10 +20,76 @@ ROOT = Path(__file__).resolve().parent
 os.chdir(ROOT)
 sys.path.insert(0, str(ROOT))
 
-from src.predict import predict
+from src.predict import load_artifact, classify_features
+from src.preprocess import load_and_preprocess
+from src.extract_features import extract_features_from_waveform, TARGET_SR
 
 MODEL_PATH = ROOT / "models" / "voice_model.pkl"
 
+# Cache bounds: entries shared by all sessions, and results kept per browser session
+CACHE_MAX_ENTRIES = 64
+SESSION_MAX_ENTRIES = 8
+
+
+@st.cache_resource(show_spinner=False)
+def get_artifact(model_path: str, mtime: float) -> dict:
+    """Unpickle the model once per process; mtime is part of the key so retraining reloads it."""
+    return load_artifact(model_path)
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def decode_waveform(digest: str, _data: bytes, suffix: str) -> np.ndarray:
+    """Decode and preprocess uploaded bytes; cached by content digest."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_file.write(_data)
+        tmp_path = tmp_file.name
+    try:
+        return load_and_preprocess(tmp_path)
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def extract_vector(digest: str, _waveform: np.ndarray) -> np.ndarray:
+    """Feature vector for a decoded upload; cached by content digest."""
+    return extract_features_from_waveform(_waveform, TARGET_SR)
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def classify(digest: str, model_key: str, _features: np.ndarray) -> tuple[str, float]:
+    """Prediction for an upload; keyed by content digest and model version."""
+    model_path, mtime = model_key.rsplit("@", 1)
+    return classify_features(_features, get_artifact(model_path, float(mtime)))
+
+
+def result_key(data: bytes) -> tuple[str, str]:
+    """Cache key for an upload: content digest plus model version."""
+    digest = hashlib.sha256(data).hexdigest()
+    return digest, f"{MODEL_PATH}@{MODEL_PATH.stat().st_mtime}"
+
+
+def analyze(data: bytes, suffix: str, key: tuple[str, str]) -> tuple[str, float]:
+    """
+    Run the cached decode -> features -> classify chain for uploaded bytes.
+    Results are also kept in a small per-session LRU so reruns skip the shared caches.
+    """
+    results = st.session_state.setdefault("analyses", OrderedDict())
+    if key in results:
+        results.move_to_end(key)
+        return results[key]
+    digest, model_key = key
+    waveform = decode_waveform(digest, data, suffix)
+    features = extract_vector(digest, waveform)
+    result = classify(digest, model_key, features)
+    results[key] = result
+    while len(results) > SESSION_MAX_ENTRIES:
+        results.popitem(last=False)
+    return result
+
+
 # Page configuration
 st.set_page_config(
     page_title="VoiceShield - AI Voice Detection",
@@ -137,23 +205,14 @@ if uploaded_file is not None:
     # Analyze button
     st.markdown("### 🔬 Analysis")
     
-    if st.button("🚀 Analyze Voice", type="primary", use_container_width=True):
+    analyze_clicked = st.button("🚀 Analyze Voice", type="primary", use_container_width=True)
+    upload_key = result_key(uploaded_file.getvalue())
+    if analyze_clicked or upload_key in st.session_state.get("analyses", {}):
         with st.spinner("🔄 Analyzing audio... This may take a moment..."):
             try:
-                # Save uploaded file temporarily
+                # Run prediction (served from cache when this upload was already analyzed)
                 suffix = Path(uploaded_file.name).suffix or ".wav"
-                with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-                    tmp_file.write(uploaded_file.getvalue())
-                    tmp_path = tmp_file.name
-                
-                # Run prediction
-                label, confidence = predict(tmp_path, str(MODEL_PATH))
-                
-                # Clean up temp file
-                try:
-                    os.unlink(tmp_path)
-                except OSError:
-                    pass
+                label, confidence = analyze(uploaded_file.getvalue(), suffix, upload_key)
                 
                 # Display results
                 st.markdown("---")
@@ -0,0 +1,15 @@
+import argparse
+from pathlib import Path
+from src.evaluate import compare_runtime_modes
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--compile', action='store_true', help='Also benchmark torch.compile variants')
+args = parser.parse_args()
+
+MODEL = Path('models/best_model.pth')
+TEST_CSV = Path('data/splits/test.csv')
+CFG = Path('config/config.yaml')
+
+print('Benchmarking runtime modes')
+compare_runtime_modes(MODEL, TEST_CSV, cfg_path=CFG, include_compile=args.compile)
+print('Report written to logs/runtime_modes.json')
@@ -0,0 +1,36 @@
+import argparse
+import json
+from pathlib import Path
+import librosa
+import numpy as np
+from src.preprocessing.denoise import benchmark_denoisers
+from src.train import load_config
+
+parser = argparse.ArgumentParser(description='Batched spectral gate vs noisereduce: speed and output parity')
+parser.add_argument('--audio-dir', default='ml-service/data/Audio_Dataset', help='raw audio, searched recursively')
+parser.add_argument('--clips', type=int, default=64)
+parser.add_argument('--batch-size', type=int, default=32)
+parser.add_argument('--config', default='config/config.yaml')
+parser.add_argument('--out', default='logs/denoise_benchmark.json')
+args = parser.parse_args()
+
+cfg = load_config(args.config)
+sr = cfg.get('sr', 16000)
+seg_len = int(sr * cfg.get('duration', 3.0))
+exts = cfg.get('supported_extensions', ['.wav'])
+files = sorted(f for f in Path(args.audio_dir).rglob('*') if f.suffix.lower() in exts)[:args.clips]
+if not files:
+    raise SystemExit(f'No audio found under {args.audio_dir}')
+
+clips = []
+for f in files:
+    y, _ = librosa.load(f, sr=sr, mono=True, duration=cfg.get('duration', 3.0))
+    clips.append(np.pad(y, (0, seg_len - len(y))))
+result = benchmark_denoisers(np.stack(clips), sr, n_mels=cfg.get('n_mels', 128), batch_size=args.batch_size)
+
+for key, value in result.items():
+    print(f'{key:>36}: {value:.3f}' if isinstance(value, float) else f'{key:>36}: {value}')
+Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+with open(args.out, 'w') as f:
+    json.dump(result, f, indent=2)
+print('Benchmark written to', args.out)
@@ -0,0 +1,33 @@
+import argparse
+from pathlib import Path
+from src.model.cnn import PRESETS
+from src.train import train_model
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--preset', default='small', choices=sorted(PRESETS), help='Student architecture')
+parser.add_argument('--teacher', default='models/best_model.pth')
+parser.add_argument('--alpha', type=float, default=None, help='Teacher loss weight (default from config)')
+parser.add_argument('--temperature', type=float, default=None, help='Softening temperature (default from config)')
+parser.add_argument('--resume', action='store_true', help='Continue from the latest checkpoint')
+args = parser.parse_args()
+
+CFG = Path('config/config.yaml')
+TRAIN_CSV = Path('data/splits/train.csv')
+VAL_CSV = Path('data/splits/val.csv')
+MODEL_OUT = Path('models') / f'student_{args.preset}.pth'
+
+distillation = {'enabled': True, 'teacher': args.teacher}
+if args.alpha is not None:
+    distillation['alpha'] = args.alpha
+if args.temperature is not None:
+    distillation['temperature'] = args.temperature
+overrides = {
+    'model': {'preset': args.preset},
+    'distillation': distillation,
+    # keep the student's training state apart from the teacher's
+    'checkpoint': {'dir': f'models/checkpoints_student_{args.preset}'},
+}
+
+print(f'Distilling {args.teacher} into a {args.preset} student')
+train_model(CFG, TRAIN_CSV, VAL_CSV, MODEL_OUT, resume=args.resume, overrides=overrides)
+print('Student saved to', MODEL_OUT)
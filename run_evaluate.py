@@ -1,9 +1,15 @@
+import argparse
 from pathlib import Path
 from src.evaluate import evaluate_model
 
+parser = argparse.ArgumentParser()
+parser.add_argument('--no-plot', action='store_true', help='Skip the confusion matrix and score histogram PNGs')
+args = parser.parse_args()
+
 MODEL = Path('models/best_model.pth')
 TEST_CSV = Path('data/splits/test.csv')
+CFG = Path('config/config.yaml')
 
 print('Starting evaluation')
-evaluate_model(MODEL, TEST_CSV)
-print('Evaluation complete')
+evaluate_model(MODEL, TEST_CSV, cfg_path=CFG, plot=False if args.no_plot else None)
+print('Evaluation complete; summary in logs/eval_summary.json')
@@ -1,10 +1,15 @@
+import sys
 from pathlib import Path
-from src.features.extract_features import extract_and_save
+from src.features.extract_features import extract_and_save, extract_to_shards
 
 print('Starting feature extraction')
 PROCESSED_ROOT = Path('data/processed')
 FEATURES_ROOT = Path('data/features')
 CFG = Path('config/config.yaml')
 
-extract_and_save(PROCESSED_ROOT, FEATURES_ROOT, CFG)
+if '--shards' in sys.argv:
+    # Mel and MFCC shards (data.shard_dir, data.mfcc_shard_dir) instead of one .npy per clip
+    extract_to_shards(PROCESSED_ROOT, CFG)
+else:
+    extract_and_save(PROCESSED_ROOT, FEATURES_ROOT, CFG)
 print('Feature extraction complete')
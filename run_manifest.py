@@ -0,0 +1,22 @@
+import argparse
+from collections import Counter
+from pathlib import Path
+from src.data.manifest import scan
+from src.train import load_config
+
+parser = argparse.ArgumentParser(description='Build or update the manifest of an audio tree (header-probed, incremental)')
+parser.add_argument('root', nargs='?', default='ml-service/data/Audio_Dataset')
+parser.add_argument('--config', default='config/config.yaml')
+parser.add_argument('--full', action='store_true', help='Relist every directory, not only those whose mtime changed')
+parser.add_argument('--csv', help='Also export the audio files as a CSV (e.g. for ml-service/src/extract_features.py)')
+args = parser.parse_args()
+
+manifest = scan(Path(args.root), load_config(Path(args.config)), full=args.full)
+audio = [e for e in manifest.query() if e.duration is not None]
+print(f'{len(manifest.entries)} files, {len(audio)} audio, {sum(e.duration for e in audio) / 3600:.2f} h')
+for (fmt, sr, ch), n in sorted(Counter((e.format, e.sample_rate, e.channels) for e in audio).items()):
+    print(f'  {fmt:<8} {sr:>6} Hz {ch} ch: {n}')
+print('Manifest at', manifest.path)
+if args.csv:
+    manifest.to_csv(Path(args.csv))
+    print('File list written to', args.csv)
@@ -0,0 +1,13 @@
+from pathlib import Path
+from src.data.shards import pack_shards
+from src.train import load_config
+
+CFG = Path('config/config.yaml')
+SPLITS_ROOT = Path('data/splits')
+
+cfg = load_config(CFG).get('data', {})
+print('Packing feature shards')
+pack_shards([SPLITS_ROOT / 'train.csv', SPLITS_ROOT / 'val.csv', SPLITS_ROOT / 'test.csv'],
+            Path(cfg.get('shard_dir', 'data/features/shards')),
+            shard_items=cfg.get('shard_items', 1024), dtype=cfg.get('shard_dtype', 'float16'))
+print("Set data.format: shards in the config to train from them")
@@ -0,0 +1,16 @@
+from pathlib import Path
+from src.evaluate import compare_presets
+from src.model.cnn import PRESETS
+
+TEST_CSV = Path('data/splits/test.csv')
+CFG = Path('config/config.yaml')
+
+models = {'full': Path('models/best_model.pth')}
+for preset in PRESETS:
+    student = Path('models') / f'student_{preset}.pth'
+    if student.exists():
+        models[f'{preset} (student)' if preset == 'full' else preset] = student
+
+print('Comparing model presets:', ', '.join(models))
+compare_presets(models, TEST_CSV, cfg_path=CFG)
+print('Report written to logs/presets.json')
@@ -0,0 +1,15 @@
+import argparse
+from pathlib import Path
+from src.distributed import scaling_benchmark
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--procs', type=int, nargs='+', default=[1, 2, 4, 8], help='Process counts to compare')
+parser.add_argument('--steps', type=int, default=20, help='Timed training steps per process count')
+args = parser.parse_args()
+
+CFG = Path('config/config.yaml')
+TRAIN_CSV = Path('data/splits/train.csv')
+
+if __name__ == '__main__':
+    print('Benchmarking data-parallel scaling')
+    scaling_benchmark(CFG, TRAIN_CSV, procs=args.procs, steps=args.steps)
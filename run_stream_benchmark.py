@@ -0,0 +1,76 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).parent / 'Backend'))
+from streaming import StreamScorer  # noqa: E402
+from src.model.cnn import DeepCNN  # noqa: E402
+
+parser = argparse.ArgumentParser(description='Concurrent live streams one node sustains on /ws/stream')
+parser.add_argument('--streams', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='Concurrent stream counts')
+parser.add_argument('--seconds', type=float, default=30.0, help='Audio per stream')
+parser.add_argument('--chunk-ms', type=int, default=100, help='PCM chunk size clients send')
+parser.add_argument('--model', default='ml-service/tamil_deepfake/models/best_model.pth')
+parser.add_argument('--preset', default='full', help='Model preset if --model does not exist')
+parser.add_argument('--overlap', type=float, default=0.5)
+parser.add_argument('--out', default='logs/stream_benchmark.json')
+args = parser.parse_args()
+
+sr = 16000
+device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+if Path(args.model).exists():
+    model = DeepCNN.from_state_dict(torch.load(args.model, map_location=device))
+else:
+    print(f'{args.model} not found; timing an untrained {args.preset!r} model')
+    model = DeepCNN.from_preset(args.preset)
+model = model.to(device).eval()
+audio = np.random.default_rng(0).normal(0, 0.1, int(sr * args.seconds)).astype(np.float32)
+chunk = sr * args.chunk_ms // 1000
+
+
+def run_stream(latencies):
+    scorer = StreamScorer(model, device, sr=sr, overlap=args.overlap)
+    for start in range(0, len(audio), chunk):
+        t = time.perf_counter()
+        if scorer.feed(audio[start:start + chunk]):
+            latencies.append(time.perf_counter() - t)
+    scorer.finish()
+
+
+# Warm-up, so the first count does not pay for allocator and kernel setup
+run_stream([])
+results = []
+for n in args.streams:
+    latencies = [[] for _ in range(n)]
+    threads = [threading.Thread(target=run_stream, args=(lat,)) for lat in latencies]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    lat = np.concatenate([np.asarray(x) for x in latencies if x]) * 1000
+    # Streams arrive in real time, so n streams keep up while n x the audio is processed within its duration
+    realtime = n * args.seconds / elapsed
+    results.append({'streams': n, 'seconds': round(elapsed, 3), 'aggregate_realtime': round(realtime, 2),
+                    'keeps_up': bool(realtime >= n), 'window_latency_ms_p50': round(float(np.percentile(lat, 50)), 2),
+                    'window_latency_ms_p99': round(float(np.percentile(lat, 99)), 2)})
+    print(f"{n:>4} streams: {realtime:7.1f}x realtime in total, window latency "
+          f"p50 {results[-1]['window_latency_ms_p50']} ms, p99 {results[-1]['window_latency_ms_p99']} ms"
+          + ('' if realtime >= n else '  (falls behind)'))
+
+sustained = max([r['streams'] for r in results if r['keeps_up']], default=0)
+capacity = int(max(r['aggregate_realtime'] for r in results))
+print(f'Sustains {sustained} of the tested stream counts; about {capacity} real-time streams at full load '
+      f'on {torch.get_num_threads()} CPU threads ({device.type})')
+Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+with open(args.out, 'w') as f:
+    json.dump({'device': device.type, 'threads': torch.get_num_threads(), 'chunk_ms': args.chunk_ms,
+               'overlap': args.overlap, 'runs': results, 'sustained_streams': sustained,
+               'estimated_capacity': capacity}, f, indent=2)
+print('Benchmark written to', args.out)
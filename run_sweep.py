@@ -0,0 +1,11 @@
+import argparse
+from pathlib import Path
+from src.sweep import run_sweep
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--config', default='config/sweep.yaml', help='Sweep definition (search space, halving, parallelism)')
+args = parser.parse_args()
+
+if __name__ == '__main__':
+    print('Starting hyperparameter sweep')
+    run_sweep(Path(args.config))
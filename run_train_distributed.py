@@ -0,0 +1,34 @@
+import argparse
+import os
+from pathlib import Path
+from src.distributed import cleanup, init_from_env, launch
+from src.train import train_model
+
+parser = argparse.ArgumentParser(description='Data-parallel CPU training (gloo). batch_size in the config is per process.')
+parser.add_argument('--nproc', type=int, default=2, help='Processes on this node')
+parser.add_argument('--nnodes', type=int, default=1)
+parser.add_argument('--node-rank', type=int, default=0)
+parser.add_argument('--master-addr', default='127.0.0.1')
+parser.add_argument('--master-port', type=int, default=29500)
+parser.add_argument('--resume', action='store_true', help='Continue from the latest checkpoint')
+args = parser.parse_args()
+
+CFG = Path('config/config.yaml')
+TRAIN_CSV = Path('data/splits/train.csv')
+VAL_CSV = Path('data/splits/val.csv')
+MODEL_OUT = Path('models/best_model.pth')
+
+if __name__ == '__main__':
+    train_args = (CFG, TRAIN_CSV, VAL_CSV, MODEL_OUT, args.resume)
+    if 'RANK' in os.environ:
+        # Started by torchrun, which already set up one process per rank
+        init_from_env()
+        try:
+            train_model(*train_args)
+        finally:
+            cleanup()
+    else:
+        print(f'Starting training on {args.nproc} process(es) x {args.nnodes} node(s)')
+        launch(train_model, train_args, nproc=args.nproc, nnodes=args.nnodes, node_rank=args.node_rank,
+               master_addr=args.master_addr, master_port=args.master_port)
+        print('Training finished')
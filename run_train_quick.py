@@ -1,11 +1,16 @@
+import argparse
 from pathlib import Path
 from src.train import train_model
 
+parser = argparse.ArgumentParser()
+parser.add_argument('--resume', action='store_true', help='Continue from the latest checkpoint')
+args = parser.parse_args()
+
 CFG = Path('config/config_quick.yaml')
 TRAIN_CSV = Path('data/splits/train.csv')
 VAL_CSV = Path('data/splits/val.csv')
 MODEL_OUT = Path('models/best_model.pth')
 
 print('Starting training (quick: 5 epochs)')
-train_model(CFG, TRAIN_CSV, VAL_CSV, MODEL_OUT)
+train_model(CFG, TRAIN_CSV, VAL_CSV, MODEL_OUT, resume=args.resume)
 print('Training finished')
@@ -0,0 +1,119 @@
+from typing import Sequence
+import torch
+from src.data.loader import batched_collate
+
+
+def augment_settings(cfg: dict) -> dict:
+    aug_cfg = cfg.get('augmentations', {})
+    return {
+        'mode': aug_cfg.get('mode', 'disk'),
+        'balance': aug_cfg.get('balance', 'none'),
+        'prob': aug_cfg.get('prob', 0.5),
+        'freq_masks': aug_cfg.get('freq_masks', 2),
+        'freq_mask_width': aug_cfg.get('freq_mask_width', 16),
+        'time_masks': aug_cfg.get('time_masks', 2),
+        'time_mask_width': aug_cfg.get('time_mask_width', 20),
+        'gain_db': aug_cfg.get('gain_db', [-6.0, 6.0]),
+        'noise_snr_db': aug_cfg.get('noise_snr_db', [15, 20]),
+        'top_db': aug_cfg.get('top_db', 80.0),
+    }
+
+
+def _chosen(x: torch.Tensor, prob: float, generator: torch.Generator = None) -> torch.Tensor:
+    """Per-sample boolean, broadcastable over (batch, channel, mels, frames)."""
+    return (torch.rand(x.shape[0], device=x.device, generator=generator) < prob).view(-1, 1, 1, 1)
+
+
+def add_noise(x: torch.Tensor, snr_db: Sequence[float], prob: float, top_db: float = 80.0,
+              valid: torch.Tensor = None, generator: torch.Generator = None) -> torch.Tensor:
+    """Adds white noise in the power domain at an SNR picked per sample from snr_db.
+
+    Features are power_to_db(mel, ref=max), so the result is re-referenced to its
+    maximum and floored at -top_db like the extracted features. `valid` marks the
+    unpadded frames of a padded batch; padding is left out of the statistics.
+    """
+    if valid is None:
+        valid = torch.ones_like(x, dtype=torch.bool)
+    power = torch.pow(10.0, x / 10.0) * valid
+    snr = torch.tensor(list(snr_db), dtype=x.dtype, device=x.device)
+    snr = snr[torch.randint(len(snr), (x.shape[0],), device=x.device, generator=generator)].view(-1, 1, 1, 1)
+    signal = power.sum(dim=(1, 2, 3), keepdim=True) / (valid.expand_as(x).sum(dim=(1, 2, 3), keepdim=True))
+    noise_level = signal / torch.pow(10.0, snr / 10.0)
+    # Power of white noise in a band is exponentially distributed
+    noise = noise_level * torch.empty_like(power).exponential_(generator=generator)
+    noisy = 10.0 * torch.log10(power + noise)
+    peak = noisy.masked_fill(~valid, float('-inf')).amax(dim=(1, 2, 3), keepdim=True)
+    noisy = (noisy - peak).clamp_(min=-top_db)
+    return torch.where(_chosen(x, prob, generator), noisy, x)
+
+
+def random_gain(x: torch.Tensor, gain_db: Sequence[float], prob: float,
+                generator: torch.Generator = None) -> torch.Tensor:
+    """Shifts each chosen sample by a uniform gain in [gain_db[0], gain_db[1]] dB."""
+    lo, hi = gain_db
+    gain = torch.empty(x.shape[0], 1, 1, 1, dtype=x.dtype, device=x.device).uniform_(lo, hi, generator=generator)
+    return x + gain * _chosen(x, prob, generator)
+
+
+def mask_along(x: torch.Tensor, dim: int, n_masks: int, max_width: int, prob: float,
+               valid: torch.Tensor = None, generator: torch.Generator = None) -> torch.Tensor:
+    """SpecAugment masks: n_masks bands of up to max_width bins along dim, set to each sample's floor."""
+    size = x.shape[dim]
+    if n_masks <= 0 or max_width <= 0 or size == 0:
+        return x
+    b = x.shape[0]
+    width = torch.randint(0, min(max_width, size) + 1, (b, n_masks), device=x.device, generator=generator)
+    start = (torch.rand(b, n_masks, device=x.device, generator=generator) * (size - width + 1)).long()
+    pos = torch.arange(size, device=x.device).view(1, 1, -1)
+    hit = ((pos >= start.unsqueeze(-1)) & (pos < (start + width).unsqueeze(-1))).any(dim=1)
+    hit &= _chosen(x, prob, generator).view(-1, 1)
+    shape = [b, 1, 1, 1]
+    shape[dim] = size
+    floor = (x if valid is None else x.masked_fill(~valid, float('inf'))).amin(dim=(1, 2, 3), keepdim=True)
+    return torch.where(hit.view(shape), floor, x)
+
+
+def augment_batch(x: torch.Tensor, settings: dict, lengths: torch.Tensor = None,
+                  generator: torch.Generator = None) -> torch.Tensor:
+    """Applies noise, gain, frequency and time masks to a (batch, 1, mels, frames) tensor.
+
+    For a zero-padded batch pass the per-clip frame counts; padding stays zero.
+    Draws from `generator` (a CPU generator) or, without one, torch's global RNG.
+    """
+    valid = None
+    if lengths is not None:
+        valid = (torch.arange(x.shape[-1], device=x.device) < lengths.to(x.device).unsqueeze(1))[:, None, None, :]
+    prob = settings['prob']
+    if settings['noise_snr_db']:
+        x = add_noise(x, settings['noise_snr_db'], prob, settings['top_db'], valid, generator)
+    if settings['gain_db']:
+        x = random_gain(x, settings['gain_db'], prob, generator)
+    x = mask_along(x, 2, settings['freq_masks'], settings['freq_mask_width'], prob, valid, generator)
+    x = mask_along(x, 3, settings['time_masks'], settings['time_mask_width'], prob, valid, generator)
+    return x if valid is None else x * valid
+
+
+class AugmentCollate:
+    """Collate function that stacks a batch and augments it in one vectorised pass.
+
+    Runs in the DataLoader workers. With seeded=True the batch holds (item, seed)
+    pairs from a loader built with batch_seed, and the augmentation is drawn from a
+    generator with that seed, so it is the same whatever worker builds the batch and
+    a resumed run repeats it exactly. Otherwise it draws from torch's RNG, which
+    the loader seeds per worker from its generator.
+    """
+
+    def __init__(self, settings: dict, collate=batched_collate, seeded: bool = False):
+        self.settings = settings
+        self.collate = collate
+        self.seeded = seeded
+
+    def __call__(self, batch: list) -> tuple:
+        generator = None
+        if self.seeded:
+            batch, seeds = zip(*batch)
+            generator = torch.Generator().manual_seed(seeds[0])
+        out = self.collate(list(batch))
+        lengths = out[2] if len(out) == 3 else None
+        # labels (and lengths) pass through unchanged
+        return (augment_batch(out[0], self.settings, lengths, generator),) + tuple(out[1:])
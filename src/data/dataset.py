@@ -1,24 +1,98 @@
-from typing import Tuple
+from typing import Optional, Tuple
 import numpy as np
 import torch
 from torch.utils.data import Dataset
 
 
 class AudioFeatureDataset(Dataset):
-    """Loads precomputed feature numpy files and returns tensors."""
+    """Loads precomputed feature numpy files and returns tensors.
 
-    def __init__(self, csv_file: str):
+    With cache_path (see src.data.shm_cache) samples are read from one shared
+    memory-mapped array instead of per-sample files.
+    """
+
+    def __init__(self, csv_file: str, cache_path: Optional[str] = None):
         import pandas as pd
-        self.df = pd.read_csv(csv_file)
+        df = pd.read_csv(csv_file)
+        self.files = df['file'].tolist()
+        self.labels = df['label'].astype(int).tolist()
+        self.cache_path = cache_path
+        self._cache = None
+        self._lengths = None
 
     def __len__(self) -> int:
-        return len(self.df)
+        return len(self.files)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Frame count of every sample, read once from the .npy headers."""
+        if self._lengths is None:
+            if self.cache_path is not None:
+                frames = np.load(self.cache_path, mmap_mode='r').shape[-1]
+                self._lengths = np.full(len(self.files), frames, dtype=np.int64)
+            else:
+                self._lengths = np.array([np.load(f, mmap_mode='r').shape[-1] for f in self.files], dtype=np.int64)
+        return self._lengths
+
+    def __getstate__(self):
+        # Workers re-map the cache file instead of receiving a pickled copy
+        state = self.__dict__.copy()
+        state['_cache'] = None
+        return state
+
+    def _load(self, idx: int) -> np.ndarray:
+        if self.cache_path is None:
+            return np.load(self.files[idx])
+        if self._cache is None:
+            self._cache = np.load(self.cache_path, mmap_mode='r')
+        return self._cache[idx]
 
     def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
-        row = self.df.iloc[idx]
-        arr = np.load(row['file'])
+        arr = self._load(idx)
         if arr.ndim == 2:
             arr = np.expand_dims(arr, 0)
         tensor = torch.tensor(arr, dtype=torch.float32)
-        label = torch.tensor(int(row['label']), dtype=torch.float32)
+        label = torch.tensor(self.labels[idx], dtype=torch.float32)
         return tensor, label
+
+
+class FrameCrop(Dataset):
+    """Keeps the first max_frames frames of every sample, e.g. to train on shorter clips
+    than were extracted. Other attributes (labels, shard_ids, ...) come from the wrapped dataset."""
+
+    def __init__(self, ds: Dataset, max_frames: int):
+        self.ds = ds
+        self.max_frames = max_frames
+
+    def __getattr__(self, name):
+        if name == 'ds':
+            raise AttributeError(name)
+        return getattr(self.ds, name)
+
+    def __len__(self) -> int:
+        return len(self.ds)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.minimum(self.ds.lengths, self.max_frames)
+
+    def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        x, y = self.ds[idx]
+        return x[..., :self.max_frames].contiguous(), y
+
+
+def build_dataset(csv_file: str, cfg: dict) -> Dataset:
+    """Dataset for a split CSV in the feature format selected by cfg['data']['format']."""
+    data_cfg = cfg.get('data', {})
+    if data_cfg.get('format', 'npy') == 'shards':
+        from src.data.shards import ShardedFeatureDataset
+        ds = ShardedFeatureDataset(data_cfg.get('shard_dir', 'data/features/shards'), csv_file)
+    else:
+        ds = AudioFeatureDataset(csv_file)
+        cache_cfg = cfg.get('cache', {})
+        if cache_cfg.get('enabled', False):
+            from src.data.shm_cache import build_shared_cache
+            ds.cache_path = build_shared_cache(ds.files, cache_cfg.get('dir'), cache_cfg.get('max_mb', 2048))
+    if data_cfg.get('max_frames'):
+        ds = FrameCrop(ds, data_cfg['max_frames'])
+    return ds
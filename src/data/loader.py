@@ -0,0 +1,154 @@
+import os
+import time
+from typing import List, Optional, Sequence, Tuple
+import torch
+from torch.utils.data import BatchSampler, DataLoader, Dataset, Sampler, SequentialSampler
+
+
+def batched_collate(batch: List[Tuple[torch.Tensor, torch.Tensor]]) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Stacks (features, label) pairs in one call each, skipping default_collate's type dispatch."""
+    xs, ys = zip(*batch)
+    return torch.stack(xs), torch.stack(ys)
+
+
+def pad_collate(batch: List[Tuple[torch.Tensor, torch.Tensor]],
+                pad_multiple: int = 8) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Pads (features, label) pairs of different frame counts to a common width.
+
+    The width is the longest clip rounded up to pad_multiple (the encoder's total
+    pooling stride). Padding is zeros, matching the convolutions' own padding, and
+    DeepCNN masks it using the returned lengths: (features, labels, lengths).
+    """
+    xs, ys = zip(*batch)
+    lengths = torch.tensor([x.shape[-1] for x in xs], dtype=torch.long)
+    width = -(-int(lengths.max()) // pad_multiple) * pad_multiple
+    out = torch.zeros((len(xs),) + tuple(xs[0].shape[:-1]) + (width,), dtype=xs[0].dtype)
+    for i, x in enumerate(xs):
+        out[i, ..., :x.shape[-1]] = x
+    return out, torch.stack(ys), lengths
+
+
+class PadCollate:
+    """Picklable pad_collate with a fixed pad_multiple, for DataLoader workers."""
+
+    def __init__(self, pad_multiple: int = 8):
+        self.pad_multiple = pad_multiple
+
+    def __call__(self, batch):
+        return pad_collate(batch, self.pad_multiple)
+
+
+def unpack_batch(batch):
+    """(features, labels, lengths or None) from either collate's output."""
+    if len(batch) == 3:
+        return batch
+    return batch[0], batch[1], None
+
+
+class SeededDataset(Dataset):
+    """View of a dataset for SeededBatchSampler: item (index, seed) is (ds[index], seed)."""
+
+    def __init__(self, ds: Dataset):
+        self.ds = ds
+
+    def __len__(self) -> int:
+        return len(self.ds)
+
+    def __getitem__(self, key):
+        index, seed = key
+        return self.ds[index], seed
+
+
+def loader_settings(cfg: dict) -> dict:
+    dl_cfg = cfg.get('dataloader', {})
+    return {
+        'num_workers': dl_cfg.get('num_workers', 0),
+        'autotune_steps': dl_cfg.get('autotune_steps', 20),
+        'prefetch_factor': dl_cfg.get('prefetch_factor', 2),
+        'persistent_workers': dl_cfg.get('persistent_workers', True),
+        'pin_memory': dl_cfg.get('pin_memory', False) and torch.cuda.is_available(),
+        'batched_collate': dl_cfg.get('batched_collate', True),
+        'bucket_by_length': dl_cfg.get('bucket_by_length', False),
+        'bucket_window': dl_cfg.get('bucket_window', 50),
+        'pad_multiple': dl_cfg.get('pad_multiple', 8),
+    }
+
+
+def build_loader(ds: Dataset, cfg: dict, batch_size: int, shuffle: bool = False,
+                 sampler: Optional[Sampler] = None, num_workers: Optional[int] = None,
+                 collate_fn=None, generator: Optional[torch.Generator] = None,
+                 batch_sampler: Optional[Sampler] = None, batch_seed: Optional[int] = None) -> DataLoader:
+    """DataLoader configured from the `dataloader` section of the config.
+
+    With batch_sampler (e.g. BucketBatchSampler) batches come from it and
+    batch_size/shuffle/sampler are ignored. With batch_seed the batches go through
+    SeededBatchSampler: collate_fn gets (item, seed) pairs and the loader's
+    batch_sampler is the wrapper, whose set_epoch must be used.
+    """
+    settings = loader_settings(cfg)
+    workers = settings['num_workers'] if num_workers is None else num_workers
+    if workers == 'auto':
+        workers = autotune_num_workers(ds, cfg, batch_size)
+    kwargs = {}
+    if workers > 0:
+        kwargs['prefetch_factor'] = settings['prefetch_factor']
+        kwargs['persistent_workers'] = settings['persistent_workers']
+    if collate_fn is None and settings['batched_collate']:
+        collate_fn = batched_collate
+    if batch_seed is not None:
+        from src.data.samplers import SeededBatchSampler
+        if batch_sampler is None:
+            batch_sampler = BatchSampler(sampler if sampler is not None else SequentialSampler(ds), batch_size,
+                                         drop_last=False)
+        batch_sampler = SeededBatchSampler(batch_sampler, batch_size, seed=batch_seed)
+        ds = SeededDataset(ds)
+    if batch_sampler is not None:
+        kwargs['batch_sampler'] = batch_sampler
+    else:
+        kwargs.update(batch_size=batch_size, shuffle=shuffle and sampler is None, sampler=sampler)
+    return DataLoader(ds, num_workers=workers, pin_memory=settings['pin_memory'], collate_fn=collate_fn,
+                      generator=generator, **kwargs)
+
+
+def bucketed_loader(ds: Dataset, cfg: dict, batch_size: int, sampler, num_workers: Optional[int] = None,
+                    collate_fn=None, generator: Optional[torch.Generator] = None,
+                    batch_seed: Optional[int] = None) -> DataLoader:
+    """Loader over ds in length buckets drawn from `sampler`, padded by pad_collate."""
+    from src.data.samplers import BucketBatchSampler
+    settings = loader_settings(cfg)
+    batches = BucketBatchSampler(sampler, ds.lengths, batch_size, window=settings['bucket_window'],
+                                 seed=cfg.get('seed', 42))
+    return build_loader(ds, cfg, batch_size, num_workers=num_workers, generator=generator, batch_sampler=batches,
+                        collate_fn=collate_fn or PadCollate(settings['pad_multiple']), batch_seed=batch_seed)
+
+
+def measure_data_wait(loader: DataLoader, steps: int) -> float:
+    """Mean seconds spent waiting for a batch over the first `steps` batches (worker startup excluded)."""
+    it = iter(loader)
+    next(it, None)
+    waits = []
+    for _ in range(steps):
+        t0 = time.perf_counter()
+        if next(it, None) is None:
+            break
+        waits.append(time.perf_counter() - t0)
+    del it
+    return sum(waits) / max(1, len(waits))
+
+
+def autotune_num_workers(ds: Dataset, cfg: dict, batch_size: int,
+                         candidates: Sequence[int] = (0, 1, 2, 4, 8)) -> int:
+    """Picks the fewest workers whose data-wait is within 10% of the best measured candidate."""
+    steps = loader_settings(cfg)['autotune_steps']
+    max_workers = os.cpu_count() or 1
+    results = {}
+    for workers in candidates:
+        if workers > max_workers:
+            continue
+        loader = build_loader(ds, cfg, batch_size, shuffle=True, num_workers=workers)
+        results[workers] = measure_data_wait(loader, steps)
+        print(f'  num_workers={workers}: {results[workers] * 1000:.1f} ms data-wait/step')
+    best = min(results.values())
+    chosen = min(w for w, t in results.items() if t <= best * 1.1)
+    print('Auto-tuned num_workers =', chosen)
+    return chosen
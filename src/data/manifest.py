@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from src.utils.audio_probe import AUDIO_EXTENSIONS, probe
+from src.utils.stages import _atomic_json
+
+MANIFEST_VERSION = 2
+# A directory listed less than this long after its last change is listed again next
+# time: a change in the same mtime tick as the listing would not move the mtime.
+# Covers coarse clocks too (ext4 ticks every few ms, FAT every 2 s).
+RACY_NS = 2 * 10 ** 9
+
+
+@dataclass
+class FileEntry:
+    """One file of a scanned tree; the audio fields are None for files that are not audio."""
+    path: Path
+    size: int
+    mtime_ns: int
+    format: Optional[str] = None
+    channels: Optional[int] = None
+    sample_rate: Optional[int] = None
+    duration: Optional[float] = None
+
+
+def manifest_settings(cfg: Optional[dict]) -> dict:
+    m_cfg = (cfg or {}).get('manifest', {})
+    return {
+        'dir': m_cfg.get('dir', 'data/manifests'),
+        'workers': m_cfg.get('workers', 16),
+    }
+
+
+def _scan_dir(path: str):
+    """(mtime_ns, subdirectory names, {file name: (size, mtime_ns)}, listing time_ns) of one directory.
+
+    None if it is gone.
+    """
+    try:
+        listed = time.time_ns()
+        mtime = os.stat(path).st_mtime_ns
+        dirs, files = [], {}
+        with os.scandir(path) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    dirs.append(e.name)
+                elif e.is_file():
+                    st = e.stat()
+                    files[e.name] = (st.st_size, st.st_mtime_ns)
+        return mtime, sorted(dirs), files, listed
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+class DatasetManifest:
+    """Every file under a root with its size, mtime and, for audio, header-probed format and duration.
+
+    The manifest is kept in a JSON file and refreshed incrementally: a directory
+    whose mtime is unchanged, and was already RACY_NS old when it was listed,
+    keeps its recorded listing without being listed again, and only new or changed audio files are probed. Directories are
+    listed and files probed on a thread pool. A file rewritten in place (same
+    name, directory untouched) is only noticed by refresh(full=True).
+    """
+
+    def __init__(self, root: Path, path: Path, workers: int = 16):
+        self.root = Path(root)
+        self.path = Path(path)
+        self.workers = max(1, workers)
+        self.dirs: Dict[str, list] = {}
+        self.entries: Dict[str, list] = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION and data.get('root') == str(self.root.resolve()):
+                self.dirs, self.entries = data['dirs'], data['files']
+        self.probed = 0
+        self.relisted = 0
+
+    def _abs(self, rel: str) -> str:
+        return str(self.root / rel) if rel else str(self.root)
+
+    def refresh(self, full: bool = False) -> 'DatasetManifest':
+        """Brings the manifest up to date with the tree; full=True relists every directory."""
+        self.probed = self.relisted = 0
+        seen, to_probe = set(), []
+        level = [''] if self.root.is_dir() else []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while level:
+                # Only directories whose mtime moved are listed again; unchanged ones reuse their
+                # record, unless it was taken too soon after the change to be trusted ("racy")
+                stale = []
+                for rel in level:
+                    record = self.dirs.get(rel)
+                    try:
+                        current = (not full and record is not None and record[0] < record[3] - RACY_NS
+                                   and os.stat(self._abs(rel)).st_mtime_ns == record[0])
+                    except FileNotFoundError:
+                        continue
+                    if not current:
+                        stale.append(rel)
+                    seen.add(rel)
+                self.relisted += len(stale)
+                for rel, listing in zip(stale, pool.map(_scan_dir, [self._abs(r) for r in stale])):
+                    old = self.dirs.get(rel, [0, [], []])
+                    if listing is None:
+                        seen.discard(rel)
+                        continue
+                    mtime, subdirs, files, listed = listing
+                    for name in set(old[2]) - set(files):
+                        self.entries.pop(f'{rel}/{name}' if rel else name, None)
+                    for name, (size, file_mtime) in files.items():
+                        key = f'{rel}/{name}' if rel else name
+                        entry = self.entries.get(key)
+                        if entry is None or entry[0] != size or entry[1] != file_mtime:
+                            self.entries[key] = [size, file_mtime, None, None, None, None]
+                            if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                                to_probe.append(key)
+                    self.dirs[rel] = [mtime, subdirs, sorted(files), listed]
+                level = [f'{rel}/{d}' if rel else d for rel in level if rel in seen for d in self.dirs[rel][1]]
+            for key, info in zip(to_probe, pool.map(probe, [self._abs(k) for k in to_probe])):
+                if info is not None:
+                    self.entries[key][2:] = [info.format, info.channels, info.sample_rate, info.duration]
+        self.probed = len(to_probe)
+        # Directories no longer reachable take their files with them
+        for rel in [r for r in self.dirs if r not in seen]:
+            self.relisted += 1
+            for name in self.dirs.pop(rel)[2]:
+                self.entries.pop(f'{rel}/{name}' if rel else name, None)
+        return self
+
+    def query(self, subdir: str = '', exts: Optional[Iterable[str]] = None,
+              prefix: str = '', recursive: bool = True) -> List[FileEntry]:
+        """Entries under root/subdir with one of exts and a name starting with prefix, sorted by path."""
+        exts = {e.lower() for e in exts} if exts is not None else None
+        base = subdir.strip('/')
+        out = []
+        for key in sorted(self.entries):
+            parent, _, name = key.rpartition('/')
+            if base and not (parent == base or (recursive and parent.startswith(base + '/'))):
+                continue
+            if not base and not recursive and parent:
+                continue
+            if not name.startswith(prefix) or (exts is not None and os.path.splitext(name)[1].lower() not in exts):
+                continue
+            out.append(FileEntry(self.root / key, *self.entries[key]))
+        return out
+
+    def save(self):
+        _atomic_json(self.path, {'version': MANIFEST_VERSION, 'root': str(self.root.resolve()),
+                                 'dirs': self.dirs, 'files': self.entries})
+
+    def to_csv(self, path: Path, exts: Optional[Iterable[str]] = None):
+        """Writes the audio entries (optionally only those with exts) as a CSV, e.g. for ml-service's extract_features."""
+        import pandas as pd
+        rows = [{'filepath': os.path.abspath(e.path), 'size': e.size, 'format': e.format, 'channels': e.channels,
+                 'sample_rate': e.sample_rate, 'duration': e.duration} for e in self.query(exts=exts)
+                if e.format is not None]
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(rows, columns=['filepath', 'size', 'format', 'channels', 'sample_rate', 'duration']).to_csv(
+            path, index=False)
+
+
+# Manifests already loaded in this process, so stages sharing a tree do not re-read its JSON
+_LOADED: Dict[str, DatasetManifest] = {}
+
+
+def manifest_path(root: Path, manifest_dir: Path) -> Path:
+    root = Path(root).resolve()
+    return Path(manifest_dir) / f'{root.name}_{hashlib.sha1(str(root).encode()).hexdigest()[:10]}.json'
+
+
+def scan(root: Path, cfg: Optional[dict] = None, full: bool = False) -> DatasetManifest:
+    """The up-to-date manifest of root, loaded from (and saved back to) manifest.dir."""
+    settings = manifest_settings(cfg)
+    path = manifest_path(root, settings['dir'])
+    manifest = _LOADED.get(str(path))
+    if manifest is None:
+        manifest = _LOADED[str(path)] = DatasetManifest(root, path, settings['workers'])
+    start = time.perf_counter()
+    manifest.refresh(full=full)
+    if manifest.relisted or not manifest.path.exists():
+        print(f'Manifest of {root}: {len(manifest.entries)} files, {manifest.relisted} directories listed, '
+              f'{manifest.probed} files probed in {time.perf_counter() - start:.1f}s')
+        manifest.save()
+    return manifest
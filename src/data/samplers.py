@@ -0,0 +1,171 @@
+from typing import Iterator
+import numpy as np
+from torch.utils.data import Sampler
+
+
+class EpochShuffleSampler(Sampler):
+    """Seeded per-epoch permutation that can resume part-way through an epoch.
+
+    The order depends only on (seed, epoch), so a resumed run sees exactly the
+    samples the interrupted run had not reached yet. With num_replicas > 1 each
+    rank takes every num_replicas-th index; pad=True repeats a few indices so all
+    ranks run the same number of steps (needed for gradient all-reduce).
+    """
+
+    def __init__(self, num_items: int, seed: int = 42, shuffle: bool = True,
+                 num_replicas: int = 1, rank: int = 0, pad: bool = True):
+        self.num_items = num_items
+        self.seed = seed
+        self.shuffle = shuffle
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.pad = pad
+        self.epoch = 0
+        self.start = 0
+
+    def set_epoch(self, epoch: int, start: int = 0):
+        """Select the epoch's order; `start` skips that many of this rank's samples."""
+        self.epoch = epoch
+        self.start = start
+
+    def order(self) -> np.ndarray:
+        if not self.shuffle:
+            return np.arange(self.num_items)
+        return np.random.default_rng(self.seed + self.epoch).permutation(self.num_items)
+
+    def _rank_order(self) -> np.ndarray:
+        order = self.order()
+        if self.num_replicas == 1:
+            return order
+        if self.pad and len(order) % self.num_replicas:
+            extra = self.num_replicas - len(order) % self.num_replicas
+            order = np.concatenate([order, np.resize(order, extra)])
+        return order[self.rank::self.num_replicas]
+
+    def __len__(self) -> int:
+        if self.num_replicas == 1:
+            per_rank = self.num_items
+        elif self.pad:
+            per_rank = -(-self.num_items // self.num_replicas)
+        else:
+            per_rank = len(range(self.rank, self.num_items, self.num_replicas))
+        return max(0, per_rank - self.start)
+
+    def __iter__(self) -> Iterator[int]:
+        yield from self._rank_order()[self.start:].tolist()
+
+
+class ShardShuffleSampler(EpochShuffleSampler):
+    """Shuffles shard order, then items within each shard.
+
+    Consecutive indices stay inside one memory-mapped shard, so reads are mostly
+    sequential while every epoch still sees a different order.
+    """
+
+    def __init__(self, shard_ids: np.ndarray, seed: int = 42, shuffle: bool = True,
+                 num_replicas: int = 1, rank: int = 0, pad: bool = True):
+        super().__init__(len(shard_ids), seed=seed, shuffle=shuffle,
+                         num_replicas=num_replicas, rank=rank, pad=pad)
+        self.shard_ids = np.asarray(shard_ids)
+        self.groups = [np.flatnonzero(self.shard_ids == s) for s in np.unique(self.shard_ids)]
+
+    def order(self) -> np.ndarray:
+        if not self.shuffle:
+            return np.concatenate(self.groups) if self.groups else np.arange(0)
+        rng = np.random.default_rng(self.seed + self.epoch)
+        parts = [rng.permutation(self.groups[g]) for g in rng.permutation(len(self.groups))]
+        return np.concatenate(parts) if parts else np.arange(0)
+
+
+class BalancedSampler(EpochShuffleSampler):
+    """Draws each epoch's indices with replacement so every class is equally likely.
+
+    Replaces writing augmented minority-class copies to disk: repeated draws of the
+    same clip differ once on-the-fly augmentation (src.data.augment) is enabled.
+    """
+
+    def __init__(self, labels, seed: int = 42, num_samples: int = None,
+                 num_replicas: int = 1, rank: int = 0):
+        labels = np.asarray(labels)
+        super().__init__(num_samples or len(labels), seed=seed, num_replicas=num_replicas, rank=rank)
+        _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+        self.weights = 1.0 / (len(counts) * counts[inverse])
+
+    def order(self) -> np.ndarray:
+        rng = np.random.default_rng(self.seed + self.epoch)
+        return rng.choice(len(self.weights), size=self.num_items, replace=True, p=self.weights)
+
+
+class BucketBatchSampler(Sampler):
+    """Batches indices from a base sampler so each batch holds clips of similar length.
+
+    Within windows of `window` batches the base order is sorted by frame count and
+    cut into batches, whose order is then shuffled; padding per batch stays small
+    while the base sampler still decides which clips (and which rank) come when.
+    """
+
+    def __init__(self, sampler: EpochShuffleSampler, lengths, batch_size: int, window: int = 50, seed: int = 42):
+        self.sampler = sampler
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.window = window
+        self.seed = seed
+        self.epoch = 0
+        self.skip = 0
+
+    def set_epoch(self, epoch: int, start: int = 0):
+        """Like EpochShuffleSampler.set_epoch; `start` counts samples and skips whole batches."""
+        self.sampler.set_epoch(epoch)
+        self.epoch = epoch
+        self.skip = start // self.batch_size
+
+    def batches(self) -> list:
+        idx = np.fromiter(iter(self.sampler), dtype=np.int64)
+        span = self.window * self.batch_size
+        out = []
+        for s in range(0, len(idx), span):
+            chunk = idx[s:s + span]
+            chunk = chunk[np.argsort(self.lengths[chunk], kind='stable')]
+            out.extend(chunk[i:i + self.batch_size] for i in range(0, len(chunk), self.batch_size))
+        if self.sampler.shuffle:
+            order = np.random.default_rng(self.seed + self.epoch).permutation(len(out))
+            out = [out[i] for i in order]
+        return [b.tolist() for b in out]
+
+    def __len__(self) -> int:
+        return max(0, -(-len(self.sampler) // self.batch_size) - self.skip)
+
+    def __iter__(self) -> Iterator[list]:
+        yield from self.batches()[self.skip:]
+
+
+class SeededBatchSampler(Sampler):
+    """Tags every index of a batch with a seed derived from (seed, epoch, batch number).
+
+    The collate function augments each batch from a generator with that seed, so
+    the draws do not depend on which worker built the batch or how many it built
+    before; a run resumed part-way through an epoch augments its remaining batches
+    exactly as the interrupted run would have, whatever num_workers is.
+    """
+
+    def __init__(self, batches: Sampler, batch_size: int, seed: int = 42):
+        self.batches = batches
+        self.batch_size = batch_size
+        self.seed = seed
+        self.epoch = 0
+        self.first = 0
+
+    def set_epoch(self, epoch: int, start: int = 0):
+        """Sets the epoch of the wrapped batch sampler (or of its base sampler); `start` counts samples."""
+        target = self.batches if hasattr(self.batches, 'set_epoch') else self.batches.sampler
+        target.set_epoch(epoch, start=start)
+        self.epoch = epoch
+        self.first = start // self.batch_size
+
+    def __len__(self) -> int:
+        return len(self.batches)
+
+    def __iter__(self) -> Iterator[list]:
+        for k, batch in enumerate(self.batches, self.first):
+            seed = int(np.random.SeedSequence([self.seed, self.epoch, k]).generate_state(1)[0])
+            yield [(i, seed) for i in batch]
@@ -0,0 +1,157 @@
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+
+INDEX_FILE = 'index.npz'
+META_FILE = 'meta.json'
+
+
+def item_name(file: str) -> str:
+    """Stem of a feature path; split CSVs may contain Windows separators."""
+    return re.split(r'[\\/]', str(file))[-1].rsplit('.', 1)[0]
+
+
+def _atomic_save(path: Path, arr: np.ndarray):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+class ShardWriter:
+    """Appends 2D features (n_bins, frames) to large shards and writes an offset index on close.
+
+    Each shard is a (total_frames, n_bins) array, so every item is one contiguous block
+    that can be sliced straight out of a memory map.
+    """
+
+    def __init__(self, out_dir: Path, shard_items: int = 1024, dtype: str = 'float32'):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_items = shard_items
+        self.dtype = np.dtype(dtype)
+        self._buffer: List[np.ndarray] = []
+        self._buffer_frames = 0
+        self.shard_files: List[str] = []
+        self.names: List[str] = []
+        self.labels: List[int] = []
+        self.shards: List[int] = []
+        self.offsets: List[int] = []
+        self.lengths: List[int] = []
+        self.n_bins: Optional[int] = None
+
+    def add(self, name: str, arr: np.ndarray, label: int):
+        if arr.ndim == 3:
+            arr = arr[0]
+        if self.n_bins is None:
+            self.n_bins = arr.shape[0]
+        elif arr.shape[0] != self.n_bins:
+            raise ValueError(f'{name}: expected {self.n_bins} bins, got {arr.shape[0]}')
+        self.names.append(name)
+        self.labels.append(int(label))
+        self.shards.append(len(self.shard_files))
+        self.offsets.append(self._buffer_frames)
+        self.lengths.append(arr.shape[1])
+        self._buffer.append(np.ascontiguousarray(arr.T, dtype=self.dtype))
+        self._buffer_frames += arr.shape[1]
+        if len(self._buffer) >= self.shard_items:
+            self.flush()
+
+    def flush(self):
+        """Write buffered items as a new shard; also used to start a shard at split boundaries."""
+        if not self._buffer:
+            return
+        fname = f'shard_{len(self.shard_files):04d}.npy'
+        _atomic_save(self.out_dir / fname, np.concatenate(self._buffer, axis=0))
+        self.shard_files.append(fname)
+        self._buffer = []
+        self._buffer_frames = 0
+
+    def close(self) -> dict:
+        self.flush()
+        np.savez(self.out_dir / INDEX_FILE,
+                 name=np.array(self.names), label=np.array(self.labels, dtype=np.int64),
+                 shard=np.array(self.shards, dtype=np.int32), offset=np.array(self.offsets, dtype=np.int64),
+                 length=np.array(self.lengths, dtype=np.int32))
+        meta = {'n_bins': self.n_bins, 'dtype': self.dtype.name, 'num_items': len(self.names),
+                'shards': self.shard_files}
+        with open(self.out_dir / META_FILE, 'w') as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+
+def pack_shards(csv_files: Sequence[Path], out_dir: Path, shard_items: int = 1024, dtype: str = 'float32') -> dict:
+    """Consolidate the per-sample .npy files listed in split CSVs into memory-mappable shards.
+
+    Each CSV starts a new shard so a split only touches its own shards.
+    """
+    import pandas as pd
+    from tqdm import tqdm
+    writer = ShardWriter(out_dir, shard_items=shard_items, dtype=dtype)
+    seen = set()
+    for csv_file in csv_files:
+        df = pd.read_csv(csv_file)
+        for file, label in tqdm(zip(df['file'].tolist(), df['label'].tolist()), total=len(df),
+                                desc=f'Packing {Path(csv_file).name}'):
+            key = (item_name(file), int(label))
+            if key in seen:
+                continue
+            seen.add(key)
+            writer.add(key[0], np.load(str(file).replace('\\', '/')), key[1])
+        writer.flush()
+    meta = writer.close()
+    print(f"Packed {meta['num_items']} items into {len(meta['shards'])} shards at", out_dir)
+    return meta
+
+
+class ShardedFeatureDataset(Dataset):
+    """Reads features from memory-mapped shards written by ShardWriter.
+
+    If csv_file is given, only the items listed in it (matched by file stem and label)
+    are exposed, in CSV order.
+    """
+
+    def __init__(self, shard_dir: str, csv_file: Optional[str] = None):
+        self.shard_dir = Path(shard_dir)
+        with open(self.shard_dir / META_FILE, 'r') as f:
+            self.meta = json.load(f)
+        index = np.load(self.shard_dir / INDEX_FILE)
+        positions = np.arange(len(index['name']))
+        if csv_file is not None:
+            import pandas as pd
+            df = pd.read_csv(csv_file)
+            lookup: Dict[Tuple[str, int], int] = {
+                (str(n), int(l)): i for i, (n, l) in enumerate(zip(index['name'], index['label']))
+            }
+            positions = np.array([lookup[(item_name(f), int(l))] for f, l in zip(df['file'], df['label'])],
+                                 dtype=np.int64)
+        self.labels = index['label'][positions]
+        self.shard_ids = index['shard'][positions]
+        self.offsets = index['offset'][positions]
+        self.lengths = index['length'][positions]
+        self._shards: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def _shard(self, shard_id: int) -> np.ndarray:
+        # Opened lazily so each DataLoader worker maps the files after fork
+        arr = self._shards.get(shard_id)
+        if arr is None:
+            arr = np.load(self.shard_dir / self.meta['shards'][shard_id], mmap_mode='r')
+            self._shards[shard_id] = arr
+        return arr
+
+    def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        off = int(self.offsets[idx])
+        block = self._shard(int(self.shard_ids[idx]))[off:off + int(self.lengths[idx])]
+        arr = np.array(block.T, dtype=np.float32)
+        tensor = torch.from_numpy(arr).unsqueeze(0)
+        label = torch.tensor(int(self.labels[idx]), dtype=torch.float32)
+        return tensor, label
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+
+def default_cache_dir() -> Path:
+    shm = Path('/dev/shm')
+    base = shm if shm.is_dir() else Path(tempfile.gettempdir())
+    return base / 'deepfake_cache'
+
+
+def cache_key(files: List[str]) -> str:
+    """Identifies a split by its file list and each file's size and mtime."""
+    h = hashlib.sha1()
+    for f in files:
+        st = os.stat(f)
+        h.update(f'{f}:{st.st_size}:{st.st_mtime_ns}\n'.encode())
+    return h.hexdigest()[:16]
+
+
+# Caches this process has returned. Datasets map them lazily (and every DataLoader
+# worker maps them again), so they must outlive any later build in the same run.
+_IN_USE = set()
+
+
+def _evict(cache_dir: Path, needed: int, max_bytes: int) -> bool:
+    """Removes least recently used cache files until `needed` more bytes fit under max_bytes.
+
+    Caches in use by this process and partial files another process is still
+    writing (*.tmp.npy) are never removed. Returns whether the bytes fit.
+    """
+    entries = []
+    for p in cache_dir.glob('*.npy'):
+        if p.name.endswith('.tmp.npy'):
+            continue
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            # removed by another process since the glob
+            continue
+        entries.append((st.st_atime, st.st_size, p))
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries, key=lambda e: e[0]):
+        if total + needed <= max_bytes:
+            break
+        if p in _IN_USE:
+            continue
+        p.unlink(missing_ok=True)
+        total -= size
+        print('Evicted shared cache', p.name)
+    return total + needed <= max_bytes
+
+
+def build_shared_cache(files: List[str], cache_dir: Optional[Path] = None, max_mb: float = 2048) -> Optional[Path]:
+    """Loads a split's features once into a single float32 .npy on shared memory.
+
+    Returns the path to map, reusing an existing cache for the same files, or None
+    when the split does not fit (callers then read the per-sample files).
+    """
+    if not files:
+        return None
+    cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f'{cache_key(files)}.npy'
+    if path.exists():
+        os.utime(path)
+        print('Attached shared feature cache', path)
+        _IN_USE.add(path)
+        return path
+
+    shape = np.load(files[0], mmap_mode='r').shape
+    needed = len(files) * int(np.prod(shape)) * 4
+    max_bytes = int(max_mb * 1024 * 1024)
+    if needed > max_bytes:
+        print(f'Shared cache needs {needed / 2**20:.0f} MB > cap {max_mb} MB; reading from disk')
+        return None
+    if not _evict(cache_dir, needed, max_bytes):
+        print(f'Shared cache needs {needed / 2**20:.0f} MB, which does not fit under the cap {max_mb} MB '
+              'next to the caches in use; reading from disk')
+        return None
+    import shutil
+    if shutil.disk_usage(cache_dir).free < needed:
+        print(f'Not enough free space in {cache_dir} for {needed / 2**20:.0f} MB; reading from disk')
+        return None
+
+    tmp = path.with_name(f'{path.stem}.{os.getpid()}.tmp.npy')
+    try:
+        arr = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(len(files),) + shape)
+        for i, f in enumerate(files):
+            sample = np.load(f)
+            if sample.shape != shape:
+                raise ValueError(f'{f}: shape {sample.shape} differs from {shape}')
+            arr[i] = sample
+        arr.flush()
+        del arr
+        os.replace(tmp, path)
+    except (OSError, ValueError) as e:
+        tmp.unlink(missing_ok=True)
+        print('Could not build shared cache:', e, '- reading from disk')
+        return None
+    print(f'Built shared feature cache {path} ({needed / 2**20:.0f} MB)')
+    _IN_USE.add(path)
+    return path
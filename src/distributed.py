@@ -0,0 +1,146 @@
+import os
+import time
+from pathlib import Path
+from typing import Callable, Sequence
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+
+def rank() -> int:
+    return dist.get_rank() if is_distributed() else 0
+
+
+def world_size() -> int:
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main() -> bool:
+    return rank() == 0
+
+
+def all_reduce_sum(values: Sequence[float]) -> list:
+    """Sums a few scalars across ranks (identity when not distributed)."""
+    if not is_distributed():
+        return list(values)
+    t = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(t, op=dist.ReduceOp.SUM)
+    return t.tolist()
+
+
+def init_from_env(backend: str = 'gloo') -> bool:
+    """Joins the process group described by RANK/WORLD_SIZE/MASTER_ADDR/MASTER_PORT (as set by torchrun)."""
+    if is_distributed() or int(os.environ.get('WORLD_SIZE', 1)) <= 1:
+        return is_distributed()
+    dist.init_process_group(backend=backend, init_method='env://')
+    local_world = int(os.environ.get('LOCAL_WORLD_SIZE', dist.get_world_size()))
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world))
+    return True
+
+
+def cleanup():
+    if is_distributed():
+        dist.destroy_process_group()
+
+
+def _spawned(local_rank: int, fn: Callable, args: tuple, nproc: int, node_rank: int, nnodes: int,
+             master_addr: str, master_port: int):
+    os.environ.update({
+        'MASTER_ADDR': master_addr,
+        'MASTER_PORT': str(master_port),
+        'RANK': str(node_rank * nproc + local_rank),
+        'LOCAL_RANK': str(local_rank),
+        'WORLD_SIZE': str(nnodes * nproc),
+        'LOCAL_WORLD_SIZE': str(nproc),
+    })
+    init_from_env()
+    try:
+        fn(*args)
+    finally:
+        cleanup()
+
+
+def launch(fn: Callable, args: tuple = (), nproc: int = 1, nnodes: int = 1, node_rank: int = 0,
+           master_addr: str = '127.0.0.1', master_port: int = 29500):
+    """Runs fn(*args) in nproc gloo-connected processes on this host.
+
+    For several hosts run the same command on each with its own node_rank and a
+    master_addr reachable over TCP from all of them.
+    """
+    mp.spawn(_spawned, args=(fn, args, nproc, node_rank, nnodes, master_addr, master_port),
+             nprocs=nproc, join=True)
+
+
+def _bench_worker(cfg_path: Path, train_csv: Path, steps: int, result_file: str):
+    from torch.nn.parallel import DistributedDataParallel as DDP
+    from src.data.dataset import build_dataset
+    from src.data.loader import build_loader
+    from src.data.samplers import EpochShuffleSampler
+    from src.model.cnn import DeepCNN
+    from src.train import load_config
+    cfg = load_config(cfg_path)
+    ds = build_dataset(str(train_csv), cfg)
+    sampler = EpochShuffleSampler(len(ds), seed=cfg.get('seed', 42), num_replicas=world_size(), rank=rank())
+    loader = build_loader(ds, cfg, cfg.get('batch_size', 32), sampler=sampler)
+    model = DeepCNN.from_preset(cfg.get('model', {}).get('preset', 'full'), output_logits=True)
+    if is_distributed():
+        model = DDP(model)
+    optimizer = torch.optim.Adam(model.parameters(), lr=cfg.get('lr', 0.001))
+    criterion = torch.nn.BCEWithLogitsLoss()
+    seen = 0
+    start = None
+    done = 0
+    epoch = 0
+    while done <= steps:
+        sampler.set_epoch(epoch)
+        for xb, yb in loader:
+            if done == 1:
+                # first step is warm-up
+                if is_distributed():
+                    dist.barrier()
+                start = time.perf_counter()
+            loss = criterion(model(xb), yb.unsqueeze(1))
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            if done >= 1:
+                seen += len(yb)
+            done += 1
+            if done > steps:
+                break
+        epoch += 1
+    elapsed = time.perf_counter() - start
+    total_seen, max_elapsed = all_reduce_sum([seen, 0.0])[0], elapsed
+    if is_distributed():
+        t = torch.tensor([elapsed])
+        dist.all_reduce(t, op=dist.ReduceOp.MAX)
+        max_elapsed = t.item()
+    if is_main():
+        with open(result_file, 'w') as f:
+            f.write(f'{total_seen} {max_elapsed}')
+
+
+def scaling_benchmark(cfg_path: Path, train_csv: Path, procs: Sequence[int] = (1, 2, 4, 8),
+                      steps: int = 20) -> list:
+    """Global training samples/sec at each process count, with scaling efficiency vs 1 process."""
+    import tempfile
+    rows = []
+    for n in procs:
+        with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as tmp:
+            result_file = tmp.name
+        launch(_bench_worker, (cfg_path, train_csv, steps, result_file), nproc=n,
+               master_port=29500 + n)
+        with open(result_file) as f:
+            seen, elapsed = map(float, f.read().split())
+        os.unlink(result_file)
+        throughput = seen / max(1e-9, elapsed)
+        base = rows[0] if rows else {'procs': n, 'samples_per_sec': throughput}
+        speedup = throughput / base['samples_per_sec']
+        efficiency = speedup / (n / base['procs'])
+        rows.append({'procs': n, 'samples_per_sec': throughput, 'speedup': speedup, 'efficiency': efficiency})
+        print(f'procs={n:<3} samples/sec={throughput:8.1f} speedup={speedup:.2f}x efficiency={efficiency:.0%}')
+    return rows
@@ -1,40 +1,287 @@
 from pathlib import Path
+import json
+import time
 import torch
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
-import matplotlib.pyplot as plt
-import seaborn as sns
+from sklearn.metrics import accuracy_score
 
 
-def evaluate_model(model_path: Path, test_csv: Path, device: str = 'cpu'):
-    from src.data.dataset import AudioFeatureDataset
-    from src.model.cnn import DeepCNN
-
-    ds = AudioFeatureDataset(str(test_csv))
-    loader = torch.utils.data.DataLoader(ds, batch_size=32)
+def _load_eval_setup(model_path: Path, test_csv: Path, device: str, cfg_path: Path, overrides: dict = None):
+    from src.data.dataset import build_dataset
+    from src.data.loader import bucketed_loader, build_loader, loader_settings
+    from src.data.samplers import EpochShuffleSampler
+    cfg = {}
+    if cfg_path is not None:
+        from src.train import load_config
+        cfg = load_config(cfg_path)
+    if overrides:
+        from src.train import merge_config
+        cfg = merge_config(cfg, overrides)
+    ds = build_dataset(str(test_csv), cfg)
+    if loader_settings(cfg)['bucket_by_length']:
+        loader = bucketed_loader(ds, cfg, cfg.get('batch_size', 32), EpochShuffleSampler(len(ds), shuffle=False))
+    else:
+        loader = build_loader(ds, cfg, batch_size=cfg.get('batch_size', 32))
     dev = torch.device('cuda' if torch.cuda.is_available() and device == 'cuda' else 'cpu')
-    model = DeepCNN().to(dev)
-    model.load_state_dict(torch.load(model_path, map_location=dev))
+    return cfg, loader, dev
+
+
+def _load_model(model_path: Path, dev: torch.device, rt: dict):
+    from src.model.cnn import DeepCNN
+    from src.model.runtime import prepare_model
+    model = DeepCNN.from_state_dict(torch.load(model_path, map_location=dev)).to(dev)
     model.eval()
+    return prepare_model(model, rt)
+
+
+def predict_scores(model, loader, dev: torch.device, rt: dict):
+    """Returns (y_true, scores, inference seconds excluding the first warm-up batch)."""
+    from src.data.loader import unpack_batch
+    from src.model.runtime import autocast, prepare_input
     y_true = []
-    y_pred = []
+    scores = []
+    elapsed = 0.0
     with torch.no_grad():
-        for xb, yb in loader:
-            xb = xb.to(dev)
-            out = model(xb)
-            preds = (out.cpu().numpy().squeeze() >= 0.5).astype(int)
-            y_pred.extend(preds.tolist())
+        for i, batch in enumerate(loader):
+            xb, yb, lengths = unpack_batch(batch)
+            xb = prepare_input(xb.to(dev), rt)
+            t0 = time.perf_counter()
+            with autocast(rt, dev):
+                out = model(xb, lengths)
+            out = out.float().cpu().numpy().reshape(-1)
+            if i > 0:
+                elapsed += time.perf_counter() - t0
+            scores.extend(out.tolist())
             y_true.extend(yb.numpy().astype(int).tolist())
-    acc = accuracy_score(y_true, y_pred)
-    prec = precision_score(y_true, y_pred, zero_division=0)
-    rec = recall_score(y_true, y_pred, zero_division=0)
-    f1 = f1_score(y_true, y_pred, zero_division=0)
-    cm = confusion_matrix(y_true, y_pred)
-    print(f'Accuracy={acc:.4f} Precision={prec:.4f} Recall={rec:.4f} F1={f1:.4f}')
+    return y_true, scores, elapsed
+
+
+def evaluation_settings(cfg: dict) -> dict:
+    eval_cfg = cfg.get('evaluation', {})
+    return {
+        'threshold': eval_cfg.get('threshold', 0.5),
+        'histogram_bins': eval_cfg.get('histogram_bins', 1000),
+        'bootstrap': eval_cfg.get('bootstrap', 1000),
+        'confidence': eval_cfg.get('confidence', 0.95),
+        'latency_repeats': eval_cfg.get('latency_repeats', 50),
+        'plot': eval_cfg.get('plot', True),
+        'summary': eval_cfg.get('summary', 'logs/eval_summary.json'),
+    }
+
+
+def stream_scores(model, loader, dev: torch.device, rt: dict, hist, batch_latency):
+    """Feeds every batch's scores into hist and its forward time (after the first batch) into batch_latency.
+
+    Nothing per-sample is kept, so memory does not grow with the test set.
+    Returns (samples scored, timed samples, timed seconds).
+    """
+    from src.data.loader import unpack_batch
+    from src.model.runtime import autocast, prepare_input
+    seen = 0
+    timed = 0
+    with torch.no_grad():
+        for i, batch in enumerate(loader):
+            xb, yb, lengths = unpack_batch(batch)
+            xb = prepare_input(xb.to(dev), rt)
+            t0 = time.perf_counter()
+            with autocast(rt, dev):
+                out = model(xb, lengths)
+            out = out.float().cpu().numpy().reshape(-1)
+            if i > 0:
+                batch_latency.add(time.perf_counter() - t0)
+                timed += len(out)
+            hist.update(out, yb.numpy().astype(int))
+            seen += len(out)
+    return seen, timed, batch_latency.total
+
+
+def _plot_results(hist, confusion: dict, threshold: float, out_dir: Path = Path('visualizations')):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cm = np.array([[confusion['tn'], confusion['fp']], [confusion['fn'], confusion['tp']]])
     plt.figure(figsize=(6, 4))
     sns.heatmap(cm, annot=True, fmt='d')
     plt.xlabel('Pred')
     plt.ylabel('True')
     plt.title('Confusion Matrix')
-    out_dir = Path('visualizations')
-    out_dir.mkdir(parents=True, exist_ok=True)
     plt.savefig(out_dir / 'confusion_matrix.png')
+    plt.close()
+    centers = (np.arange(hist.bins) + 0.5) / hist.bins
+    plt.figure(figsize=(6, 4))
+    for label, name in ((0, 'fake'), (1, 'real')):
+        plt.plot(centers, hist.counts[label], label=name)
+    plt.axvline(threshold, color='gray', linestyle='--')
+    plt.xlabel('P(real)')
+    plt.ylabel('Clips')
+    plt.legend()
+    plt.title('Score distribution')
+    plt.savefig(out_dir / 'score_histogram.png')
+    plt.close()
+
+
+def evaluate_model(model_path: Path, test_csv: Path, device: str = 'cpu', cfg_path: Path = None,
+                   plot: bool = None, overrides: dict = None) -> dict:
+    """Streaming test-set evaluation: metrics with bootstrap CIs, ROC AUC, throughput and latency.
+
+    The summary is printed and written to evaluation.summary (logs/eval_summary.json).
+    plot=None follows evaluation.plot; overrides are merged into the config as in train_model.
+    """
+    from src.model.runtime import runtime_settings
+    from src.utils.metrics import LatencyHistogram, ScoreHistogram, bootstrap_intervals, metrics_from_counts
+    cfg, loader, dev = _load_eval_setup(model_path, test_csv, device, cfg_path, overrides)
+    settings = evaluation_settings(cfg)
+    rt = runtime_settings(cfg)
+    model = _load_model(model_path, dev, rt)
+
+    hist = ScoreHistogram(settings['histogram_bins'])
+    batch_latency = LatencyHistogram()
+    seen, timed, elapsed = stream_scores(model, loader, dev, rt, hist, batch_latency)
+    confusion = hist.confusion(settings['threshold'])
+    metrics = {k: float(v) for k, v in metrics_from_counts(**confusion).items()}
+    intervals = bootstrap_intervals(confusion, settings['bootstrap'], settings['confidence'], cfg.get('seed', 42))
+
+    single = LatencyHistogram()
+    sample = loader.dataset[0][0].unsqueeze(0).to(dev)
+    for t in _forward_times(model, sample, settings['latency_repeats']):
+        single.add(t)
+
+    summary = {
+        'model': str(model_path),
+        'test_csv': str(test_csv),
+        'samples': seen,
+        'threshold': settings['threshold'],
+        'confusion': confusion,
+        'metrics': metrics,
+        'confidence': settings['confidence'],
+        'intervals': intervals,
+        'roc_auc': hist.roc_auc(),
+        'throughput_samples_per_sec': timed / max(1e-9, elapsed),
+        'batch_latency': batch_latency.summary(),
+        'single_clip_latency': single.summary(),
+    }
+    for name in ('accuracy', 'precision', 'recall', 'f1'):
+        lo, hi = intervals.get(name, (float('nan'), float('nan')))
+        print(f'{name.capitalize():<9}= {metrics[name]:.4f}  [{lo:.4f}, {hi:.4f}]')
+    print(f"ROC AUC  = {summary['roc_auc']:.4f}")
+    print(f"Throughput {summary['throughput_samples_per_sec']:.1f} clips/sec; single-clip latency "
+          f"p50={summary['single_clip_latency']['p50_ms']:.2f} ms p99={summary['single_clip_latency']['p99_ms']:.2f} ms")
+
+    out = Path(settings['summary'])
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(summary, f, indent=2)
+    if settings['plot'] if plot is None else plot:
+        _plot_results(hist, confusion, settings['threshold'])
+    return summary
+
+
+def _train_throughput(model_path: Path, loader, dev: torch.device, rt: dict, steps: int) -> float:
+    """Samples/sec for `steps` optimizer steps on a throwaway copy of the model."""
+    from src.data.loader import unpack_batch
+    from src.model.cnn import DeepCNN
+    from src.model.runtime import autocast, prepare_input, prepare_model
+    base = DeepCNN.from_state_dict(torch.load(model_path, map_location=dev), output_logits=True).to(dev)
+    model = prepare_model(base, rt)
+    model.train()
+    criterion = torch.nn.BCEWithLogitsLoss()
+    optimizer = torch.optim.Adam(base.parameters(), lr=1e-4)
+    seen = 0
+    elapsed = 0.0
+    for i, batch in enumerate(loader):
+        if i > steps:
+            break
+        xb, yb, lengths = unpack_batch(batch)
+        xb = prepare_input(xb.to(dev), rt)
+        yb = yb.to(dev)
+        t0 = time.perf_counter()
+        with autocast(rt, dev):
+            logits = model(xb, lengths)
+        loss = criterion(logits.float(), yb.unsqueeze(1))
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        if i > 0:
+            elapsed += time.perf_counter() - t0
+            seen += len(yb)
+    return seen / max(1e-9, elapsed)
+
+
+def compare_runtime_modes(model_path: Path, test_csv: Path, cfg_path: Path = None, device: str = 'cpu',
+                          include_compile: bool = False, train_steps: int = 10,
+                          out_json: Path = Path('logs') / 'runtime_modes.json') -> list:
+    """Inference/training samples/sec and accuracy delta vs fp32 eager for each runtime mode."""
+    from src.model.runtime import mode_name
+    cfg, loader, dev = _load_eval_setup(model_path, test_csv, device, cfg_path)
+    modes = [{'precision': p, 'channels_last': cl, 'compile': c}
+             for c in ([False, True] if include_compile else [False])
+             for p in ('fp32', 'bf16') for cl in (False, True)]
+    rows = []
+    baseline = None
+    for rt in modes:
+        model = _load_model(model_path, dev, rt)
+        y_true, scores, elapsed = predict_scores(model, loader, dev, rt)
+        acc = accuracy_score(y_true, [int(s >= 0.5) for s in scores])
+        if baseline is None:
+            baseline = acc
+        # bucketed loaders have no fixed batch_size; their batches are full except the last
+        timed = max(0, len(y_true) - (loader.batch_size or cfg.get('batch_size', 32)))
+        rows.append({
+            'mode': mode_name(rt),
+            'accuracy': acc,
+            'accuracy_delta': acc - baseline,
+            'eval_samples_per_sec': timed / max(1e-9, elapsed),
+            'train_samples_per_sec': _train_throughput(model_path, loader, dev, rt, train_steps),
+        })
+        r = rows[-1]
+        print(f"{r['mode']:<28} acc={r['accuracy']:.4f} (delta {r['accuracy_delta']:+.4f}) "
+              f"eval={r['eval_samples_per_sec']:.1f}/s train={r['train_samples_per_sec']:.1f}/s")
+    out_json.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_json, 'w') as f:
+        json.dump(rows, f, indent=2)
+    return rows
+
+
+def _forward_times(model, x: torch.Tensor, repeats: int = 20, warmup: int = 3) -> list:
+    """Seconds per forward pass of x over `repeats` runs after `warmup` untimed ones."""
+    times = []
+    with torch.no_grad():
+        for i in range(repeats + warmup):
+            t0 = time.perf_counter()
+            model(x)
+            if i >= warmup:
+                times.append(time.perf_counter() - t0)
+    return times
+
+
+def _latency_ms(model, sample: torch.Tensor, batch_size: int, repeats: int = 20) -> float:
+    """Median CPU forward time for a batch of `batch_size` copies of sample."""
+    times = _forward_times(model, sample.unsqueeze(0).repeat(batch_size, 1, 1, 1), repeats)
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def compare_presets(model_paths: dict, test_csv: Path, cfg_path: Path = None,
+                    out_json: Path = Path('logs') / 'presets.json') -> list:
+    """Accuracy, parameter count and CPU latency at batch sizes 1 and 32 for each {name: model_path}."""
+    cfg, loader, dev = _load_eval_setup(None, test_csv, 'cpu', cfg_path)
+    sample = loader.dataset[0][0]
+    rt = {'precision': 'fp32', 'channels_last': False, 'compile': False}
+    rows = []
+    for name, path in model_paths.items():
+        model = _load_model(path, dev, rt)
+        y_true, scores, _ = predict_scores(model, loader, dev, rt)
+        rows.append({
+            'preset': name,
+            'model': str(path),
+            'accuracy': accuracy_score(y_true, [int(s >= 0.5) for s in scores]),
+            'parameters': model.num_parameters(),
+            'latency_ms_bs1': _latency_ms(model, sample, 1),
+            'latency_ms_bs32': _latency_ms(model, sample, 32),
+        })
+        r = rows[-1]
+        print(f"{r['preset']:<8} acc={r['accuracy']:.4f} params={r['parameters']:>8,} "
+              f"bs1={r['latency_ms_bs1']:.2f} ms bs32={r['latency_ms_bs32']:.2f} ms")
+    out_json.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_json, 'w') as f:
+        json.dump(rows, f, indent=2)
+    return rows
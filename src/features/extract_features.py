@@ -1,8 +1,15 @@
 from pathlib import Path
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
 import numpy as np
 import librosa
 from tqdm import tqdm
 from yaml import safe_load
+from src.data.manifest import scan
+
+# librosa.feature.melspectrogram defaults, which the features have always been extracted with
+N_FFT = 2048
+HOP_LENGTH = 512
 
 
 def load_config(path: Path) -> dict:
@@ -10,25 +17,134 @@ def load_config(path: Path) -> dict:
         return safe_load(f)
 
 
-def extract_and_save(processed_root: Path, features_root: Path, config_path: Path):
+def mel_from_stft(stft: np.ndarray, sr: int, n_mels: int) -> np.ndarray:
+    """Power mel spectrogram from a complex STFT (..., 1 + n_fft // 2, frames), batched or not.
+
+    Matches librosa.feature.melspectrogram on the audio the STFT was taken from.
+    """
+    n_fft = 2 * (stft.shape[-2] - 1)
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+    return np.matmul(mel_basis, np.abs(stft) ** 2)
+
+
+def batch_features(mel: np.ndarray, n_mfcc: int, amin: float = 1e-10,
+                   top_db: float = 80.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Saved features of a (clips, n_mels, frames) power-mel block, vectorised over the clips.
+
+    Per clip this is librosa.power_to_db(mel, ref=np.max) and
+    librosa.feature.mfcc(S=librosa.power_to_db(mel)): one log of the block, the
+    top_db floor and the dB reference taken per clip, and an orthonormal DCT-II
+    over the mel axis for the MFCCs.
+    """
+    from scipy.fft import dct
+    log_mel = 10.0 * np.log10(np.maximum(amin, mel))
+    peak = log_mel.max(axis=(-2, -1), keepdims=True)
+    log_mel = np.maximum(log_mel, peak - top_db)
+    mfcc = dct(log_mel, type=2, axis=-2, norm='ortho')[..., :n_mfcc, :]
+    return log_mel - peak, mfcc
+
+
+def block_features(ys: np.ndarray, sr: int, n_mels: int, n_mfcc: int,
+                   denoise: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Log-mel and MFCC features of an equal-length (clips, samples) block from one batched STFT."""
+    if denoise:
+        from src.preprocessing.denoise import spectral_gate
+        stft = spectral_gate(ys, sr, n_fft=N_FFT, hop_length=HOP_LENGTH, return_stft=True)
+    else:
+        stft = librosa.stft(ys, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    return batch_features(mel_from_stft(stft, sr, n_mels), n_mfcc)
+
+
+def iter_blocks(files: List[Path], sr: int, block_size: int = 256) -> Iterator[Tuple[List[Path], np.ndarray]]:
+    """(files, (clips, samples) array) blocks of equal-length clips, block_size files at a time.
+
+    Preprocessed segments all have the same length; anything else is grouped
+    with clips of its own length. Files that fail to load are skipped.
+    """
+    for start in range(0, len(files), block_size):
+        by_length: Dict[int, list] = {}
+        for f in files[start:start + block_size]:
+            try:
+                y, _ = librosa.load(f, sr=sr)
+            except Exception as e:
+                print(f'  skipped {f}: {type(e).__name__}: {e}')
+                continue
+            by_length.setdefault(len(y), []).append((f, y))
+        for group in by_length.values():
+            yield [f for f, _ in group], np.stack([y for _, y in group])
+
+
+def feature_params(cfg: dict) -> dict:
+    """Config values the extracted features depend on."""
+    return {'sr': cfg.get('sr', 16000), 'n_mels': cfg.get('n_mels', 128), 'n_mfcc': cfg.get('n_mfcc', 40),
+            'n_fft': N_FFT, 'hop_length': HOP_LENGTH, 'denoise': cfg.get('features', {}).get('denoise', False)}
+
+
+def extract_and_save(processed_root: Path, features_root: Path, config_path: Path, files: Optional[set] = None):
+    """Mel and MFCC .npy features for the WAVs under processed_root/{real,fake}.
+
+    Clips are featurised features.block_size at a time in one vectorised pass.
+    `files` restricts extraction to those WAV paths (as strings), for incremental runs.
+    """
     cfg = load_config(config_path)
     sr = cfg.get('sr', 16000)
     n_mels = cfg.get('n_mels', 128)
     n_mfcc = cfg.get('n_mfcc', 40)
+    # Gate noise on the feature STFT itself rather than on the WAVs (set preprocessing.denoise off)
+    denoise = cfg.get('features', {}).get('denoise', False)
+    block_size = cfg.get('features', {}).get('block_size', 256)
+    manifest = scan(processed_root, cfg)
+    done, start = 0, time.perf_counter()
     for label in ['real', 'fake']:
-        in_dir = processed_root / label
         mel_out = features_root / 'mel_spectrograms' / label
         mfcc_out = features_root / 'mfcc' / label
         mel_out.mkdir(parents=True, exist_ok=True)
         mfcc_out.mkdir(parents=True, exist_ok=True)
-        files = list(in_dir.glob('*.wav'))
-        for f in tqdm(files, desc=f'Extracting {label}'):
-            try:
-                y, _ = librosa.load(f, sr=sr)
-                mel = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels)
-                mel_db = librosa.power_to_db(mel, ref=np.max)
-                mfcc = librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=n_mfcc)
-                np.save(mel_out / (f.stem + '.npy'), mel_db)
-                np.save(mfcc_out / (f.stem + '.npy'), mfcc)
-            except Exception:
-                continue
+        wavs = [e.path for e in manifest.query(label, ['.wav'], recursive=False)
+                if files is None or str(e.path) in files]
+        with tqdm(total=len(wavs), desc=f'Extracting {label}') as bar:
+            for block_files, ys in iter_blocks(wavs, sr, block_size):
+                mel_db, mfcc = block_features(ys, sr, n_mels, n_mfcc, denoise)
+                for f, m, c in zip(block_files, mel_db, mfcc):
+                    np.save(mel_out / (f.stem + '.npy'), m)
+                    np.save(mfcc_out / (f.stem + '.npy'), c)
+                done += len(block_files)
+                bar.update(len(block_files))
+    elapsed = time.perf_counter() - start
+    print(f'Extracted {done} clips in {elapsed:.1f}s ({done / max(1e-9, elapsed):.1f} clips/sec)')
+
+
+def extract_to_shards(processed_root: Path, config_path: Path) -> dict:
+    """Like extract_and_save, but writes the features straight to mel and MFCC shards.
+
+    Items go to data.shard_dir and data.mfcc_shard_dir, named by WAV stem; build the
+    splits from the shard index with create_splits_from_shards.
+    """
+    from src.data.shards import ShardWriter
+    cfg = load_config(config_path)
+    sr = cfg.get('sr', 16000)
+    feat_cfg = cfg.get('features', {})
+    data_cfg = cfg.get('data', {})
+    shard_items = data_cfg.get('shard_items', 1024)
+    dtype = data_cfg.get('shard_dtype', 'float16')
+    mel_writer = ShardWriter(Path(data_cfg.get('shard_dir', 'data/features/shards')), shard_items, dtype)
+    mfcc_writer = ShardWriter(Path(data_cfg.get('mfcc_shard_dir', 'data/features/shards_mfcc')), shard_items, dtype)
+    manifest = scan(processed_root, cfg)
+    done, start = 0, time.perf_counter()
+    for label in ['real', 'fake']:
+        wavs = [e.path for e in manifest.query(label, ['.wav'], recursive=False)]
+        target = 1 if label == 'real' else 0
+        with tqdm(total=len(wavs), desc=f'Extracting {label} to shards') as bar:
+            for block_files, ys in iter_blocks(wavs, sr, feat_cfg.get('block_size', 256)):
+                mel_db, mfcc = block_features(ys, sr, cfg.get('n_mels', 128), cfg.get('n_mfcc', 40),
+                                              feat_cfg.get('denoise', False))
+                for f, m, c in zip(block_files, mel_db, mfcc):
+                    mel_writer.add(f.stem, m, target)
+                    mfcc_writer.add(f.stem, c, target)
+                done += len(block_files)
+                bar.update(len(block_files))
+    meta = mel_writer.close()
+    mfcc_writer.close()
+    elapsed = time.perf_counter() - start
+    print(f'Extracted {done} clips into shards in {elapsed:.1f}s ({done / max(1e-9, elapsed):.1f} clips/sec)')
+    return meta
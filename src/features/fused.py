@@ -0,0 +1,121 @@
+import os
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+import librosa
+import numpy as np
+from tqdm import tqdm
+from src.data.shards import ShardWriter
+from src.features.extract_features import block_features, load_config
+from src.preprocessing.preprocess import (FileResult, _write_wav, denoise, list_sources, normalize,
+                                          preprocessing_settings, trim_silence, write_report)
+from src.preprocessing.segment import segment_audio
+
+
+def process_to_features(infile: Path, sr: int, duration: float, name: str, label: str, n_mels: int, n_mfcc: int,
+                        use_denoise: bool = True, denoiser: str = 'spectral_gate',
+                        wav_dir: Optional[Path] = None, overlap: float = 0.0,
+                        silence_db: Optional[float] = None) -> Tuple[FileResult, List[np.ndarray], List[np.ndarray]]:
+    """Decode one file once and return its segments' log-mel and MFCC features.
+
+    Denoising, trimming, normalisation and segmentation are those of process_file,
+    in the same order: the whole file is denoised before it is trimmed. The
+    segments then share one batched STFT, and the segment WAVs are written only
+    if wav_dir asks for them.
+    """
+    start = time.perf_counter()
+    result = FileResult(source=str(infile), label=label)
+    mels, mfccs = [], []
+    try:
+        y, _ = librosa.load(infile, sr=sr, mono=True)
+        result.audio_seconds = len(y) / sr
+        if use_denoise:
+            y = denoise(y, sr, denoiser)
+        segs = segment_audio(normalize(trim_silence(y, sr)), sr, duration, overlap, silence_db)
+        if not segs:
+            result.seconds = time.perf_counter() - start
+            return result, mels, mfccs
+        segs = np.stack(segs)
+        mel_db, mfcc = block_features(segs, sr, n_mels, n_mfcc)
+        mels, mfccs = list(mel_db), list(mfcc)
+        result.outputs.extend(f'{name}_{i}' for i in range(len(mels)))
+        if wav_dir is not None:
+            for i, seg in enumerate(segs):
+                _write_wav(wav_dir / f'{name}_{i}.wav', seg, sr)
+    except Exception as e:
+        result.error = f'{type(e).__name__}: {e}' if str(e) else type(e).__name__
+        mels, mfccs = [], []
+    result.seconds = time.perf_counter() - start
+    return result, mels, mfccs
+
+
+def _fused_job(job: tuple) -> Tuple[FileResult, List[np.ndarray], List[np.ndarray]]:
+    return process_to_features(*job)
+
+
+def run_fused(root_dataset: Path, out_root: Path, config_path: Path, shard_dir: Optional[Path] = None,
+              mfcc_dir: Optional[Path] = None) -> List[FileResult]:
+    """Raw audio under root_dataset/{real,fake} straight to mel and MFCC shards, in one pass.
+
+    Replaces run_preprocessing + extract_and_save: each file is decoded once and its
+    features go to shard_dir (mel) and mfcc_dir (MFCC), by default data.shard_dir and
+    data.mfcc_shard_dir, without intermediate WAV or .npy files. Items are named <source stem>_<segment> as the
+    WAVs would be; preprocessing.write_wavs also writes those WAVs to out_root/processed.
+    """
+    cfg = load_config(config_path)
+    sr = cfg.get('sr', 16000)
+    duration = cfg.get('duration', 3.0)
+    exts = cfg.get('supported_extensions', ['.wav'])
+    settings = preprocessing_settings(cfg)
+    workers = settings['workers'] or os.cpu_count() or 1
+    data_cfg = cfg.get('data', {})
+    shard_dir = Path(shard_dir or data_cfg.get('shard_dir', 'data/features/shards'))
+    mfcc_dir = Path(mfcc_dir or data_cfg.get('mfcc_shard_dir', 'data/features/shards_mfcc'))
+    shard_items = data_cfg.get('shard_items', 1024)
+    dtype = data_cfg.get('shard_dtype', 'float16')
+
+    wav_dirs = {}
+    if settings['write_wavs']:
+        for label in ['real', 'fake']:
+            wav_dirs[label] = out_root / 'processed' / label
+            wav_dirs[label].mkdir(parents=True, exist_ok=True)
+    jobs = [(f, sr, duration, stem, label, cfg.get('n_mels', 128), cfg.get('n_mfcc', 40), settings['denoise'],
+             settings['denoiser'], wav_dirs.get(label), settings['segment_overlap'], settings['silence_db'])
+            for f, label, stem in list_sources(root_dataset, exts, cfg)]
+
+    mel_writer = ShardWriter(shard_dir, shard_items=shard_items, dtype=dtype)
+    mfcc_writer = ShardWriter(mfcc_dir, shard_items=shard_items, dtype=dtype)
+    results = []
+    start = time.perf_counter()
+    pool = None
+    if workers > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers)
+        outputs = pool.map(_fused_job, jobs, chunksize=settings['chunksize'])
+    else:
+        outputs = map(_fused_job, jobs)
+    try:
+        # Results arrive in job order, so the shards are the same on every run
+        for result, mels, mfccs in tqdm(outputs, total=len(jobs), desc=f'Fused preprocessing ({workers} processes)'):
+            target = 1 if result.label == 'real' else 0
+            for name, mel, mfcc in zip(result.outputs, mels, mfccs):
+                mel_writer.add(name, mel, target)
+                mfcc_writer.add(name, mfcc, target)
+            results.append(result)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    mel_writer.close()
+    mfcc_writer.close()
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in results if not r.ok]
+    for r in failed:
+        print('  failed:', r.source, '-', r.error)
+    audio = sum(r.audio_seconds for r in results)
+    print(f'{sum(len(r.outputs) for r in results)} segments from {len(results) - len(failed)}/{len(results)} files '
+          f'in {elapsed:.1f}s: {len(results) / max(1e-9, elapsed):.2f} files/sec, '
+          f'{audio / max(1e-9, elapsed):.1f}x realtime on {workers} process(es)')
+    print('Mel shards in', shard_dir, '- MFCC shards in', mfcc_dir)
+    write_report(results, shard_dir / 'fused_report.csv')
+    return results
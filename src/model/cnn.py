@@ -15,29 +15,108 @@ class ConvBlock(nn.Module):
         return self.block(x)
 
 
+def masked_batch_norm(bn: nn.BatchNorm2d, x: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:
+    """bn(x) whose training-mode batch statistics count only the frames where mask (batch, frames) is set.
+
+    Running statistics are updated from the same masked mean and (unbiased)
+    variance, so they do not depend on how much padding a batch had. In eval mode
+    the running statistics are used and nothing changes.
+    """
+    if not (bn.training and bn.track_running_stats):
+        return bn(x)
+    m = mask[:, None, None, :].to(torch.float32)
+    x32 = x.float()
+    n = m.sum() * x.size(2)
+    mean = (x32 * m).sum(dim=(0, 2, 3)) / n
+    var = (((x32 - mean[None, :, None, None]) ** 2) * m).sum(dim=(0, 2, 3)) / n
+    with torch.no_grad():
+        bn.num_batches_tracked += 1
+        factor = bn.momentum if bn.momentum is not None else 1.0 / float(bn.num_batches_tracked)
+        bn.running_mean.mul_(1 - factor).add_(factor * mean)
+        bn.running_var.mul_(1 - factor).add_(factor * var * n / max(float(n) - 1, 1.0))
+    y = (x32 - mean[None, :, None, None]) * torch.rsqrt(var + bn.eps)[None, :, None, None]
+    if bn.affine:
+        y = y * bn.weight[None, :, None, None] + bn.bias[None, :, None, None]
+    return y.to(x.dtype)
+
+
+# Conv block widths (one per block, so len = depth) and classifier hidden size.
+# 'full' is the original architecture with unchanged state-dict keys.
+PRESETS = {
+    'full': {'widths': (32, 64, 128, 256), 'hidden': 128},
+    'small': {'widths': (16, 32, 64, 128), 'hidden': 64},
+    'tiny': {'widths': (8, 16, 32, 64), 'hidden': 32},
+    'micro': {'widths': (8, 16, 32), 'hidden': 32},
+}
+
+
 class DeepCNN(nn.Module):
-    def __init__(self):
+    """Mel-spectrogram classifier returning P(real).
+
+    With output_logits=True forward returns raw logits instead, for autocast-safe
+    BCEWithLogitsLoss; the state dict is the same either way. Passing per-clip
+    frame counts (lengths) for a zero-padded batch keeps padding out of the result,
+    and in training out of the BatchNorm statistics as well.
+    Width and depth default to the 'full' preset.
+    """
+
+    def __init__(self, output_logits: bool = False, widths=(32, 64, 128, 256), hidden: int = 128):
         super().__init__()
-        self.enc = nn.Sequential(
-            ConvBlock(1, 32),
-            nn.MaxPool2d(2, stride=2, padding=0, ceil_mode=True),
-            ConvBlock(32, 64),
-            nn.MaxPool2d(2, stride=2, padding=0, ceil_mode=True),
-            ConvBlock(64, 128),
-            nn.MaxPool2d(2, stride=2, padding=0, ceil_mode=True),
-            ConvBlock(128, 256),
-            nn.AdaptiveAvgPool2d((1, 1))
-        )
+        self.output_logits = output_logits
+        layers = []
+        in_c = 1
+        for i, out_c in enumerate(widths):
+            if i:
+                layers.append(nn.MaxPool2d(2, stride=2, padding=0, ceil_mode=True))
+            layers.append(ConvBlock(in_c, out_c))
+            in_c = out_c
+        layers.append(nn.AdaptiveAvgPool2d((1, 1)))
+        self.enc = nn.Sequential(*layers)
         self.fc = nn.Sequential(
             nn.Flatten(),
-            nn.Linear(256, 128),
+            nn.Linear(in_c, hidden),
             nn.ReLU(),
             nn.Dropout(0.5),
-            nn.Linear(128, 1),
-            nn.Sigmoid()
+            nn.Linear(hidden, 1),
         )
 
-    def forward(self, x):
-        x = self.enc(x)
-        x = self.fc(x)
-        return x.view(x.size(0), -1)
+    @classmethod
+    def from_preset(cls, name: str = 'full', output_logits: bool = False) -> 'DeepCNN':
+        if name not in PRESETS:
+            raise ValueError(f'Unknown model preset {name!r}; choose from {sorted(PRESETS)}')
+        return cls(output_logits=output_logits, **PRESETS[name])
+
+    @classmethod
+    def from_state_dict(cls, state: dict, output_logits: bool = False) -> 'DeepCNN':
+        """Rebuilds the architecture a saved state dict was trained with, then loads it."""
+        widths = [w.shape[0] for k, w in state.items() if k.startswith('enc.') and k.endswith('block.0.weight')]
+        model = cls(output_logits=output_logits, widths=widths, hidden=state['fc.1.weight'].shape[0])
+        model.load_state_dict(state)
+        return model
+
+    def num_parameters(self) -> int:
+        return sum(p.numel() for p in self.parameters())
+
+    def forward(self, x, lengths=None):
+        if lengths is None:
+            x = self.enc(x)
+        else:
+            # Zero the padded frames after every layer, as the convs' own zero padding
+            # would, so a padded clip scores the same as the clip on its own; BatchNorm
+            # batch statistics leave them out, so they do not depend on the bucketing
+            lengths = lengths.to(x.device)
+            mask = torch.arange(x.size(-1), device=x.device) < lengths.unsqueeze(1)
+            for layer in self.enc[:-1]:
+                if isinstance(layer, ConvBlock):
+                    conv, bn, act = layer.block
+                    x = act(masked_batch_norm(bn, conv(x), mask))
+                else:
+                    x = layer(x)
+                    if isinstance(layer, nn.MaxPool2d):
+                        stride = layer.stride if isinstance(layer.stride, int) else layer.stride[-1]
+                        lengths = -(-lengths // stride)
+                    mask = torch.arange(x.size(-1), device=x.device) < lengths.unsqueeze(1)
+                x = x * mask[:, None, None, :].to(x.dtype)
+            x = x.sum(dim=(2, 3)) / (lengths * x.size(2)).to(x.dtype).unsqueeze(1)
+        x = self.fc(x).view(x.size(0), -1)
+        return x if self.output_logits else torch.sigmoid(x)
@@ -0,0 +1,47 @@
+from contextlib import nullcontext
+import torch
+import torch.nn as nn
+
+PRECISIONS = ('fp32', 'bf16')
+
+
+def runtime_settings(cfg: dict) -> dict:
+    rt = cfg.get('runtime', {})
+    precision = rt.get('precision', 'fp32')
+    if precision not in PRECISIONS:
+        raise ValueError(f'runtime.precision must be one of {PRECISIONS}, got {precision}')
+    return {
+        'precision': precision,
+        'channels_last': rt.get('channels_last', False),
+        'compile': rt.get('compile', False),
+    }
+
+
+def prepare_model(model: nn.Module, settings: dict) -> nn.Module:
+    """Applies memory format and optional compilation; keep the original module for state_dict."""
+    if settings['channels_last']:
+        model = model.to(memory_format=torch.channels_last)
+    if settings['compile']:
+        model = torch.compile(model)
+    return model
+
+
+def prepare_input(xb: torch.Tensor, settings: dict) -> torch.Tensor:
+    if settings['channels_last']:
+        return xb.contiguous(memory_format=torch.channels_last)
+    return xb
+
+
+def autocast(settings: dict, device: torch.device):
+    if settings['precision'] == 'bf16':
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    return nullcontext()
+
+
+def mode_name(settings: dict) -> str:
+    parts = [settings['precision']]
+    if settings['channels_last']:
+        parts.append('channels_last')
+    if settings['compile']:
+        parts.append('compiled')
+    return '+'.join(parts)
@@ -0,0 +1,137 @@
+import time
+from typing import Dict, List
+import numpy as np
+import librosa
+from scipy.ndimage import convolve1d
+from scipy.signal import filtfilt, lfilter, lfilter_zi
+
+
+def _triangle(n_grad: int) -> np.ndarray:
+    """Normalised triangular smoothing kernel of 2 * n_grad + 1 taps, as noisereduce builds it."""
+    k = np.concatenate([np.linspace(0, 1, n_grad + 1, endpoint=False), np.linspace(1, 0, n_grad + 2)])[1:-1]
+    return k / k.sum()
+
+
+def _time_smoothed(mag: np.ndarray, sr: int, hop_length: int, time_constant_s: float,
+                   pad_frames: int = 0) -> np.ndarray:
+    """Zero-phase one-pole low-pass of each frequency bin over time, with pad_frames of silence either side.
+
+    Equal to filtfilt over the padded frames, without filtering the padding: the
+    forward pass starts at rest after the leading silence and only decays over the
+    trailing one, so the backward pass enters the clip in a state proportional to
+    the forward pass's last value.
+    """
+    t_frames = time_constant_s * sr / float(hop_length)
+    b = (np.sqrt(1 + 4 * t_frames ** 2) - 1) / (2 * t_frames ** 2)
+    num, den = [b], [1, b - 1]
+    if not pad_frames:
+        return filtfilt(num, den, mag, axis=-1, padtype=None)
+    zi = lfilter_zi(num, den)
+    fwd = lfilter(num, den, mag, axis=-1)
+    tail = (1 - b) ** np.arange(pad_frames, 0, -1)
+    _, state = lfilter(num, den, tail, zi=zi * tail[0])
+    bwd = lfilter(num, den, fwd[..., ::-1], axis=-1, zi=state[0] * fwd[..., -1:])[0]
+    return bwd[..., ::-1]
+
+
+def spectral_gate(y: np.ndarray, sr: int, n_fft: int = 1024, hop_length: int = None,
+                  prop_decrease: float = 1.0, time_constant_s: float = 2.0, freq_mask_smooth_hz: float = 500,
+                  time_mask_smooth_ms: float = 50, thresh_n_mult: float = 2.0, sigmoid_slope: float = 10.0,
+                  padding: int = 30000, return_stft: bool = False) -> np.ndarray:
+    """Non-stationary spectral gating, as noisereduce.reduce_noise does by default.
+
+    y is one clip (samples,) or an equal-length batch (clips, samples); the whole
+    batch goes through one STFT and the gating is vectorised over it. Bins well
+    above their own running mean (thresh_n_mult times) are kept through a sigmoid
+    mask, smoothed over frequency and time. noisereduce pads each chunk with
+    `padding` samples of silence, which pulls the running mean down near the
+    edges of short clips; the same amount of silent frames is added to the
+    running mean here (only there, so no extra STFT work). With return_stft=True the gated
+    librosa STFT (..., 1 + n_fft // 2, frames) is returned instead of audio, so
+    features can be computed from it without an inverse and forward transform.
+    """
+    hop_length = hop_length or n_fft // 4
+    y = np.asarray(y, dtype=np.float32)
+    stft = librosa.stft(y, n_fft=n_fft, hop_length=hop_length, pad_mode='constant')
+    mag = np.abs(stft)
+    smooth = _time_smoothed(mag, sr, hop_length, time_constant_s, int(round(padding / hop_length)))
+    # Exact silence gives 0/0; any tiny floor gates it out the same way
+    above = (mag - smooth) / np.maximum(smooth, 1e-10)
+    mask = 1 / (1 + np.exp(-(above - thresh_n_mult) * sigmoid_slope))
+
+    n_grad_freq = max(1, int(freq_mask_smooth_hz / (sr / (n_fft / 2))))
+    n_grad_time = max(1, int(time_mask_smooth_ms / (hop_length / sr * 1000)))
+    if (n_grad_freq, n_grad_time) != (1, 1):
+        # The 2-D smoothing filter is an outer product, so two 1-D passes give the same result
+        mask = convolve1d(mask, _triangle(n_grad_freq), axis=-2, mode='constant')
+        mask = convolve1d(mask, _triangle(n_grad_time), axis=-1, mode='constant')
+    mask = mask * prop_decrease + (1.0 - prop_decrease)
+
+    gated = stft * mask.astype(np.float32)
+    if return_stft:
+        return gated
+    return librosa.istft(gated, hop_length=hop_length, n_fft=n_fft, length=y.shape[-1])
+
+
+def _snr_db(reference: np.ndarray, estimate: np.ndarray) -> float:
+    err = np.sum((reference - estimate) ** 2)
+    return float(10 * np.log10(np.sum(reference ** 2) / max(err, 1e-20)))
+
+
+def benchmark_denoisers(clips: np.ndarray, sr: int, n_mels: int = 128, batch_size: int = 32) -> Dict[str, float]:
+    """Speed of the batched spectral gate against noisereduce, and how closely their outputs agree.
+
+    clips is an equal-length (clips, samples) array. Parity is the SNR of our
+    output against noisereduce's and the mean absolute difference of the
+    resulting log-mel features; both are skipped when noisereduce is missing.
+    The shared-STFT timing is denoise + mel straight from the gated STFT,
+    against denoise, resynthesis and a fresh mel STFT.
+    """
+    from src.features.extract_features import HOP_LENGTH, N_FFT, mel_from_stft
+    n = len(clips)
+    audio_seconds = n * clips.shape[1] / sr
+    out = {'clips': n, 'audio_seconds': audio_seconds}
+
+    def timed(fn) -> float:
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    batches = [clips[i:i + batch_size] for i in range(0, n, batch_size)]
+    spectral_gate(clips[:1], sr)  # first-call setup out of the timings
+    t = timed(lambda: [spectral_gate(b, sr) for b in batches])
+    out['gate_batched_clips_per_sec'] = n / t
+    t = timed(lambda: [spectral_gate(c, sr) for c in clips])
+    out['gate_per_clip_clips_per_sec'] = n / t
+
+    def mel_db(mel: np.ndarray) -> np.ndarray:
+        return librosa.power_to_db(mel, ref=np.max)
+
+    def resynth_then_mel(batch):
+        y = spectral_gate(batch, sr, n_fft=N_FFT, hop_length=HOP_LENGTH)
+        return librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels)
+
+    t = timed(lambda: [resynth_then_mel(b) for b in batches])
+    out['gate_resynth_mel_clips_per_sec'] = n / t
+    t = timed(lambda: [mel_from_stft(spectral_gate(b, sr, n_fft=N_FFT, hop_length=HOP_LENGTH, return_stft=True),
+                                     sr, n_mels) for b in batches])
+    out['gate_shared_stft_mel_clips_per_sec'] = n / t
+
+    try:
+        import noisereduce as nr
+    except ImportError:
+        print('noisereduce is not installed; skipping the parity check')
+        return out
+    reference: List[np.ndarray] = []
+    t = timed(lambda: reference.extend(nr.reduce_noise(y=c, sr=sr) for c in clips))
+    out['noisereduce_clips_per_sec'] = n / t
+    ours = np.concatenate([spectral_gate(b, sr) for b in batches])
+    snr = [_snr_db(r, o) for r, o in zip(reference, ours)]
+    mel_diff = [np.mean(np.abs(mel_db(librosa.feature.melspectrogram(y=r, sr=sr, n_mels=n_mels))
+                               - mel_db(librosa.feature.melspectrogram(y=o, sr=sr, n_mels=n_mels))))
+                for r, o in zip(reference, ours)]
+    out['parity_snr_db_median'] = float(np.median(snr))
+    out['parity_snr_db_min'] = float(np.min(snr))
+    out['parity_mel_db_mae'] = float(np.mean(mel_diff))
+    out['speedup_vs_noisereduce'] = out['gate_batched_clips_per_sec'] / out['noisereduce_clips_per_sec']
+    return out
@@ -1,11 +1,16 @@
+import os
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import librosa
 import soundfile as sf
 import numpy as np
-import noisereduce as nr
 from tqdm import tqdm
 from yaml import safe_load
+from src.data.manifest import scan
+from src.preprocessing.denoise import spectral_gate
+from src.preprocessing.segment import segment_audio
 
 
 def load_config(path: Path) -> dict:
@@ -17,9 +22,12 @@ def is_supported(file: Path, exts: List[str]) -> bool:
     return file.suffix.lower() in exts
 
 
-def denoise(y: np.ndarray, sr: int) -> np.ndarray:
+def denoise(y: np.ndarray, sr: int, method: str = 'spectral_gate') -> np.ndarray:
     try:
-        return nr.reduce_noise(y=y, sr=sr)
+        if method == 'noisereduce':
+            import noisereduce as nr
+            return nr.reduce_noise(y=y, sr=sr)
+        return spectral_gate(y, sr)
     except Exception:
         return y
 
@@ -36,56 +44,173 @@ def normalize(y: np.ndarray) -> np.ndarray:
     return y
 
 
-def segment_audio(y: np.ndarray, sr: int, duration: float) -> List[np.ndarray]:
-    seg_len = int(sr * duration)
-    if len(y) <= seg_len:
-        pad = seg_len - len(y)
-        return [np.pad(y, (0, pad))]
-    segments = []
-    step = seg_len
-    for start in range(0, len(y), step):
-        seg = y[start:start + seg_len]
-        if len(seg) < seg_len:
-            seg = np.pad(seg, (0, seg_len - len(seg)))
-        segments.append(seg)
-    return segments
+@dataclass
+class FileResult:
+    """Outcome of preprocessing one source file."""
+    source: str
+    label: str
+    outputs: List[str] = field(default_factory=list)
+    audio_seconds: float = 0.0
+    seconds: float = 0.0
+    error: Optional[str] = None
 
+    @property
+    def ok(self) -> bool:
+        return self.error is None
 
-def process_file(infile: Path, outdir: Path, sr: int, duration: float, exts: List[str]):
+
+# Version of output_stem's scheme; part of preprocess_params, so a change renames existing outputs
+OUTPUT_NAMING = 2
+
+
+def output_stem(infile: Path, in_dir: Path) -> str:
+    """Output name for a source file: its sub-folders joined by '__' and its extension kept.
+
+    real/a.wav -> a_wav, real/x/a.mp3 -> x__a_mp3. A file whose own name contains
+    '__' can still match a nested one; list_sources refuses that.
+    """
+    rel = infile.relative_to(in_dir)
+    return '__'.join(rel.parent.parts + (f"{rel.stem}_{rel.suffix.lstrip('.')}",))
+
+
+def _write_wav(path: Path, y: np.ndarray, sr: int):
+    # Written under a temporary name and renamed, so an interrupted run never leaves a partial file
+    tmp = path.with_name(path.stem + '.tmp.wav')
+    sf.write(tmp, y, sr)
+    os.replace(tmp, path)
+
+
+def process_file(infile: Path, outdir: Path, sr: int, duration: float, name: str, label: str = '',
+                 use_denoise: bool = True, denoiser: str = 'spectral_gate', overlap: float = 0.0,
+                 silence_db: Optional[float] = None) -> FileResult:
+    """Load, denoise, trim, normalize and segment one file into outdir/<name>_<i>.wav."""
+    start = time.perf_counter()
+    result = FileResult(source=str(infile), label=label)
     try:
-        if not is_supported(infile, exts):
-            return 0
         y, _ = librosa.load(infile, sr=sr, mono=True)
-        y = denoise(y, sr)
+        result.audio_seconds = len(y) / sr
+        if use_denoise:
+            y = denoise(y, sr, denoiser)
         y = trim_silence(y, sr)
         y = normalize(y)
-        segs = segment_audio(y, sr, duration)
-        saved = 0
+        segs = segment_audio(y, sr, duration, overlap, silence_db)
         for i, seg in enumerate(segs):
-            outpath = outdir / f"{infile.stem}_{i}.wav"
-            sf.write(outpath, seg, sr)
-            saved += 1
-        return saved
-    except Exception:
-        return 0
-
-
-def run_preprocessing(root_dataset: Path, out_root: Path, config_path: Path):
+            outpath = outdir / f"{name}_{i}.wav"
+            _write_wav(outpath, seg, sr)
+            result.outputs.append(str(outpath))
+        # Drop segments left over from an earlier run of a longer version of this file
+        i = len(segs)
+        while (outdir / f"{name}_{i}.wav").exists():
+            (outdir / f"{name}_{i}.wav").unlink()
+            i += 1
+    except Exception as e:
+        result.error = f'{type(e).__name__}: {e}' if str(e) else type(e).__name__
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def _process_job(job: tuple) -> FileResult:
+    return process_file(*job)
+
+
+def preprocessing_settings(cfg: dict) -> dict:
+    pre_cfg = cfg.get('preprocessing', {})
+    return {
+        'workers': pre_cfg.get('workers', 0),
+        'chunksize': pre_cfg.get('chunksize', 4),
+        'denoise': pre_cfg.get('denoise', True),
+        'denoiser': pre_cfg.get('denoiser', 'spectral_gate'),
+        'write_wavs': pre_cfg.get('write_wavs', False),
+        'segment_overlap': pre_cfg.get('segment_overlap', 0.0),
+        'silence_db': pre_cfg.get('silence_db'),
+    }
+
+
+def preprocess_params(cfg: dict) -> dict:
+    """Config values the preprocessed segments (and their names) depend on, not how the work is spread."""
+    settings = preprocessing_settings(cfg)
+    return dict({k: settings[k] for k in ('denoise', 'denoiser', 'segment_overlap', 'silence_db')},
+                sr=cfg.get('sr', 16000), duration=cfg.get('duration', 3.0), naming=OUTPUT_NAMING)
+
+
+def write_report(results: List[FileResult], path: Path):
+    import csv
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['source', 'label', 'segments', 'audio_seconds', 'seconds', 'error'])
+        for r in results:
+            writer.writerow([r.source, r.label, len(r.outputs), round(r.audio_seconds, 3), round(r.seconds, 3),
+                             r.error or ''])
+
+
+def list_sources(root_dataset: Path, exts: List[str], cfg: Optional[dict] = None) -> List[tuple]:
+    """(file, label, output stem) for every supported file under root_dataset/{real,fake}, sorted.
+
+    Files come from the dataset manifest (see src/data/manifest.py), so only
+    directories that changed since the last run are listed again. Raises
+    ValueError if two files of a label would get the same output stem.
+    """
+    manifest = scan(root_dataset, cfg)
+    sources, seconds = [], 0.0
+    for label in ['real', 'fake']:
+        in_dir = root_dataset / label
+        if not in_dir.exists():
+            print('Input directory missing:', in_dir)
+            continue
+        entries = manifest.query(label, [e.lower() for e in exts])
+        seconds += sum(e.duration or 0.0 for e in entries)
+        sources.extend((e.path, label, output_stem(e.path, in_dir)) for e in entries)
+    seen = {}
+    for f, label, stem in sources:
+        other = seen.setdefault((label, stem), f)
+        if other != f:
+            raise ValueError(f'{other} and {f} would both be written as {label}/{stem}_<i>.wav; rename one')
+    print(f'{len(sources)} source files, {seconds / 3600:.2f} h of audio')
+    return sources
+
+
+def run_preprocessing(root_dataset: Path, out_root: Path, config_path: Path,
+                      only: Optional[set] = None) -> List[FileResult]:
+    """Preprocesses every supported file under root_dataset/{real,fake} on a process pool.
+
+    Files are handled in sorted order and named from their path, so re-runs write
+    the same outputs. Per-file results (segments or the error) go to
+    out_root/processed/preprocess_report.csv. `only` restricts the run to those
+    source paths (as strings), for incremental runs.
+    """
     cfg = load_config(config_path)
     sr = cfg.get('sr', 16000)
     duration = cfg.get('duration', 3.0)
     exts = cfg.get('supported_extensions', ['.wav'])
+    settings = preprocessing_settings(cfg)
+    workers = settings['workers'] or os.cpu_count() or 1
 
     for label in ['real', 'fake']:
-        in_dir = root_dataset / label
-        out_dir = out_root / 'processed' / label
-        out_dir.mkdir(parents=True, exist_ok=True)
-        if not in_dir.exists():
-            print('Input directory missing:', in_dir)
-            continue
-        files = list(in_dir.rglob('*'))
-        total = 0
-        for f in tqdm(files, desc=f'Processing {label}'):
-            if f.is_file():
-                total += process_file(f, out_dir, sr, duration, exts)
-        print(f'Processed {total} segments for', label)
+        (out_root / 'processed' / label).mkdir(parents=True, exist_ok=True)
+    jobs = [(f, out_root / 'processed' / label, sr, duration, stem, label, settings['denoise'], settings['denoiser'],
+             settings['segment_overlap'], settings['silence_db'])
+            for f, label, stem in list_sources(root_dataset, exts, cfg) if only is None or str(f) in only]
+
+    start = time.perf_counter()
+    if workers > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(tqdm(pool.map(_process_job, jobs, chunksize=settings['chunksize']),
+                                total=len(jobs), desc=f'Preprocessing ({workers} processes)'))
+    else:
+        results = [_process_job(job) for job in tqdm(jobs, desc='Preprocessing')]
+    elapsed = time.perf_counter() - start
+
+    for label in ['real', 'fake']:
+        done = [r for r in results if r.label == label]
+        print(f'Processed {sum(len(r.outputs) for r in done)} segments for', label)
+    failed = [r for r in results if not r.ok]
+    for r in failed:
+        print('  failed:', r.source, '-', r.error)
+    audio = sum(r.audio_seconds for r in results)
+    print(f'{len(results) - len(failed)}/{len(results)} files in {elapsed:.1f}s: '
+          f'{len(results) / max(1e-9, elapsed):.2f} files/sec, {audio / max(1e-9, elapsed):.1f}x realtime '
+          f'on {workers} process(es)')
+    write_report(results, out_root / 'processed' / 'preprocess_report.csv')
+    return results
@@ -0,0 +1,55 @@
+from typing import List, Optional, Tuple
+import numpy as np
+
+
+def frame_audio(y: np.ndarray, seg_len: int, hop: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Windows of seg_len samples every hop samples (default hop = seg_len, no overlap).
+
+    Returns the full windows as a read-only (n, seg_len) strided view of y, so
+    nothing is copied, and the rest as a (0 or 1, seg_len) array: the window
+    starting where the next one would, zero-padded, if any samples are not yet
+    covered. An empty y gives one silent window.
+    """
+    hop = hop or seg_len
+    n = len(y)
+    if n >= seg_len:
+        full = np.lib.stride_tricks.sliding_window_view(y, seg_len)[::hop]
+    else:
+        full = np.empty((0, seg_len), dtype=y.dtype)
+    start = len(full) * hop
+    covered = (len(full) - 1) * hop + seg_len if len(full) else 0
+    if covered >= n and n:
+        return full, np.empty((0, seg_len), dtype=y.dtype)
+    tail = np.zeros((1, seg_len), dtype=y.dtype)
+    tail[0, :n - start] = y[start:]
+    return full, tail
+
+
+def window_rms_db(y: np.ndarray, starts: np.ndarray, seg_len: int) -> np.ndarray:
+    """RMS level in dBFS of y[start:start + seg_len] for every start, from one cumulative sum.
+
+    Windows running past the end are measured over the samples they hold, so
+    padding does not make a short loud tail look quiet.
+    """
+    energy = np.concatenate([[0.0], np.cumsum(np.square(y, dtype=np.float64))])
+    starts = np.minimum(np.asarray(starts), len(y))
+    ends = np.minimum(starts + seg_len, len(y))
+    rms = np.sqrt((energy[ends] - energy[starts]) / np.maximum(ends - starts, 1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def segment_audio(y: np.ndarray, sr: int, duration: float, overlap: float = 0.0,
+                  silence_db: Optional[float] = None) -> List[np.ndarray]:
+    """Splits y into duration-second segments overlapping by the given fraction.
+
+    Segments are views of y except for the zero-padded last one. With
+    silence_db set, segments whose RMS level is below it (dBFS) are dropped.
+    """
+    seg_len = int(sr * duration)
+    hop = max(1, int(round(seg_len * (1 - overlap))))
+    full, tail = frame_audio(y, seg_len, hop)
+    segs = list(full) + list(tail)
+    if silence_db is not None:
+        loud = window_rms_db(y, np.arange(len(segs)) * hop, seg_len) >= silence_db
+        segs = [s for s, keep in zip(segs, loud) if keep]
+    return segs
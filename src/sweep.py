@@ -0,0 +1,225 @@
+import itertools
+import multiprocessing as mp
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Tuple
+from yaml import safe_dump, safe_load
+
+# Search-space keys that change the features rather than being passed to train_model as-is
+FEATURE_KEYS = ('n_mels', 'duration')
+
+
+def load_config(path: Path) -> dict:
+    with open(path, 'r') as f:
+        return safe_load(f)
+
+
+def sample_trials(space: dict, n: Optional[int], seed: int = 42) -> List[dict]:
+    """All combinations of the search space, or a seeded random subset of n of them."""
+    keys = sorted(space)
+    grid = [dict(zip(keys, combo)) for combo in itertools.product(*(space[k] for k in keys))]
+    if n and n < len(grid):
+        grid = random.Random(seed).sample(grid, n)
+    return grid
+
+
+def usable_space(space: dict, base_cfg: dict) -> dict:
+    """The search space without durations longer than the base config's, which the features cannot provide.
+
+    Trials crop the base config's extracted clips to a shorter duration; longer
+    clips would need the audio segmented again, so those values are dropped here
+    with a message rather than trained at the base duration under the wrong name.
+    """
+    base_duration = base_cfg.get('duration', 3.0)
+    too_long = [d for d in space.get('duration', []) if d > base_duration]
+    if not too_long:
+        return space
+    print(f'Skipping duration {too_long}: longer than the {base_duration}s clips of the base config '
+          f'(raise its duration and re-run preprocessing to sweep them)')
+    kept = [d for d in space['duration'] if d <= base_duration]
+    if not kept:
+        raise SystemExit(f'No sweep duration is <= the base config duration of {base_duration}s')
+    return dict(space, duration=kept)
+
+
+def feature_splits(n_mels: int, base_cfg: dict, sweep_cfg: dict) -> Tuple[str, str]:
+    """Train/val CSVs for an n_mels value, extracting the features once per value.
+
+    The base config's n_mels reuses the project's existing features; other values
+    are extracted into feature_cache/n_mels_<n> and the existing split is remapped
+    onto them by file name, so every variant sees the same clips.
+    """
+    train_csv, val_csv = sweep_cfg['train_csv'], sweep_cfg['val_csv']
+    if n_mels == base_cfg.get('n_mels', 128):
+        return train_csv, val_csv
+    import pandas as pd
+    from src.data.shards import item_name
+    from src.features.extract_features import extract_and_save
+    root = Path(sweep_cfg.get('feature_cache', 'data/features_sweep')) / f'n_mels_{n_mels}'
+    splits = root / 'splits'
+    if not (splits / 'val.csv').exists():
+        print(f'Extracting features with n_mels={n_mels} into {root}')
+        root.mkdir(parents=True, exist_ok=True)
+        with open(root / 'config.yaml', 'w') as f:
+            safe_dump(dict(base_cfg, n_mels=n_mels), f)
+        extract_and_save(Path(sweep_cfg.get('processed_root', 'data/processed')), root, root / 'config.yaml')
+        splits.mkdir(exist_ok=True)
+        for src in (train_csv, val_csv):
+            df = pd.read_csv(src)
+            df['file'] = [str(root / 'mel_spectrograms' / ('real' if label == 1 else 'fake') / f'{item_name(f)}.npy')
+                          for f, label in zip(df['file'], df['label'])]
+            df = df[[Path(f).exists() for f in df['file']]]
+            df.to_csv(splits / Path(src).name, index=False)
+    return str(splits / Path(train_csv).name), str(splits / Path(val_csv).name)
+
+
+def trial_overrides(trial: dict, base_cfg: dict, trial_dir: Path, epochs: int) -> dict:
+    """Config overrides that give a trial its hyperparameters and its own output paths."""
+    overrides = {k: v for k, v in trial.items() if k not in FEATURE_KEYS}
+    overrides.update({
+        'epochs': epochs,
+        'log_dir': str(trial_dir / 'logs'),
+        # parallelism comes from running trials side by side
+        'dataloader': {'num_workers': 0},
+        'checkpoint': {'dir': str(trial_dir / 'checkpoints'), 'every_epochs': 1, 'every_steps': 0, 'keep': 1},
+        'profiling': {'summary': str(trial_dir / 'run_summary.json'), 'trace_steps': 0},
+    })
+    data = {}
+    if trial.get('n_mels', base_cfg.get('n_mels', 128)) != base_cfg.get('n_mels', 128):
+        data['format'] = 'npy'
+    duration = trial.get('duration')
+    base_duration = base_cfg.get('duration', 3.0)
+    if duration is not None and duration > base_duration:
+        raise ValueError(f'duration {duration} is longer than the base config clips ({base_duration}s)')
+    if duration is not None and duration < base_duration:
+        # Shorter clips are the first frames of the extracted ones
+        data['max_frames'] = int(duration * base_cfg.get('sr', 16000) / base_cfg.get('hop_length', 512)) + 1
+    if data:
+        overrides['data'] = data
+    return overrides
+
+
+def _latency_ms(model_path: Path, val_csv: str, cfg: dict, repeats: int = 20) -> Optional[float]:
+    """Median single-clip inference latency of the trial's best model."""
+    import torch
+    from src.data.dataset import build_dataset
+    from src.model.cnn import DeepCNN
+    if not Path(model_path).exists():
+        return None
+    model = DeepCNN.from_state_dict(torch.load(model_path, map_location='cpu'))
+    model.eval()
+    x = build_dataset(val_csv, cfg)[0][0].unsqueeze(0)
+    times = []
+    with torch.no_grad():
+        for i in range(repeats + 3):
+            t0 = time.perf_counter()
+            model(x)
+            if i >= 3:
+                times.append(time.perf_counter() - t0)
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def _run_trial(cfg_path: str, train_csv: str, val_csv: str, trial_dir: str, overrides: dict,
+               threads: int, resume: bool) -> dict:
+    # Set before torch starts its thread pools in this (spawned) process
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    import contextlib
+    import torch
+    from src.train import load_config, merge_config, train_model
+    torch.set_num_threads(threads)
+    trial_dir = Path(trial_dir)
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    model_out = trial_dir / 'best_model.pth'
+    with open(trial_dir / 'train.log', 'a') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        result = train_model(cfg_path, train_csv, val_csv, model_out, resume=resume, overrides=overrides)
+        result['latency_ms'] = _latency_ms(model_out, val_csv, merge_config(load_config(cfg_path), overrides))
+    return result
+
+
+def _write_leaderboard(rows: dict, path: Path):
+    import pandas as pd
+    df = pd.DataFrame(list(rows.values()))
+    df = df.sort_values(['best_val_acc', 'train_seconds'], ascending=[False, True], na_position='last')
+    tmp = path.with_name(path.name + '.tmp')
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def run_sweep(sweep_path: Path):
+    """Successive halving over the sweep's search space with trials run as parallel processes.
+
+    Every trial trains halving.min_epochs epochs; the best 1/eta (by validation
+    accuracy) resume from their checkpoints for eta times as many epochs, and so
+    on up to halving.max_epochs. leaderboard.csv is rewritten as each trial finishes.
+    """
+    sweep_cfg = load_config(sweep_path)
+    cfg_path = sweep_cfg.get('base_config', 'config/config.yaml')
+    base_cfg = load_config(cfg_path)
+    out_dir = Path(sweep_cfg.get('out_dir', 'sweeps/latest'))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    leaderboard = out_dir / 'leaderboard.csv'
+    parallel = sweep_cfg.get('parallel', 2)
+    threads = sweep_cfg.get('threads_per_trial') or max(1, (os.cpu_count() or 1) // parallel)
+    halving = sweep_cfg.get('halving', {})
+    min_epochs = halving.get('min_epochs', 3)
+    max_epochs = halving.get('max_epochs', 27)
+    eta = halving.get('eta', 3)
+
+    trials = sample_trials(usable_space(sweep_cfg['space'], base_cfg), sweep_cfg.get('trials'),
+                           sweep_cfg.get('seed', 42))
+    splits = {n: feature_splits(n, base_cfg, sweep_cfg)
+              for n in sorted({t.get('n_mels', base_cfg.get('n_mels', 128)) for t in trials})}
+    print(f'{len(trials)} trials, {parallel} in parallel with {threads} thread(s) each')
+
+    rows = {}
+    for i, trial in enumerate(trials):
+        rows[i] = dict({'trial': i}, **trial, rung=0, epochs=0, best_val_acc=None, train_seconds=0.0,
+                       samples_per_sec=None, latency_ms=None, status='pending')
+    alive = list(range(len(trials)))
+    epochs = min(min_epochs, max_epochs)
+    rung = 0
+    ctx = mp.get_context('spawn')
+    while alive:
+        print(f'Rung {rung}: {len(alive)} trial(s) to {epochs} epochs')
+        with ProcessPoolExecutor(max_workers=parallel, mp_context=ctx) as pool:
+            futures = {}
+            for i in alive:
+                trial_dir = out_dir / f'trial_{i:03d}'
+                train_csv, val_csv = splits[trials[i].get('n_mels', base_cfg.get('n_mels', 128))]
+                overrides = trial_overrides(trials[i], base_cfg, trial_dir, epochs)
+                futures[pool.submit(_run_trial, cfg_path, train_csv, val_csv, str(trial_dir), overrides,
+                                    threads, rung > 0)] = i
+            for fut in as_completed(futures):
+                i = futures[fut]
+                row = rows[i]
+                row['rung'] = rung
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    row['status'] = f'failed: {e}'
+                else:
+                    row.update(best_val_acc=result['best_val_acc'], epochs=result['epochs'],
+                               train_seconds=row['train_seconds'] + result['train_seconds'],
+                               samples_per_sec=result['samples_per_sec'], latency_ms=result['latency_ms'],
+                               status='early-stopped' if result['stopped_early'] else 'running')
+                print(f"  trial {i}: acc={row['best_val_acc']} after {row['epochs']} epochs ({row['status']})")
+                _write_leaderboard(rows, leaderboard)
+
+        contenders = [i for i in alive if rows[i]['status'] == 'running']
+        if epochs >= max_epochs or len(contenders) <= 1:
+            for i in contenders:
+                rows[i]['status'] = 'done'
+            break
+        contenders.sort(key=lambda i: (-rows[i]['best_val_acc'], rows[i]['train_seconds']))
+        alive = contenders[:max(1, len(contenders) // eta)]
+        for i in contenders[len(alive):]:
+            rows[i]['status'] = 'halved'
+        epochs = min(max_epochs, epochs * eta)
+        rung += 1
+
+    _write_leaderboard(rows, leaderboard)
+    print('Leaderboard written to', leaderboard)
+    return rows
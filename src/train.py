@@ -1,5 +1,4 @@
 import torch
-from torch.utils.data import DataLoader
 import torch.nn as nn
 import torch.optim as optim
 from pathlib import Path
@@ -7,6 +6,7 @@ from yaml import safe_load
 from tqdm import tqdm
 import numpy as np
 import random
+import time
 
 
 
@@ -24,79 +24,314 @@ def set_seed(seed: int):
         torch.cuda.manual_seed_all(seed)
 
 
-def train_model(cfg_path: Path, train_csv: Path, val_csv: Path, model_out: Path):
+def merge_config(cfg: dict, overrides: dict) -> dict:
+    """Copy of cfg with overrides applied; nested sections are merged key by key."""
+    merged = dict(cfg)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def distillation_loss(student_logits: torch.Tensor, teacher_logits: torch.Tensor, targets: torch.Tensor,
+                      alpha: float, temperature: float) -> torch.Tensor:
+    """(1 - alpha) * BCE on the labels + alpha * T^2 * BCE against the teacher's softened P(real)."""
+    hard = nn.functional.binary_cross_entropy_with_logits(student_logits, targets)
+    soft_targets = torch.sigmoid(teacher_logits / temperature)
+    soft = nn.functional.binary_cross_entropy_with_logits(student_logits / temperature, soft_targets)
+    return (1 - alpha) * hard + alpha * temperature ** 2 * soft
+
+
+def train_model(cfg_path: Path, train_csv: Path, val_csv: Path, model_out: Path, resume: bool = False,
+                overrides: dict = None) -> dict:
+    """Trains DeepCNN and returns the best validation accuracy with timing for this call."""
+    from src.distributed import all_reduce_sum, is_distributed, is_main, rank, world_size
     cfg = load_config(cfg_path)
-    set_seed(cfg.get('seed', 42))
+    if overrides:
+        cfg = merge_config(cfg, overrides)
+    run_start = time.perf_counter()
+    # Each rank draws different dropout masks; DDP broadcasts rank 0's initial weights
+    set_seed(cfg.get('seed', 42) + rank())
     device = torch.device('cuda' if torch.cuda.is_available() and cfg.get('device', 'auto') == 'auto' else 'cpu')
-    from src.data.dataset import AudioFeatureDataset
+    from src.data.augment import AugmentCollate, augment_settings
+    from src.data.dataset import build_dataset
+    from src.data.loader import (PadCollate, autotune_num_workers, batched_collate, bucketed_loader, build_loader,
+                                 loader_settings, unpack_batch)
+    from src.data.samplers import BalancedSampler, EpochShuffleSampler, ShardShuffleSampler
     from src.model.cnn import DeepCNN
+    from src.model.runtime import autocast, mode_name, prepare_input, prepare_model, runtime_settings
+    from src.utils.checkpoint import (checkpoint_name, latest_checkpoint, load_checkpoint, rng_state,
+                                      save_checkpoint, set_aside_checkpoints, set_rng_state)
+    from src.utils.profiler import ProfilerWindow, StepTimer, profiling_settings, write_run_summary
 
-    train_ds = AudioFeatureDataset(str(train_csv))
-    val_ds = AudioFeatureDataset(str(val_csv))
-    train_loader = DataLoader(train_ds, batch_size=cfg.get('batch_size', 32), shuffle=True)
-    val_loader = DataLoader(val_ds, batch_size=cfg.get('batch_size', 32), shuffle=False)
+    train_ds = build_dataset(str(train_csv), cfg)
+    val_ds = build_dataset(str(val_csv), cfg)
+    batch_size = cfg.get('batch_size', 32)
+    replicas = {'num_replicas': world_size(), 'rank': rank()}
+    aug = augment_settings(cfg)
+    if aug['balance'] == 'sampler':
+        train_sampler = BalancedSampler(train_ds.labels, seed=cfg.get('seed', 42), **replicas)
+    elif hasattr(train_ds, 'shard_ids'):
+        train_sampler = ShardShuffleSampler(train_ds.shard_ids, seed=cfg.get('seed', 42), **replicas)
+    else:
+        train_sampler = EpochShuffleSampler(len(train_ds), seed=cfg.get('seed', 42), **replicas)
+    val_sampler = EpochShuffleSampler(len(val_ds), shuffle=False, pad=False, **replicas)
+    num_workers = loader_settings(cfg)['num_workers']
+    if num_workers == 'auto':
+        num_workers = autotune_num_workers(train_ds, cfg, batch_size)
+    non_blocking = loader_settings(cfg)['pin_memory']
+    # Dedicated generator so creating a loader iterator never consumes the global RNG
+    loader_gen = torch.Generator().manual_seed(cfg.get('seed', 42))
+    # Tensor augmentation draws from a seed per (epoch, batch), not from the workers' RNG,
+    # so resuming mid-epoch repeats it exactly with any num_workers; ranks augment differently
+    seeded = aug['mode'] == 'tensor'
+    batch_seed = cfg.get('seed', 42) + rank() if seeded else None
+    if loader_settings(cfg)['bucket_by_length']:
+        # Variable-length clips: batches of similar frame counts, padded with lengths for masking
+        pad = PadCollate(loader_settings(cfg)['pad_multiple'])
+        train_loader = bucketed_loader(train_ds, cfg, batch_size, train_sampler, num_workers=num_workers,
+                                       collate_fn=AugmentCollate(aug, pad, seeded=True) if seeded else pad,
+                                       generator=loader_gen, batch_seed=batch_seed)
+        train_sampler = train_loader.batch_sampler
+        val_loader = bucketed_loader(val_ds, cfg, batch_size, val_sampler, num_workers=num_workers)
+    else:
+        train_collate = AugmentCollate(aug, batched_collate, seeded=True) if seeded else None
+        train_loader = build_loader(train_ds, cfg, batch_size, sampler=train_sampler, num_workers=num_workers,
+                                    collate_fn=train_collate, generator=loader_gen, batch_seed=batch_seed)
+        if seeded:
+            train_sampler = train_loader.batch_sampler
+        val_loader = build_loader(val_ds, cfg, batch_size, sampler=val_sampler, num_workers=num_workers)
 
-    model = DeepCNN().to(device)
-    criterion = nn.BCELoss()
-    optimizer = optim.Adam(model.parameters(), lr=cfg.get('lr', 0.001))
+    rt = runtime_settings(cfg)
+    preset = cfg.get('model', {}).get('preset', 'full')
+    base_model = DeepCNN.from_preset(preset, output_logits=True).to(device)
+    model = prepare_model(base_model, dict(rt, compile=False))
+    if is_distributed():
+        from torch.nn.parallel import DistributedDataParallel as DDP
+        model = DDP(model)
+    if rt['compile']:
+        model = torch.compile(model)
+    if is_main():
+        print('Runtime mode:', mode_name(rt), f'x {world_size()} process(es)')
+    criterion = nn.BCEWithLogitsLoss()
+    distill = cfg.get('distillation', {})
+    teacher = None
+    if distill.get('enabled', False):
+        teacher_path = Path(distill.get('teacher', 'models/best_model.pth'))
+        if Path(model_out).resolve() == teacher_path.resolve():
+            raise ValueError(f'Distillation would overwrite its teacher {teacher_path}; use another model_out')
+        teacher = DeepCNN.from_state_dict(torch.load(teacher_path, map_location=device), output_logits=True)
+        teacher = prepare_model(teacher.to(device).eval(), dict(rt, compile=False))
+        alpha = distill.get('alpha', 0.5)
+        temperature = distill.get('temperature', 2.0)
+        if is_main():
+            print(f'Distilling {teacher_path} into preset {preset!r} (alpha={alpha}, T={temperature})')
+    elif is_main():
+        print('Model preset:', preset)
+    optimizer = optim.Adam(base_model.parameters(), lr=cfg.get('lr', 0.001))
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=3, factor=0.5)
 
-    try:
-        from torch.utils.tensorboard import SummaryWriter
-        writer = SummaryWriter(log_dir=str(Path('logs') / 'tensorboard'))
-    except Exception:
-        writer = None
+    ckpt_cfg = cfg.get('checkpoint', {})
+    ckpt_dir = Path(ckpt_cfg.get('dir', 'models/checkpoints'))
+    every_epochs = ckpt_cfg.get('every_epochs', 1)
+    every_steps = ckpt_cfg.get('every_steps', 0)
+    keep = ckpt_cfg.get('keep', 3)
+
     best_val = 0.0
     patience = cfg.get('patience', 7)
     no_improve = 0
+    start_epoch = 0
+    start_step = 0
+    global_step = 0
+    train_loss_sum = 0.0
+    train_loss_steps = 0
+    restored_rng = None
+    if not resume and is_main():
+        moved = set_aside_checkpoints(ckpt_dir)
+        if moved:
+            print(f'Moved {moved} checkpoint(s) of an earlier run to', ckpt_dir / 'previous')
+    if resume:
+        ckpt_path = latest_checkpoint(ckpt_dir)
+        if ckpt_path is None:
+            if is_main():
+                print('No checkpoint found in', ckpt_dir, '- starting from scratch')
+        else:
+            state = load_checkpoint(ckpt_path)
+            base_model.load_state_dict(state['model'])
+            optimizer.load_state_dict(state['optimizer'])
+            scheduler.load_state_dict(state['scheduler'])
+            loader_gen.set_state(state['loader_generator'])
+            best_val = state['best_val']
+            no_improve = state['no_improve']
+            start_epoch = state['epoch']
+            start_step = state['step']
+            global_step = state['global_step']
+            train_loss_sum = state['train_loss_sum']
+            train_loss_steps = state['train_loss_steps']
+            restored_rng = state['rng']
+            if isinstance(restored_rng, list):
+                # per-rank states from a distributed run
+                restored_rng = restored_rng[rank() % len(restored_rng)]
+            if is_main():
+                print(f'Resuming from {ckpt_path} (epoch {start_epoch}, step {start_step})')
+
+    def checkpoint(epoch: int, step: int):
+        # (epoch, step) is the position training continues from; called on every rank
+        rng = rng_state()
+        if is_distributed():
+            import torch.distributed as dist
+            gathered = [None] * world_size()
+            dist.all_gather_object(gathered, rng)
+            rng = gathered
+        if not is_main():
+            return
+        save_checkpoint({
+            'model': base_model.state_dict(),
+            'optimizer': optimizer.state_dict(),
+            'scheduler': scheduler.state_dict(),
+            'loader_generator': loader_gen.get_state(),
+            'rng': rng,
+            'epoch': epoch,
+            'step': step,
+            'global_step': global_step,
+            'best_val': best_val,
+            'no_improve': no_improve,
+            'train_loss_sum': float(train_loss_sum),
+            'train_loss_steps': train_loss_steps,
+        }, ckpt_dir, checkpoint_name(epoch, step), keep=keep)
+
+    writer = None
+    if is_main():
+        try:
+            from torch.utils.tensorboard import SummaryWriter
+            writer = SummaryWriter(log_dir=str(Path(cfg.get('log_dir', 'logs')) / 'tensorboard'))
+        except Exception:
+            writer = None
+
+    prof = profiling_settings(cfg)
+    timer = StepTimer(device, enabled=prof['enabled'])
+    window = ProfilerWindow(prof['trace_start'], prof['trace_steps'] if is_main() else 0,
+                            prof['trace_dir'], device)
+    run_summary = {'runtime_mode': mode_name(rt), 'world_size': world_size(), 'batch_size': batch_size,
+                   'num_workers': num_workers, 'epochs': []}
 
-    for epoch in range(cfg.get('epochs', 50)):
+    if restored_rng is not None:
+        set_rng_state(restored_rng)
+    epoch = start_epoch - 1
+    samples_per_sec = 0.0
+    # A run resumed after early stopping has nothing left to train
+    stop = no_improve >= patience
+    for epoch in range(start_epoch, start_epoch if stop else cfg.get('epochs', 50)):
+        step = start_step if epoch == start_epoch else 0
+        if step == 0:
+            train_loss_sum = 0.0
+            train_loss_steps = 0
+        train_sampler.set_epoch(epoch, start=step * batch_size)
         model.train()
-        train_losses = []
-        for xb, yb in tqdm(train_loader, desc=f'Epoch {epoch} train'):
-            xb = xb.to(device)
-            yb = yb.to(device)
-            pred = model(xb)
-            loss = criterion(pred, yb.unsqueeze(1))
+        timer.reset()
+        for batch in tqdm(train_loader, desc=f'Epoch {epoch} train', initial=step,
+                          total=step + len(train_loader), disable=not is_main()):
+            xb, yb, lengths = unpack_batch(batch)
+            xb = prepare_input(xb.to(device, non_blocking=non_blocking), rt)
+            yb = yb.to(device, non_blocking=non_blocking)
+            timer.lap('data')
+            with autocast(rt, device):
+                logits = model(xb, lengths)
+                if teacher is not None:
+                    with torch.no_grad():
+                        teacher_logits = teacher(xb, lengths)
+            if teacher is None:
+                loss = criterion(logits.float(), yb.unsqueeze(1))
+            else:
+                loss = distillation_loss(logits.float(), teacher_logits.float(), yb.unsqueeze(1), alpha, temperature)
+            timer.lap('forward')
             optimizer.zero_grad()
             loss.backward()
+            timer.lap('backward')
             optimizer.step()
-            train_losses.append(loss.item())
-        avg_train = sum(train_losses) / max(1, len(train_losses))
+            timer.lap('optimizer')
+            # Accumulated on-device; reading it back every step would force a sync
+            train_loss_sum = train_loss_sum + loss.detach()
+            train_loss_steps += 1
+            timer.step(len(yb))
+            step += 1
+            global_step += 1
+            window.step(global_step)
+            if writer and prof['log_every'] and global_step % prof['log_every'] == 0:
+                for phase, seconds in timer.last.items():
+                    writer.add_scalar(f'Step/{phase}_ms', seconds * 1000, global_step)
+            if every_steps and global_step % every_steps == 0:
+                checkpoint(epoch, step)
+            timer.lap('bookkeeping')
+        timing = timer.summary()
+        loss_sum, loss_count, seen = all_reduce_sum([float(train_loss_sum), train_loss_steps, timer.samples])
+        avg_train = loss_sum / max(1, loss_count)
+        samples_per_sec = seen / max(1e-9, time.perf_counter() - timer.start)
 
         model.eval()
-        val_losses = []
+        val_loss_sum = 0.0
         correct = 0
         total = 0
         with torch.no_grad():
-            for xb, yb in val_loader:
-                xb = xb.to(device)
-                yb = yb.to(device)
-                pred = model(xb)
-                loss = criterion(pred, yb.unsqueeze(1))
-                val_losses.append(loss.item())
-                preds = (pred.detach().cpu().squeeze() >= 0.5).numpy()
+            for batch in val_loader:
+                xb, yb, lengths = unpack_batch(batch)
+                xb = prepare_input(xb.to(device, non_blocking=non_blocking), rt)
+                yb = yb.to(device, non_blocking=non_blocking)
+                with autocast(rt, device):
+                    logits = model(xb, lengths)
+                loss = criterion(logits.float(), yb.unsqueeze(1))
+                val_loss_sum += loss.item() * len(yb)
+                preds = (logits.detach().float().cpu().squeeze() >= 0).numpy()
                 correct += (preds == yb.cpu().numpy()).sum()
                 total += len(yb)
-        avg_val = sum(val_losses) / max(1, len(val_losses))
+        # Aggregated over all ranks so every rank takes the same scheduler/early-stopping decisions
+        val_loss_sum, correct, total = all_reduce_sum([val_loss_sum, float(correct), float(total)])
+        avg_val = val_loss_sum / max(1, total)
         acc = correct / max(1, total)
         if writer:
             writer.add_scalar('Loss/train', avg_train, epoch)
             writer.add_scalar('Loss/val', avg_val, epoch)
             writer.add_scalar('Acc/val', acc, epoch)
+            writer.add_scalar('Throughput/train_samples_per_sec', samples_per_sec, epoch)
+            if prof['enabled']:
+                for key in ('data_ms', 'forward_ms', 'backward_ms', 'optimizer_ms', 'bookkeeping_ms', 'data_fraction'):
+                    writer.add_scalar(f'Timing/{key}', timing[key], epoch)
+                if timing['peak_rss_mb'] is not None:
+                    writer.add_scalar('Memory/peak_rss_mb', timing['peak_rss_mb'], epoch)
         scheduler.step(avg_val)
 
-        print(f'Epoch {epoch} train_loss={avg_train:.4f} val_loss={avg_val:.4f} val_acc={acc:.4f}')
+        if is_main():
+            print(f'Epoch {epoch} train_loss={avg_train:.4f} val_loss={avg_val:.4f} val_acc={acc:.4f} '
+                  f'samples/sec={samples_per_sec:.1f}')
+            if prof['enabled']:
+                print(f"  per step: data {timing['data_ms']:.1f} ms ({timing['data_fraction']:.0%}), "
+                      f"forward {timing['forward_ms']:.1f} ms, backward {timing['backward_ms']:.1f} ms, "
+                      f"optimizer {timing['optimizer_ms']:.1f} ms, bookkeeping {timing['bookkeeping_ms']:.1f} ms")
+                run_summary['epochs'].append(dict(timing, epoch=epoch, samples_per_sec=samples_per_sec,
+                                                  train_loss=avg_train, val_loss=avg_val, val_acc=acc))
+                write_run_summary(prof['summary'], run_summary)
 
         if acc > best_val:
             best_val = acc
-            torch.save(model.state_dict(), model_out)
+            if is_main():
+                torch.save(base_model.state_dict(), model_out)
             no_improve = 0
         else:
             no_improve += 1
-        if no_improve >= patience:
-            print('Early stopping')
+        stop = no_improve >= patience
+        if every_epochs and ((epoch + 1) % every_epochs == 0 or stop):
+            train_loss_sum = 0.0
+            train_loss_steps = 0
+            checkpoint(epoch + 1, 0)
+        if stop:
+            if is_main():
+                print('Early stopping')
             break
 
+    window.stop()
     if writer:
         writer.close()
+    return {'best_val_acc': float(best_val), 'epochs': epoch + 1, 'stopped_early': bool(stop),
+            'train_seconds': time.perf_counter() - run_start, 'samples_per_sec': samples_per_sec}
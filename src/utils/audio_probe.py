@@ -0,0 +1,288 @@
+import io
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+# Extensions whose headers probe() understands (anything else libsndfile reads goes through soundfile)
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.mp3', '.ogg', '.opus', '.m4a', '.mp4', '.aac')
+
+
+@dataclass
+class AudioInfo:
+    """What a file's headers say about its audio, without decoding it."""
+    format: str
+    channels: int
+    sample_rate: int
+    duration: float
+
+
+def _skip_id3(f: BinaryIO) -> int:
+    """Skips an ID3v2 tag at the start of the file; returns where the audio starts."""
+    f.seek(0)
+    head = f.read(10)
+    start = 0
+    if len(head) == 10 and head[:3] == b'ID3':
+        size = (head[6] & 0x7f) << 21 | (head[7] & 0x7f) << 14 | (head[8] & 0x7f) << 7 | (head[9] & 0x7f)
+        start = 10 + size + (10 if head[5] & 0x10 else 0)
+    f.seek(start)
+    return start
+
+
+def _probe_wav(f: BinaryIO, file_size: int) -> Optional[AudioInfo]:
+    head = f.read(12)
+    if head[:4] not in (b'RIFF', b'RF64', b'BW64') or head[8:12] != b'WAVE':
+        return None
+    fmt, ds64_size = None, None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        cid, size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+        if cid == b'data':
+            # RF64 keeps the real size in ds64; streamed WAVs may leave it 0 or 0xFFFFFFFF
+            if size == 0xFFFFFFFF and ds64_size is not None:
+                size = ds64_size
+            size = min(size, file_size - f.tell()) if size else file_size - f.tell()
+            break
+        body = f.read(size + (size & 1))
+        if cid == b'fmt ' and len(body) >= 16:
+            fmt = struct.unpack('<HHIIH', body[:14])
+        elif cid == b'ds64' and len(body) >= 16:
+            ds64_size = struct.unpack('<Q', body[8:16])[0]
+    if fmt is None:
+        return None
+    _, channels, sr, byte_rate, block_align = fmt
+    if not byte_rate:
+        return None
+    size -= size % block_align if block_align else 0
+    return AudioInfo('wav', channels, sr, size / byte_rate)
+
+
+def _probe_flac(f: BinaryIO) -> Optional[AudioInfo]:
+    if f.read(4) != b'fLaC':
+        return None
+    block = f.read(4 + 34)
+    if len(block) < 38 or block[0] & 0x7f != 0:
+        return None
+    # STREAMINFO bytes 10-17: 20-bit sample rate, 3-bit channels - 1, 5-bit bits - 1, 36-bit total samples
+    bits = int.from_bytes(block[4 + 10:4 + 18], 'big')
+    sr = bits >> 44
+    if not sr:
+        return None
+    return AudioInfo('flac', ((bits >> 41) & 7) + 1, sr, (bits & ((1 << 36) - 1)) / sr)
+
+
+_MP3_BITRATES = {  # kbps by (MPEG-1?, layer)
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_BITRATES[(False, 3)] = _MP3_BITRATES[(False, 2)]
+
+
+def _mp3_header(b: bytes):
+    """(sample rate, channels, samples per frame, bitrate in bps, MPEG-1?) of a frame header, or None."""
+    if b[0] != 0xFF or b[1] & 0xE0 != 0xE0:
+        return None
+    version, layer = (b[1] >> 3) & 3, 4 - ((b[1] >> 1) & 3)
+    rate_idx, sr_idx = b[2] >> 4, (b[2] >> 2) & 3
+    if version == 1 or layer == 4 or rate_idx in (0, 15) or sr_idx == 3:
+        return None
+    mpeg1 = version == 3
+    sr = (44100, 48000, 32000)[sr_idx] >> {3: 0, 2: 1, 0: 2}[version]
+    spf = 384 if layer == 1 else (1152 if mpeg1 or layer == 2 else 576)
+    return sr, 1 if b[3] >> 6 == 3 else 2, spf, _MP3_BITRATES[(mpeg1, layer)][rate_idx] * 1000, mpeg1
+
+
+def _probe_mp3(f: BinaryIO, file_size: int) -> Optional[AudioInfo]:
+    start = _skip_id3(f)
+    buf = f.read(1 << 16)
+    # The first sync word whose next frame also parses, so stray 0xFF bytes are not taken for a header
+    for i in range(len(buf) - 4):
+        hdr = _mp3_header(buf[i:i + 4])
+        if hdr is None:
+            continue
+        sr, channels, spf, bitrate, mpeg1 = hdr
+        frame_len = spf // 8 * bitrate // sr + ((buf[i + 2] >> 1) & 1) * (4 if spf == 384 else 1)
+        nxt = buf[i + frame_len:i + frame_len + 4]
+        if len(nxt) == 4 and _mp3_header(nxt) is None:
+            continue
+        break
+    else:
+        return None
+    frame = buf[i:i + 200]
+    side = (32 if channels == 2 else 17) if mpeg1 else (17 if channels == 2 else 9)
+    xing = 4 + side
+    if frame[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', frame[xing + 4:xing + 8])[0]
+        if flags & 1:
+            frames = struct.unpack('>I', frame[xing + 8:xing + 12])[0]
+            samples = frames * spf
+            # The LAME tag after the Xing fields records the encoder delay and padding (gapless length)
+            lame = xing + 8 + 4 * bin(flags & 3).count('1') + (100 if flags & 4 else 0) + (4 if flags & 8 else 0)
+            if frame[lame:lame + 4] == b'LAME' and len(frame) >= lame + 24:
+                gap = int.from_bytes(frame[lame + 21:lame + 24], 'big')
+                samples -= (gap >> 12) + (gap & 0xFFF)
+            return AudioInfo('mp3', channels, sr, max(0, samples) / sr)
+    if frame[36:40] == b'VBRI':
+        frames = struct.unpack('>I', frame[36 + 14:36 + 18])[0]
+        return AudioInfo('mp3', channels, sr, frames * spf / sr)
+    # Constant bitrate: the audio bytes over the bitrate, less a trailing ID3v1 tag
+    audio_bytes = file_size - (start + i)
+    f.seek(-128, os.SEEK_END)
+    if f.read(3) == b'TAG':
+        audio_bytes -= 128
+    return AudioInfo('mp3', channels, sr, audio_bytes * 8 / bitrate)
+
+
+def _probe_ogg(f: BinaryIO, file_size: int) -> Optional[AudioInfo]:
+    page = f.read(27)
+    if page[:4] != b'OggS' or len(page) < 27:
+        return None
+    serial = page[14:18]
+    packet = f.read(page[26] + 64)[page[26]:]
+    if packet[:7] == b'\x01vorbis':
+        channels, sr = packet[11], struct.unpack('<I', packet[12:16])[0]
+        fmt, rate, pre_skip = 'vorbis', sr, 0
+    elif packet[:8] == b'OpusHead':
+        # Opus granule positions count 48 kHz samples, whatever the input rate was
+        channels, pre_skip, sr = packet[9], *struct.unpack('<HI', packet[10:16])
+        fmt, sr, rate = 'opus', sr or 48000, 48000
+    else:
+        return None
+    # Duration is the granule position of the stream's last page
+    tail_size = min(file_size, 1 << 16)
+    f.seek(file_size - tail_size)
+    tail = f.read(tail_size)
+    pos = tail.rfind(b'OggS')
+    while pos >= 0 and (len(tail) < pos + 27 or tail[pos + 14:pos + 18] != serial):
+        pos = tail.rfind(b'OggS', 0, pos)
+    if pos < 0 or not rate:
+        return None
+    granule = struct.unpack('<q', tail[pos + 6:pos + 14])[0]
+    return AudioInfo(fmt, channels, sr, max(0, granule - pre_skip) / rate)
+
+
+def _mp4_atoms(data: bytes, start: int = 0, end: Optional[int] = None):
+    end = len(data) if end is None else end
+    while start + 8 <= end:
+        size, kind = struct.unpack('>I4s', data[start:start + 8])
+        header = 8
+        if size == 1:
+            size, header = struct.unpack('>Q', data[start + 8:start + 16])[0], 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            return
+        yield kind, start + header, min(start + size, end)
+        start += size
+
+
+def _probe_mp4(f: BinaryIO, file_size: int) -> Optional[AudioInfo]:
+    # Walk the top-level atoms by their headers only, seeking past mdat, until moov
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        head = f.read(16)
+        size, kind = struct.unpack('>I4s', head[:8])
+        if size == 1:
+            size = struct.unpack('>Q', head[8:16])[0]
+        elif size == 0:
+            size = file_size - pos
+        if size < 8:
+            return None
+        if kind == b'moov':
+            f.seek(pos)
+            moov = f.read(size)
+            break
+        pos += size
+    else:
+        return None
+    for kind, start, end in _mp4_atoms(moov, 8):
+        if kind != b'trak':
+            continue
+        atoms, stack = {}, [(start, end)]
+        while stack:
+            for k, s, e in _mp4_atoms(moov, *stack.pop()):
+                if k in (b'mdia', b'minf', b'stbl'):
+                    stack.append((s, e))
+                elif k in (b'mdhd', b'hdlr', b'stsd'):
+                    atoms[k] = moov[s:e]
+        if atoms.get(b'hdlr', b'')[8:12] != b'soun' or b'mdhd' not in atoms or b'stsd' not in atoms:
+            continue
+        mdhd = atoms[b'mdhd']
+        if mdhd[0] == 1:
+            timescale, duration = struct.unpack('>IQ', mdhd[20:32])
+        else:
+            timescale, duration = struct.unpack('>II', mdhd[12:20])
+        # First sample entry (stsd header is 8 bytes): channel count at 24, 16.16 sample rate at 32
+        entry = atoms[b'stsd'][8:]
+        if len(entry) < 36 or not timescale:
+            return None
+        channels = struct.unpack('>H', entry[24:26])[0]
+        sr = struct.unpack('>I', entry[32:36])[0] >> 16 or timescale
+        return AudioInfo(entry[4:8].decode('latin-1').strip(), channels, sr, duration / timescale)
+    return None
+
+
+def _probe_headers(f: BinaryIO, file_size: int) -> Optional[AudioInfo]:
+    head = f.read(12)
+    f.seek(0)
+    if head[:4] in (b'RIFF', b'RF64', b'BW64'):
+        return _probe_wav(f, file_size)
+    if head[:4] == b'fLaC':
+        return _probe_flac(f)
+    if head[:4] == b'OggS':
+        return _probe_ogg(f, file_size)
+    if head[4:8] == b'ftyp':
+        return _probe_mp4(f, file_size)
+    if head[:3] == b'ID3':
+        start = _skip_id3(f)
+        if f.read(4) == b'fLaC':
+            f.seek(start)
+            return _probe_flac(f)
+        return _probe_mp3(f, file_size)
+    if len(head) >= 4 and _mp3_header(head[:4]) is not None:
+        return _probe_mp3(f, file_size)
+    return None
+
+
+def _probe_soundfile(source) -> Optional[AudioInfo]:
+    try:
+        import soundfile as sf
+        info = sf.info(source)
+        return AudioInfo(info.format.lower(), info.channels, info.samplerate, info.duration)
+    except Exception:
+        return None
+
+
+def probe(path: Path) -> Optional[AudioInfo]:
+    """Format, channels, sample rate and duration of an audio file, read from its headers.
+
+    WAV/RF64, FLAC, MP3 (Xing/Info, VBRI or constant bitrate), Ogg Vorbis/Opus and
+    MP4/M4A are parsed directly; other files go through soundfile.info, which also
+    only reads headers. Returns None for files neither can read.
+    """
+    try:
+        with open(path, 'rb') as f:
+            info = _probe_headers(f, os.path.getsize(path))
+        if info is not None:
+            return info
+    except (OSError, struct.error, ValueError, IndexError):
+        pass
+    return _probe_soundfile(str(path))
+
+
+def probe_bytes(data: bytes) -> Optional[AudioInfo]:
+    """probe() for an in-memory file, e.g. an upload."""
+    try:
+        info = _probe_headers(io.BytesIO(data), len(data))
+        if info is not None:
+            return info
+    except (struct.error, ValueError, IndexError):
+        pass
+    return _probe_soundfile(io.BytesIO(data))
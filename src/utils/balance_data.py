@@ -1,68 +1,123 @@
-import random
+import os
+import time
+from collections import defaultdict
 from pathlib import Path
+from typing import Dict, List, Tuple
 import librosa
 import numpy as np
 import soundfile as sf
 from yaml import safe_load
 
+OPS = ('pitch', 'stretch', 'noise')
+
 
 def load_config(path: Path) -> dict:
     with open(path, 'r') as f:
         return safe_load(f)
 
 
-def add_noise(y: np.ndarray, snr_db: float) -> np.ndarray:
+def add_noise(y: np.ndarray, snr_db: float, rng: np.random.Generator = None) -> np.ndarray:
     rms = np.sqrt(np.mean(y**2))
     snr = 10**(snr_db / 20.0)
     noise_rms = rms / snr
-    noise = np.random.normal(0, noise_rms, y.shape)
-    return y + noise
+    noise = (rng or np.random.default_rng()).normal(0, noise_rms, y.shape)
+    return (y + noise).astype(y.dtype)
 
 
-def pitch_shift(y: np.ndarray, sr: int, steps: int) -> np.ndarray:
-    return librosa.effects.pitch_shift(y, sr, steps)
+def pitch_shift(y: np.ndarray, sr: int, steps: float) -> np.ndarray:
+    return librosa.effects.pitch_shift(y, sr=sr, n_steps=steps)
 
 
 def time_stretch(y: np.ndarray, rate: float) -> np.ndarray:
     try:
-        return librosa.effects.time_stretch(y, rate)
+        # Keep the segment length, so stretched clips match the originals
+        return librosa.util.fix_length(librosa.effects.time_stretch(y, rate=rate), size=len(y))
     except Exception:
         return y
 
 
-def check_and_balance(processed_root: Path, config_path: Path):
+def plan_jobs(minority_files: List[Path], n_jobs: int, aug_cfg: dict, seed: int) -> List[tuple]:
+    """(index, source, op, parameter) for every augmented file, drawn up front from one seeded RNG."""
+    rng = np.random.default_rng(seed)
+    choices = {'pitch': aug_cfg.get('pitch_steps', [1]), 'stretch': aug_cfg.get('time_stretch', [1.0]),
+               'noise': aug_cfg.get('noise_snr_db', [20])}
+    sources = rng.integers(len(minority_files), size=n_jobs)
+    ops = rng.integers(len(OPS), size=n_jobs)
+    jobs = []
+    for i, (src, op) in enumerate(zip(sources, ops)):
+        values = choices[OPS[op]]
+        jobs.append((i, minority_files[src], OPS[op], values[rng.integers(len(values))]))
+    return jobs
+
+
+def augment_source(source: Path, jobs: List[Tuple[int, str, float]], out_dir: Path, sr: int, seed: int) -> int:
+    """Decodes one source once and writes all of its planned augmentations.
+
+    Noise is drawn from an RNG seeded by (seed, job index), so every output is the
+    same whichever process makes it.
+    """
+    y, _ = librosa.load(source, sr=sr)
+    for i, op, param in jobs:
+        if op == 'pitch':
+            y2 = pitch_shift(y, sr, param)
+        elif op == 'stretch':
+            y2 = time_stretch(y, param)
+        else:
+            y2 = add_noise(y, param, np.random.default_rng([seed, i]))
+        outp = out_dir / f'aug_{i}_{source.stem}.wav'
+        tmp = outp.with_name(outp.stem + '.tmp.wav')
+        sf.write(tmp, y2, sr)
+        os.replace(tmp, outp)
+    return len(jobs)
+
+
+def _augment_job(job: tuple) -> int:
+    return augment_source(*job)
+
+
+def check_and_balance(processed_root: Path, config_path: Path) -> int:
+    """Tops the minority class up to the majority count with augmented copies (aug_<i>_<source>.wav).
+
+    Earlier aug_* files are replaced. The whole job plan comes from the config seed
+    and each source is decoded once, in a pool of preprocessing.workers processes,
+    so the outputs are identical for a given seed and scale with cores.
+    """
     cfg = load_config(config_path)
     aug_cfg = cfg.get('augmentations', {})
-    real_files = list((processed_root / 'real').glob('*.wav'))
-    fake_files = list((processed_root / 'fake').glob('*.wav'))
-    n_real = len(real_files)
-    n_fake = len(fake_files)
+    from src.data.manifest import scan
+    manifest = scan(processed_root, cfg)
+    for label in ['real', 'fake']:
+        for old in manifest.query(label, ['.wav'], prefix='aug_', recursive=False):
+            old.path.unlink()
+    manifest = scan(processed_root, cfg)
+    files: Dict[str, List[Path]] = {label: [e.path for e in manifest.query(label, ['.wav'], recursive=False)]
+                                    for label in ['real', 'fake']}
+    n_real, n_fake = len(files['real']), len(files['fake'])
     print('Counts -> real:', n_real, 'fake:', n_fake)
     if n_real == 0 or n_fake == 0:
         print('One of the classes is empty; skipping augmentation.')
-        return
-    target = max(n_real, n_fake)
+        return 0
     minority = 'real' if n_real < n_fake else 'fake'
-    minority_files = real_files if minority == 'real' else fake_files
+    needed = abs(n_real - n_fake)
+    if needed == 0:
+        return 0
     sr = cfg.get('sr', 16000)
-    i = 0
-    while len(minority_files) < target:
-        src = random.choice(minority_files)
-        y, _ = librosa.load(src, sr=sr)
-        op = random.choice(['pitch', 'stretch', 'noise'])
-        if op == 'pitch':
-            steps = random.choice(aug_cfg.get('pitch_steps', [1]))
-            y2 = pitch_shift(y, sr, steps)
-        elif op == 'stretch':
-            rate = random.choice(aug_cfg.get('time_stretch', [1.0]))
-            y2 = time_stretch(y, rate)
-            if len(y2) < int(cfg.get('sr', 16000) * cfg.get('duration', 3.0)):
-                y2 = np.pad(y2, (0, 1))
-        else:
-            snr = random.choice(aug_cfg.get('noise_snr_db', [20]))
-            y2 = add_noise(y, snr)
-        outp = processed_root / minority / f"aug_{i}_{src.name}"
-        sf.write(str(outp) + '.wav', y2, sr)
-        minority_files.append(outp)
-        i += 1
-    print('Balanced classes by augmenting', i, 'files.')
+    seed = cfg.get('seed', 42)
+    by_source = defaultdict(list)
+    for i, src, op, param in plan_jobs(files[minority], needed, aug_cfg, seed):
+        by_source[src].append((i, op, param))
+    tasks = [(src, jobs, processed_root / minority, sr, seed) for src, jobs in sorted(by_source.items())]
+
+    from src.preprocessing.preprocess import preprocessing_settings
+    workers = preprocessing_settings(cfg)['workers'] or os.cpu_count() or 1
+    start = time.perf_counter()
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = sum(pool.map(_augment_job, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        done = sum(map(_augment_job, tasks))
+    elapsed = time.perf_counter() - start
+    print(f'Balanced classes by augmenting {done} {minority} files from {len(tasks)} sources '
+          f'in {elapsed:.1f}s on {workers} process(es).')
+    return done
@@ -0,0 +1,73 @@
+import os
+import random
+import shutil
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import torch
+
+
+def rng_state() -> dict:
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state: dict):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def checkpoint_name(epoch: int, step: int) -> str:
+    # Zero-padded so lexical order is training order
+    return f'ckpt_e{epoch:04d}_s{step:07d}.pt'
+
+
+def save_checkpoint(state: dict, ckpt_dir: Path, name: str, keep: int = 3) -> Path:
+    """Atomically writes a checkpoint, then deletes all but the newest `keep`."""
+    ckpt_dir = Path(ckpt_dir)
+    ckpt_dir.mkdir(parents=True, exist_ok=True)
+    path = ckpt_dir / name
+    tmp = path.with_name(path.name + '.tmp')
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+    for old in sorted(ckpt_dir.glob('ckpt_*.pt'))[:-keep] if keep > 0 else []:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def set_aside_checkpoints(ckpt_dir: Path) -> int:
+    """Moves an earlier run's checkpoints into ckpt_dir/previous (replacing what was there).
+
+    For fresh runs: rotation keeps the lexically newest files, so a stale run's
+    later epochs would otherwise outlive the new run's checkpoints, and a later
+    resume would pick them up. Returns how many were moved.
+    """
+    ckpt_dir = Path(ckpt_dir)
+    stale = sorted(ckpt_dir.glob('ckpt_*.pt*'))
+    if not stale:
+        return 0
+    previous = ckpt_dir / 'previous'
+    shutil.rmtree(previous, ignore_errors=True)
+    previous.mkdir()
+    for path in stale:
+        os.replace(path, previous / path.name)
+    return len(stale)
+
+
+def latest_checkpoint(ckpt_dir: Path) -> Optional[Path]:
+    found = sorted(Path(ckpt_dir).glob('ckpt_*.pt'))
+    return found[-1] if found else None
+
+
+def load_checkpoint(path: Path) -> dict:
+    # Checkpoints hold RNG states and optimizer internals, not just tensors
+    return torch.load(path, map_location='cpu', weights_only=False)
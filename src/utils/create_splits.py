@@ -9,17 +9,10 @@ def load_config(path: Path) -> dict:
         return safe_load(f)
 
 
-def create_stratified_splits(features_root: Path, splits_root: Path, config_path: Path):
-    cfg = load_config(config_path)
+def _split_and_save(df: pd.DataFrame, splits_root: Path, cfg: dict):
     train_ratio = cfg.get('train_split', 0.7)
     val_ratio = cfg.get('val_split', 0.15)
     test_ratio = cfg.get('test_split', 0.15)
-    rows = []
-    for label in ['real', 'fake']:
-        mel_dir = features_root / 'mel_spectrograms' / label
-        for f in mel_dir.glob('*.npy'):
-            rows.append({'file': str(f), 'label': 1 if label == 'real' else 0})
-    df = pd.DataFrame(rows)
     if df.empty:
         print('No features found to split')
         return
@@ -31,3 +24,28 @@ def create_stratified_splits(features_root: Path, splits_root: Path, config_path
     val.to_csv(splits_root / 'val.csv', index=False)
     test.to_csv(splits_root / 'test.csv', index=False)
     print('Saved splits to', splits_root)
+
+
+def create_stratified_splits(features_root: Path, splits_root: Path, config_path: Path):
+    from src.data.manifest import scan
+    cfg = load_config(config_path)
+    manifest = scan(features_root, cfg)
+    rows = []
+    for label in ['real', 'fake']:
+        for e in manifest.query(f'mel_spectrograms/{label}', ['.npy'], recursive=False):
+            rows.append({'file': str(e.path), 'label': 1 if label == 'real' else 0})
+    _split_and_save(pd.DataFrame(rows), splits_root, cfg)
+
+
+def create_splits_from_shards(shard_dir: Path, features_root: Path, splits_root: Path, config_path: Path):
+    """Splits over the items of a shard index, e.g. from the fused pipeline, which writes no .npy files.
+
+    The file column holds the path the item would have as an .npy feature, so the
+    CSVs select the same items from the shards (matched by name) as from npy files.
+    """
+    import numpy as np
+    from src.data.shards import INDEX_FILE
+    index = np.load(Path(shard_dir) / INDEX_FILE)
+    rows = [{'file': str(features_root / 'mel_spectrograms' / ('real' if label == 1 else 'fake') / f'{name}.npy'),
+             'label': int(label)} for name, label in zip(index['name'], index['label'])]
+    _split_and_save(pd.DataFrame(rows), splits_root, load_config(config_path))
@@ -0,0 +1,101 @@
+from typing import Dict, Sequence
+import numpy as np
+
+
+def metrics_from_counts(tp, fp, fn, tn) -> Dict[str, np.ndarray]:
+    """Accuracy/precision/recall/F1 from confusion counts (scalars or equal-shape arrays).
+
+    Undefined ratios (no predicted or no actual positives) are 0, like
+    sklearn's zero_division=0.
+    """
+    tp, fp, fn, tn = (np.asarray(c, dtype=np.float64) for c in (tp, fp, fn, tn))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = (tp + tn) / (tp + fp + fn + tn)
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return {'accuracy': accuracy, 'precision': precision, 'recall': recall, 'f1': f1}
+
+
+class ScoreHistogram:
+    """Per-class histograms of P(real) scores, updated batch by batch in constant memory.
+
+    Confusion counts at any threshold on a bin edge (0.5 with an even number of
+    bins) and ROC AUC follow from the cumulative counts.
+    """
+
+    def __init__(self, bins: int = 1000):
+        self.bins = bins
+        self.counts = np.zeros((2, bins), dtype=np.int64)
+
+    def update(self, scores: np.ndarray, labels: np.ndarray):
+        idx = np.clip((np.asarray(scores, dtype=np.float64) * self.bins).astype(np.int64), 0, self.bins - 1)
+        np.add.at(self.counts, (np.asarray(labels, dtype=np.int64), idx), 1)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def confusion(self, threshold: float = 0.5) -> Dict[str, int]:
+        """Counts with label 1 (real) as the positive class and score >= threshold predicted real."""
+        cut = int(round(threshold * self.bins))
+        neg, pos = self.counts
+        return {'tp': int(pos[cut:].sum()), 'fn': int(pos[:cut].sum()),
+                'fp': int(neg[cut:].sum()), 'tn': int(neg[:cut].sum())}
+
+    def roc_auc(self) -> float:
+        """AUC with tied scores (same bin) counted as half, as in the rank formulation."""
+        neg, pos = self.counts
+        if pos.sum() == 0 or neg.sum() == 0:
+            return float('nan')
+        neg_below = np.cumsum(neg) - neg
+        return float((pos * (neg_below + 0.5 * neg)).sum() / (pos.sum() * neg.sum()))
+
+
+def bootstrap_intervals(confusion: Dict[str, int], n_boot: int = 1000, confidence: float = 0.95,
+                        seed: int = 42) -> Dict[str, Sequence[float]]:
+    """Percentile bootstrap CIs for accuracy, precision, recall and F1.
+
+    Resampling the test set with replacement only changes how many samples fall
+    in each confusion cell, so all replicates are drawn at once from a
+    multinomial over the four counts.
+    """
+    cells = np.array([confusion['tp'], confusion['fp'], confusion['fn'], confusion['tn']], dtype=np.float64)
+    n = int(cells.sum())
+    if n == 0 or n_boot <= 0:
+        return {}
+    draws = np.random.default_rng(seed).multinomial(n, cells / n, size=n_boot)
+    replicates = metrics_from_counts(*draws.T)
+    tail = (1 - confidence) / 2 * 100
+    return {name: [float(np.percentile(vals, tail)), float(np.percentile(vals, 100 - tail))]
+            for name, vals in replicates.items()}
+
+
+class LatencyHistogram:
+    """Log-spaced histogram of durations (1 us to 100 s, ~1% resolution) for percentiles in constant memory."""
+
+    def __init__(self, lo: float = 1e-6, hi: float = 100.0, bins: int = 1600):
+        self.edges = np.geomspace(lo, hi, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        idx = int(np.clip(np.searchsorted(self.edges, seconds) - 1, 0, len(self.counts) - 1))
+        self.counts[idx] += 1
+        self.total += float(seconds)
+
+    @property
+    def n(self) -> int:
+        return int(self.counts.sum())
+
+    def percentile(self, q: float) -> float:
+        """Upper edge of the bin holding the q-th percentile, in seconds."""
+        if self.n == 0:
+            return float('nan')
+        idx = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.n))
+        return float(self.edges[min(idx, len(self.counts) - 1) + 1])
+
+    def summary(self, prefix: str = '') -> Dict[str, float]:
+        out = {f'{prefix}p{q}_ms': self.percentile(q) * 1000 for q in (50, 90, 99)}
+        out[f'{prefix}mean_ms'] = self.total / max(1, self.n) * 1000
+        return out
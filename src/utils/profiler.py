@@ -0,0 +1,134 @@
+import json
+import time
+from pathlib import Path
+from typing import Optional
+import torch
+
+PHASES = ('data', 'forward', 'backward', 'optimizer', 'bookkeeping')
+
+
+def profiling_settings(cfg: dict) -> dict:
+    prof_cfg = cfg.get('profiling', {})
+    return {
+        'enabled': prof_cfg.get('enabled', True),
+        'log_every': prof_cfg.get('log_every', 50),
+        'summary': prof_cfg.get('summary', 'logs/run_summary.json'),
+        'trace_start': prof_cfg.get('trace_start', 10),
+        'trace_steps': prof_cfg.get('trace_steps', 0),
+        'trace_dir': prof_cfg.get('trace_dir', 'logs/profiler'),
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process, or None when it cannot be read."""
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KiB on Linux
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 2**20
+    except ImportError:
+        return None
+
+
+class StepTimer:
+    """Splits each training step into data-wait, forward, backward, optimizer and bookkeeping time.
+
+    Call reset() before iterating the loader, lap(phase) after each phase and
+    step(batch_size) at the end of the step. Bookkeeping (step logging, mid-epoch
+    checkpoints) gets its own lap at the end of the step, so it is not counted as
+    waiting for the next batch. On CUDA each lap synchronises so
+    kernel time is charged to the phase that launched it.
+    """
+
+    def __init__(self, device: torch.device, enabled: bool = True):
+        self.sync = enabled and device.type == 'cuda'
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.last = dict.fromkeys(PHASES, 0.0)
+        self.steps = 0
+        self.samples = 0
+        self.start = time.perf_counter()
+        self._mark = self.start
+
+    def lap(self, phase: str):
+        if not self.enabled:
+            return
+        if self.sync:
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        self.last[phase] = now - self._mark
+        self.totals[phase] += self.last[phase]
+        self._mark = now
+
+    def step(self, batch_size: int):
+        self.steps += 1
+        self.samples += batch_size
+
+    def summary(self) -> dict:
+        """Mean milliseconds per step for each phase, the data-wait share and samples/sec."""
+        elapsed = time.perf_counter() - self.start
+        steps = max(1, self.steps)
+        out = {f'{p}_ms': self.totals[p] / steps * 1000 for p in PHASES}
+        out['data_fraction'] = self.totals['data'] / max(1e-9, sum(self.totals.values()))
+        out['samples_per_sec'] = self.samples / max(1e-9, elapsed)
+        out['steps'] = self.steps
+        out['peak_rss_mb'] = peak_rss_mb()
+        return out
+
+
+class ProfilerWindow:
+    """Runs torch.profiler for `steps` optimizer steps starting at global step `start`.
+
+    The trace is exported for TensorBoard's profiler plugin (or chrome://tracing)
+    into trace_dir. step(global_step) must be called once per training step.
+    """
+
+    def __init__(self, start: int, steps: int, trace_dir: str, device: torch.device):
+        self.start = start
+        self.steps = steps
+        self.trace_dir = trace_dir
+        self.device = device
+        self._prof = None
+        self._remaining = 0
+
+    def step(self, global_step: int):
+        if self.steps <= 0:
+            return
+        if self._prof is not None:
+            self._prof.step()
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self.stop()
+        elif global_step == self.start:
+            from torch.profiler import ProfilerActivity, profile, tensorboard_trace_handler
+            activities = [ProfilerActivity.CPU]
+            if self.device.type == 'cuda':
+                activities.append(ProfilerActivity.CUDA)
+            self._prof = profile(activities=activities, record_shapes=True, profile_memory=True,
+                                 on_trace_ready=tensorboard_trace_handler(self.trace_dir))
+            self._prof.start()
+            self._remaining = self.steps
+
+    def stop(self):
+        if self._prof is not None:
+            self._prof.stop()
+            print('Profiler trace written to', self.trace_dir)
+            self._prof = None
+            self.steps = 0
+
+
+def write_run_summary(path: str, summary: dict):
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(summary, f, indent=2)
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+MANIFEST_FILE = 'pipeline_manifest.json'
+HASH_CACHE_FILE = '.hash_cache.json'
+
+
+def params_hash(params) -> str:
+    """Short stable hash of a JSON-serialisable value (stage parameters, input digests, ...)."""
+    blob = json.dumps(params, sort_keys=True, default=str).encode()
+    return hashlib.sha1(blob).hexdigest()[:12]
+
+
+def _atomic_json(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class HashCache:
+    """Content hashes of files, recomputed only when a file's size or mtime changes.
+
+    `hashed` counts the files actually read since the cache was loaded.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._entries: Dict[str, list] = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                self._entries = json.load(f)
+        self.hashed = 0
+
+    def digest(self, file: Path) -> str:
+        key = str(Path(file).resolve())
+        st = os.stat(key)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        h = hashlib.blake2b(digest_size=16)
+        with open(key, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        self._entries[key] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        self.hashed += 1
+        return self._entries[key][2]
+
+    def save(self):
+        self._entries = {k: v for k, v in self._entries.items() if os.path.exists(k)}
+        _atomic_json(self.path, self._entries)
+
+
+class StageManifest:
+    """What each pipeline stage last computed, and from which inputs and parameters.
+
+    Whole stages are recorded with one key (a hash of their parameters and input
+    digests); per-file stages also keep one entry per source file with its key
+    and the outputs it produced, so only new or changed files are redone.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.data: Dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+
+    def is_current(self, stage: str, key: str) -> bool:
+        return self.data.get(stage, {}).get('key') == key
+
+    def mark(self, stage: str, key: str, **info):
+        entry = self.data.setdefault(stage, {})
+        entry.update(info, key=key)
+
+    def files(self, stage: str) -> Dict[str, dict]:
+        return self.data.setdefault(stage, {}).setdefault('files', {})
+
+    def plan_files(self, stage: str, keys: Dict[str, str]) -> Tuple[List[str], List[str]]:
+        """Sources whose key changed or whose outputs are missing, and recorded sources that are gone."""
+        recorded = self.files(stage)
+        todo = [src for src, key in keys.items()
+                if recorded.get(src, {}).get('key') != key
+                or not all(Path(o).exists() for o in recorded[src].get('outputs', []))]
+        removed = [src for src in recorded if src not in keys]
+        return todo, removed
+
+    def record_file(self, stage: str, source: str, key: str, outputs: Iterable[str]):
+        self.files(stage)[source] = {'key': key, 'outputs': sorted(outputs)}
+
+    def forget_file(self, stage: str, source: str) -> List[str]:
+        """Drops a source's entry and returns the outputs it had produced."""
+        return self.files(stage).pop(source, {}).get('outputs', [])
+
+    def save(self):
+        _atomic_json(self.path, self.data)
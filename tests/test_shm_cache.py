@@ -0,0 +1,44 @@
+import os
+import numpy as np
+from src.data import shm_cache
+from src.data.shm_cache import build_shared_cache
+
+
+def _split(root, name, n, shape=(128, 94)):
+    rng = np.random.default_rng(len(name) + n)
+    files = []
+    for i in range(n):
+        f = root / f'{name}_{i}.npy'
+        np.save(f, rng.standard_normal(shape).astype(np.float32))
+        files.append(str(f))
+    return files
+
+
+def test_train_cache_survives_val_over_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(shm_cache, '_IN_USE', set())
+    cache_dir = tmp_path / 'cache'
+    train = _split(tmp_path, 'train', 60)   # ~2.9 MB
+    val = _split(tmp_path, 'val', 30)       # ~1.4 MB; both together exceed 4 MB
+
+    train_cache = build_shared_cache(train, cache_dir, max_mb=4)
+    assert train_cache is not None
+    assert build_shared_cache(val, cache_dir, max_mb=4) is None
+    assert train_cache.exists()
+    cached = np.load(train_cache, mmap_mode='r')
+    np.testing.assert_array_equal(cached[59], np.load(train[59]))
+
+
+def test_evicts_unused_caches_but_not_partial_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(shm_cache, '_IN_USE', set())
+    cache_dir = tmp_path / 'cache'
+    old = build_shared_cache(_split(tmp_path, 'old', 60), cache_dir, max_mb=4)
+    partial = cache_dir / 'abc.1234.tmp.npy'
+    partial.write_bytes(b'\0' * 1024)
+    # A later run: the old cache is no longer in use by this process
+    monkeypatch.setattr(shm_cache, '_IN_USE', set())
+    os.utime(old, (0, 0))
+
+    new = build_shared_cache(_split(tmp_path, 'new', 30), cache_dir, max_mb=4)
+    assert new is not None and new.exists()
+    assert not old.exists()
+    assert partial.exists()